@@ -2,6 +2,16 @@
 KCBot - a simple buy/sell bot.
 """
 
-from .bot import Bot
+from typing import Any
 
 __all__ = ["Bot"]
+
+
+def __getattr__(name: str) -> Any:
+    # Imported on first use, as the Bot imports the exchange client, which
+    # is slow to import and not needed by every command.
+    if name == "Bot":
+        from .bot import Bot
+
+        return Bot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
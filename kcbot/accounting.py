@@ -0,0 +1,203 @@
+"""
+Classes for accounting: realized PnL, average cost and inventory, by market
+and by strategy.
+"""
+
+import json
+import os
+from typing import Any, Dict, Optional
+
+
+class Position:
+    """
+    The inventory (in base currency, negative if more was sold than bought)
+    and its average cost, realized PnL and fees (in quote currency) of a
+    series of fills.
+    """
+
+    __slots__ = ("inventory", "cost", "realized", "fees", "bought", "sold")
+
+    def __init__(self) -> None:
+        self.inventory = 0.0
+        # The total cost of the inventory, with the same sign.
+        self.cost = 0.0
+        self.realized = 0.0
+        self.fees = 0.0
+        self.bought = 0.0
+        self.sold = 0.0
+
+    @property
+    def avg_cost(self) -> float:
+        if self.inventory == 0.0:
+            return 0.0
+        return self.cost / self.inventory
+
+    @property
+    def net(self) -> float:
+        """
+        Return the realized PnL, less fees.
+        """
+        return self.realized - self.fees
+
+    def unrealized(self, price: float) -> float:
+        """
+        Return the PnL from closing the inventory at a price.
+        """
+        return price * self.inventory - self.cost
+
+    def apply(self, side: str, size: float, funds: float, fee: float) -> None:
+        """
+        Apply a fill of size (base) for funds (quote), at average cost: a
+        fill reducing the inventory realizes the difference between its
+        price and the average cost, and the rest opens new inventory.
+        """
+        if size <= 0.0:
+            return
+        price = funds / size
+        signed = size if side == "buy" else -size
+        if side == "buy":
+            self.bought += size
+        else:
+            self.sold += size
+        self.fees += fee
+
+        if self.inventory * signed < 0.0:
+            closing = min(size, abs(self.inventory))
+            avg_cost = self.avg_cost
+            if self.inventory > 0.0:
+                self.realized += (price - avg_cost) * closing
+                self.inventory -= closing
+            else:
+                self.realized += (avg_cost - price) * closing
+                self.inventory += closing
+            self.cost = avg_cost * self.inventory
+            signed -= closing if signed > 0.0 else -closing
+        self.inventory += signed
+        self.cost += price * signed
+
+    def to_dict(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, float]) -> "Position":
+        position = cls()
+        for name in cls.__slots__:
+            setattr(position, name, data[name])
+        return position
+
+
+class Accounting:
+    """
+    Consumes done orders as they arrive, each once, and keeps a Position
+    per market and per (market, strategy), where the strategy is the order
+    remark. State is kept in memory, and checkpointed to a JSON file if a
+    filename is given.
+    """
+
+    def __init__(self, filename: str = ""):
+        self.filename = filename
+        self.markets: Dict[str, Position] = {}
+        # Keyed by "market/strategy".
+        self.strategies: Dict[str, Position] = {}
+        # Order ID => createdAt, of the orders applied.
+        self.seen: Dict[str, int] = {}
+        # Fees paid in neither the base nor the quote currency.
+        self.other_fees: Dict[str, float] = {}
+        if filename and os.path.exists(filename):
+            with open(filename, encoding="utf-8") as handle:
+                data = json.load(handle)
+            self.markets = {
+                key: Position.from_dict(val)
+                for key, val in data["markets"].items()
+            }
+            self.strategies = {
+                key: Position.from_dict(val)
+                for key, val in data["strategies"].items()
+            }
+            self.seen = data["seen"]
+            self.other_fees = data["other_fees"]
+
+    def position(
+        self,
+        market: str,
+        strategy: Optional[str] = None,
+    ) -> Position:
+        """
+        Return the Position for a market, or one strategy in it.
+        """
+        if strategy is None:
+            return self.markets.setdefault(market, Position())
+        return self.strategies.setdefault(f"{market}/{strategy}", Position())
+
+    def apply_order(self, order: Dict[str, Any]) -> bool:
+        """
+        Apply a KuCoin done order, unless already applied or not filled.
+        Return True if applied.
+        """
+        if order["id"] in self.seen or order["dealSize"] in ("0", "", None):
+            return False
+        self.seen[order["id"]] = int(order["createdAt"])
+        market = order["symbol"]
+        base, quote = market.split("-")
+        size = float(order["dealSize"])
+        funds = float(order["dealFunds"])
+        fee = float(order.get("fee") or 0.0)
+        fee_currency = order.get("feeCurrency") or quote
+        if fee_currency == base:
+            fee *= funds / size
+        elif fee_currency != quote:
+            self.other_fees[fee_currency] = (
+                self.other_fees.get(fee_currency, 0.0) + fee
+            )
+            fee = 0.0
+        for position in (
+            self.position(market),
+            self.position(market, order.get("remark") or "unknown"),
+        ):
+            position.apply(order["side"], size, funds, fee)
+        return True
+
+    def apply_shadow(self, market: str, fill: Dict[str, Any]) -> None:
+        """
+        Apply a simulated fill of a shadow strategy (the order remark) to
+        its Position only, as it did not change the market's.
+        """
+        size = float(fill["size"])
+        self.position(market, fill.get("remark") or "unknown").apply(
+            fill["side"], size, size * float(fill["price"]), 0.0
+        )
+
+    def prune(self, before: int) -> int:
+        """
+        Forget the IDs of orders created before a time (in ms), which will
+        not be seen again. Return the number forgotten.
+        """
+        old = [oid for oid, created in self.seen.items() if created < before]
+        for oid in old:
+            del self.seen[oid]
+        return len(old)
+
+    def save(self) -> None:
+        """
+        Write the state to its file (if any), atomically.
+        """
+        if not self.filename:
+            return
+        tmpname = self.filename + ".tmp"
+        with open(tmpname, "w", encoding="utf-8") as handle:
+            json.dump(
+                {
+                    "markets": {
+                        key: val.to_dict() for key, val in self.markets.items()
+                    },
+                    "other_fees": self.other_fees,
+                    "seen": self.seen,
+                    "strategies": {
+                        key: val.to_dict()
+                        for key, val in self.strategies.items()
+                    },
+                },
+                handle,
+                sort_keys=True,
+            )
+        os.replace(tmpname, self.filename)
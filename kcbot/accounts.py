@@ -0,0 +1,138 @@
+"""
+A class for an Accounts object: runs Bots for several accounts in one
+process.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import kucoin.client as kcc
+
+from .bot import Bot
+from .killswitch import KillSwitch
+from .marketdata import MarketData
+from .ratelimit import RateLimiter
+
+
+class Accounts:
+    """
+    Runs Bots for the markets of several accounts (key sets) in one
+    process. Each account has its own Trade and User clients, rate limited
+    by its own RateLimiter. Market data is public, so all Bots share one
+    Market client with its own rate limit, and one all tickers fetch per
+    tick. Each Bot runs once per tick_len of its own config, which its GTT
+    orders live for; the accounts file's tick_len is how often the kill
+    switch and which Bots are due are checked.
+
+    The accounts file looks like:
+        {
+            "rate": 10, "burst": 30, "market_rate": 10, "tick_len": 60,
+            "accounts": {
+                "main": {"keys": "keys.json", "configs": ["config.json"]},
+                "sub1": {"keys": "keys-sub1.json", "configs": [...]}
+            }
+        }
+    """
+
+    def __init__(self, accounts: Union[str, Dict[str, Any]]):
+        if isinstance(accounts, str):
+            with open(accounts, encoding="utf-8") as accountsf:
+                cfg = json.load(accountsf)
+        else:
+            cfg = accounts
+        self.tick_len = float(cfg.get("tick_len", 60.0))
+        rate = float(cfg.get("rate", 10.0))
+        burst = float(cfg.get("burst", 30.0))
+        market_rate = float(cfg.get("market_rate", rate))
+
+        self.market_limiter = RateLimiter(market_rate, burst)
+        self.market = self.market_limiter.wrap("market", kcc.Market())
+        self.market_data = MarketData(self.market, ttl=self.tick_len / 2.0)
+        # Kills the orders of every account's markets at once.
+        self.kill_switch = KillSwitch()
+        self.limiters: Dict[str, RateLimiter] = {}
+        self.bots: Dict[str, List[Bot]] = {}
+        for name, account in cfg["accounts"].items():
+            limiter = RateLimiter(rate, burst)
+            self.limiters[name] = limiter
+
+            def wrap(client_name: str, client: Any, limiter=limiter) -> Any:
+                if client_name == "market":
+                    return self.market
+                return limiter.wrap(client_name, client)
+
+            self.bots[name] = [
+                Bot(
+                    config=config,
+                    keys=account["keys"],
+                    wrappers=[wrap],
+                    market_data=self.market_data,
+                    kill_switch=self.kill_switch,
+                    account=name,
+                )
+                for config in account["configs"]
+            ]
+        # When each Bot (by id) is next due to run, by time.monotonic().
+        self.due: Dict[int, float] = {}
+        self.stop = threading.Event()
+        self.logger = logging.getLogger("KCBot.Accounts")
+
+    def run_once(self, due_only: bool = False) -> Dict[str, Dict[str, bool]]:
+        """
+        Run one iteration of every Bot (or only those due, unless the kill
+        switch is triggered), account by account. Return the phase results
+        by account and market.
+        """
+        results: Dict[str, Dict[str, bool]] = {}
+        for name, bots in self.bots.items():
+            for bot in bots:
+                start = time.monotonic()
+                if (
+                    due_only
+                    and start < self.due.get(id(bot), 0.0)
+                    and not self.kill_switch.triggered
+                ):
+                    continue
+                try:
+                    phases = bot.run_once()
+                except Exception as exc:
+                    self.logger.warning(
+                        "%s/%s: iteration failed: %s", name, bot.mkt, exc
+                    )
+                    phases = {}
+                self.due[id(bot)] = start + bot.tick_len
+                results[f"{name}/{bot.mkt}"] = phases
+        return results
+
+    def run(self, duration: Optional[float] = None) -> None:
+        """
+        Run every Bot once per tick, for duration seconds, until stop is
+        set or until interrupted.
+        """
+        start = time.monotonic()
+        self.kill_switch.install()
+        try:
+            while not self.stop.is_set():
+                tick_start = time.monotonic()
+                self.kill_switch.poll()
+                for key, phases in self.run_once(due_only=True).items():
+                    failed = [name for name, ok in phases.items() if not ok]
+                    if failed:
+                        self.logger.warning(
+                            "%s: failed phases: %s", key, ", ".join(failed)
+                        )
+                if (
+                    duration is not None
+                    and time.monotonic() - start >= duration
+                ):
+                    break
+                self.kill_switch.wait(
+                    self.stop,
+                    min([tick_start + self.tick_len, *self.due.values()])
+                    - time.monotonic(),
+                )
+        except KeyboardInterrupt:
+            self.logger.info("Interrupted")
@@ -0,0 +1,151 @@
+"""
+A class for a Balances object: trade account balances indexed by currency.
+"""
+
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+
+class Balances(Dict[str, float]):
+    """
+    Available trade account balances, indexed by currency. A currency with
+    no account has a balance of 0.0.
+
+    A full snapshot is loaded with refresh(), and kept up to date between
+    snapshots from account ledger entries (apply_ledger), which include
+    our fills, and our own orders as they are placed (reserve). Cancelling
+    or expiring an order makes no ledger entry, so its funds are released
+    (release and expire), and a full refresh forced. Times are by clock,
+    in seconds since the epoch.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        super().__init__()
+        self.clock = clock
+        self.holds: Dict[str, float] = {}
+        self.refreshed_at: Optional[float] = None
+        # Ledger position: newest entry time (ms) and entry IDs at that time.
+        self.synced_at = 0
+        self.synced_ids: Set[str] = set()
+        # Funds held by our orders since the last refresh, by clientOid:
+        # currency, amount, and when (by clock) the order expires.
+        self.reserved: Dict[str, Tuple[str, float, float]] = {}
+
+    def __missing__(self, currency: str) -> float:
+        return 0.0
+
+    def age(self) -> float:
+        """
+        Return the number of seconds since the last full refresh.
+        """
+        if self.refreshed_at is None:
+            return float("inf")
+        return self.clock() - self.refreshed_at
+
+    def refresh(self, accounts: Iterable[Dict[str, Any]]) -> None:
+        """
+        Replace all balances with a KuCoin account list snapshot.
+        """
+        self.clear()
+        self.holds.clear()
+        for acc in accounts:
+            self[acc["currency"]] = float(acc["available"])
+            self.holds[acc["currency"]] = float(acc.get("holds", 0.0))
+        self.refreshed_at = self.clock()
+        self.synced_at = int(self.refreshed_at * 1000)
+        self.synced_ids.clear()
+        # Held by the snapshot, if still open.
+        self.reserved.clear()
+
+    def apply_ledger(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """
+        Apply KuCoin trade account ledger entries newer than those already
+        applied. Trades paid for by an order spend its held funds first.
+        Return the number of entries applied.
+        """
+        applied = 0
+        for entry in sorted(entries, key=lambda item: item["createdAt"]):
+            created_at = int(entry["createdAt"])
+            if entry.get("accountType", "TRADE") != "TRADE":
+                continue
+            if created_at < self.synced_at or (
+                created_at == self.synced_at and entry["id"] in self.synced_ids
+            ):
+                continue
+            if created_at > self.synced_at:
+                self.synced_at = created_at
+                self.synced_ids.clear()
+            self.synced_ids.add(entry["id"])
+
+            currency = entry["currency"]
+            amount = float(entry["amount"])
+            if entry["direction"] == "in":
+                self[currency] += amount
+            else:
+                held = self.holds.get(currency, 0.0)
+                if "orderId" in (entry.get("context") or {}):
+                    spent_hold = min(held, amount)
+                else:
+                    spent_hold = 0.0
+                self.holds[currency] = held - spent_hold
+                self[currency] -= amount - spent_hold
+            applied += 1
+        return applied
+
+    def reserve(
+        self,
+        base: str,
+        quote: str,
+        side: str,
+        price: float,
+        size: float,
+        oid: str = "",
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Move the funds for a newly placed limit order from available to held.
+        :param oid: the order's clientOid, to release its funds by.
+        :param ttl: seconds until the order expires (GTT), or None.
+        """
+        currency, amount = (
+            (quote, price * size) if side == "buy" else (base, size)
+        )
+        self[currency] -= amount
+        self.holds[currency] = self.holds.get(currency, 0.0) + amount
+        if oid:
+            expires = float("inf") if ttl is None else self.clock() + ttl
+            self.reserved[oid] = (currency, amount, expires)
+
+    def release(self, oids: Iterable[str]) -> int:
+        """
+        Move the funds held by orders cancelled or expired back to
+        available (as far as they are still held: part may have been
+        filled), and force a full refresh at the next update, to correct
+        for partial fills. Return the number of orders released.
+        """
+        released = 0
+        for oid in oids:
+            if oid not in self.reserved:
+                continue
+            currency, amount, _ = self.reserved.pop(oid)
+            amount = min(amount, self.holds.get(currency, 0.0))
+            self.holds[currency] = self.holds.get(currency, 0.0) - amount
+            self[currency] += amount
+            released += 1
+        if released:
+            self.refreshed_at = None
+        return released
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Release the funds of orders which have expired (by now, by
+        clock). Return the number of orders released.
+        """
+        now = self.clock() if now is None else now
+        return self.release(
+            [
+                oid
+                for oid, (_, _, expires) in self.reserved.items()
+                if expires <= now
+            ]
+        )
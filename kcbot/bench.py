@@ -0,0 +1,152 @@
+"""
+Benchmarks of the Bot's hot paths, on synthetic data, without the exchange.
+"""
+
+import random
+import timeit
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from .history import TickerHistory
+from .increment import Increment
+from .ladder import bumps, shares
+from .netting import net_orders
+from .orderbook import OrderBook
+from .ticker import Ticker
+
+
+def bench_netting() -> Callable[[], Any]:
+    """
+    Net 50 orders from 5 strategies, some at the same prices.
+    """
+    prices, sizes = Increment("0.0001"), Increment("0.0001")
+    rng = random.Random(0)
+    orders = [
+        {
+            "clientOid": f"order{idx}",
+            "side": side,
+            "price": f"{price:.4f}",
+            "size": f"{rng.uniform(1.0, 100.0):.4f}",
+            "timeInForce": "GTT",
+            "cancelAfter": 60,
+        }
+        for idx in range(25)
+        for side, price in (
+            ("buy", 0.99 - (idx % 10) * 0.001),
+            ("sell", 1.01 + (idx % 10) * 0.001),
+        )
+    ]
+    return lambda: net_orders(orders, prices, sizes, {})
+
+
+def bench_book() -> Callable[[], Any]:
+    """
+    Seed a 200 level book, then apply 100 level-2 changes to it.
+    """
+    book = OrderBook(Increment("0.0001"), Increment("0.0001"))
+    snapshot = {
+        "sequence": "1",
+        "bids": [[f"{1.0 - idx * 0.0001:.4f}", "10"] for idx in range(100)],
+        "asks": [[f"{1.0001 + idx * 0.0001:.4f}", "10"] for idx in range(100)],
+    }
+    changes = []
+    for seq in range(2, 102):
+        side = "bids" if seq % 2 else "asks"
+        price = f"{1.0 + (seq % 40 - 20) * 0.0001:.4f}"
+        changes.append(
+            {
+                "sequenceStart": seq,
+                "sequenceEnd": seq,
+                "changes": {side: [[price, str(seq % 7), str(seq)]]},
+            }
+        )
+
+    def run() -> None:
+        book.seed(snapshot)
+        for change in changes:
+            book.apply(change)
+
+    return run
+
+
+def bench_history() -> Callable[[], Any]:
+    """
+    Append a day of minute tickers to the rolling history, and read its
+    statistics.
+    """
+    rng = random.Random(0)
+    tickers = [
+        Ticker(ask=1.001, bid=0.999, price=rng.uniform(0.9, 1.1), size=1.0)
+        for _ in range(1440)
+    ]
+
+    def run() -> Any:
+        history = TickerHistory(1440)
+        for ticker in tickers:
+            history.append(ticker)
+        return history.mean, history.vwap, history.volatility
+
+    return run
+
+
+def bench_ladder() -> Callable[[], Any]:
+    """
+    Compute a 10 rung ladder's offsets and shares.
+    """
+    side = {"pcnt_bump_a": 0.5, "pcnt_bump_c": 1.0, "order_count": 10}
+    return lambda: list(zip(bumps(side), shares(10)))
+
+
+def bench_simulate() -> Callable[[], Any]:
+    """
+    Simulate a strategy over 200 price paths of 240 ticks.
+    """
+    # Imported here, as numpy is slow to import.
+    import numpy as np
+
+    from .simulate import sample_paths, simulate_paths
+
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 3,
+        "vol_percent": 10.0,
+    }
+    strategies = [
+        {"name": "bench", "strategy": "bid-and-ask", "buy": side, "sell": side}
+    ]
+    prices = sample_paths(1.0, 0.002, 240, 200, np.random.default_rng(0))
+    return lambda: simulate_paths(strategies, prices, 1000.0, 1000.0, 60.0)
+
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {
+    "netting": bench_netting,
+    "book": bench_book,
+    "history": bench_history,
+    "ladder": bench_ladder,
+    "simulate": bench_simulate,
+}
+
+
+def run_benchmarks(
+    names: Optional[Sequence[str]] = None,
+    number: Optional[int] = None,
+    repeat: int = 1,
+) -> Dict[str, float]:
+    """
+    Run benchmarks (all by default), each number times (by default, enough
+    to take 0.2s) per repeat. Return the best seconds per call, by
+    benchmark name.
+    """
+    results: Dict[str, float] = {}
+    for name in names or list(BENCHMARKS):
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark: {name}")
+        timer = timeit.Timer(BENCHMARKS[name]())
+        if number is None:
+            count, seconds = timer.autorange()
+            times = [seconds] + timer.repeat(repeat - 1, count)
+        else:
+            count = number
+            times = timer.repeat(repeat, count)
+        results[name] = min(times) / count
+    return results
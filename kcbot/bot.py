@@ -3,17 +3,60 @@ KCBot: A simple KuCoin trading bot.
 """
 
 import datetime
+import functools
 import json
 import logging
-import math
 import os
+import socket
 import time
 import traceback
 import uuid
-from typing import Any, Dict, List, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 import kucoin.client as kcc
+import numpy as np
 
+from .accounting import Accounting
+from .balances import Balances
+from .events import (
+    BalanceChange,
+    Event,
+    EventBus,
+    Fill,
+    OrderResult,
+    QueueFull,
+    TickerIntake,
+    TickerUpdate,
+)
+from .fillstats import FillStats
+from .history import TickerHistory
+from .killswitch import KillSwitch
+from .klines import KlineStore
+from .ladder import bumps, shares
+from .latency import Deadline, LatencyControl
+from .lease import Lease, LeaseStore
+from .ledger import Ledger
+from .marketdata import MarketData
+from .memprof import MemoryProfiler
+from .netting import net_orders
+from .orderbook import OrderBook
+from .phases import Phase
+from .retry import RetryQueue, classify
+from .shadow import ShadowBook
+from .symbols import SymbolCache, SymbolInfo
 from .ticker import Ticker
 
 
@@ -22,14 +65,107 @@ class Bot:
         self,
         config: Union[str, Dict[str, Any]] = "",
         keys: Union[str, Dict[str, Any]] = "",
+        wrappers: Sequence[Callable[[str, Any], Any]] = (),
+        outer_wrappers: Sequence[Callable[[str, Any], Any]] = (),
+        market_data: Optional[MarketData] = None,
+        kill_switch: Optional[KillSwitch] = None,
+        events: Optional[EventBus] = None,
+        account: str = "",
     ):
-        self.balances: Dict[str, float] = {}
+        """
+        :param wrappers: functions taking a client name ("market", "trade"
+          or "user") and client, returning a wrapped client, e.g. to rate
+          limit requests. Applied in order, so the last is the outermost.
+        :param outer_wrappers: like wrappers, but applied outside the latency
+          control, so that they see only the requests the Bot makes and the
+          answers it gets (no hedged or abandoned duplicates), e.g. to record
+          or replay a journal.
+        :param market_data: tickers for all markets, shared with other Bots,
+          to look the ticker up in instead of fetching it.
+        :param kill_switch: shared with other Bots, to cancel the orders of
+          all their markets at once.
+        :param events: the bus to publish tickers, balance changes, fills
+          and order results to, shared with other Bots or subscribers.
+        :param account: the name of the account (key set) traded, when a
+          process runs several, to tell their files and leases apart.
+        """
+        self.account = account
+        self.accounting_file = ""
+        self.accounting = Accounting(self.accounting_file)
+        self.balance_refresh = 3600.0
+        self.balances = Balances(self.now)
+        self.book_depth = 0
+        self.book_max_age = 5.0
         self.base = "?"
+        self.history_len = 1440
+        self.history_min = 10
+        self.history = TickerHistory(self.history_len)
+        self.hedge_pct = 95.0
+        # Seconds allowed for an iteration, or 0 for the tick length.
+        self.iteration_deadline = 0.0
         self.strategies: List[Dict[str, Any]] = []
+        self.kline_backfill = 30 * 86400
+        self.kline_dir = ""
+        self.kline_intervals: List[str] = []
+        self.klines: Dict[str, KlineStore] = {}
+        self.kill_file = ""
+        self.kill_shock_pct = 0.0
+        self.kill_switch = kill_switch or KillSwitch()
+        # The kill switch's kills whose cancelled close orders are unpaired.
+        self.kills_seen = 0
+        self.events = events or EventBus()
+        # Seconds to wait for a full blocking subscriber to make room for
+        # an event, before dropping it.
+        self.event_timeout = 1.0
+        self.failed_oids: Set[str] = set()
+        self.fill_stats_file = ""
+        self.fill_stats = FillStats(self.fill_stats_file)
+        # Coordinates redundant instances, if set: only the holder of the
+        # market's lease trades, and the others stand by.
+        self.lease_file = ""
+        self.lease_ttl = 10.0
+        self.lease: Optional[Lease] = None
+        self.lease_holder = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+        self.lease_token: Optional[int] = None
+        self.ledger_file = ""
+        self.ledger = Ledger(self.ledger_file)
         self.loglevel = "INFO"
+        self.market_data = market_data
         self.mkt = "?-?"
+        # Where to cache the order lists fetched, for "cached" runs, or "".
+        self.order_cache_dir = ""
+        # Snapshot the heap every so many iterations of loop(), or never.
+        self.memory_profile_every = 0
+        self.pending: List[Dict[str, Any]] = []
+        # The fills fetched this iteration, by side, until paired.
+        self.fills: Dict[str, List[Dict[str, Any]]] = {}
+        self.phase_settings: Dict[str, Dict[str, Any]] = {}
+        self.price_increment = "0.0001"
         self.quote = "?"
+        self.retry_attempts = 3
+        self.request_timeout = 10.0
+        self.request_timeouts: Dict[str, float] = {}
+        self.retry_wait = 10.0
+        self.retries = RetryQueue(self.retry_attempts)
+        # The ladder rung of each order not yet placed, by clientOid.
+        self.rungs: Dict[str, int] = {}
+        # Strategies whose orders are filled locally, never placed.
+        self.shadow_strategies: List[Dict[str, Any]] = []
+        self.size_increment = "0.0001"
+        self.symbol = SymbolInfo(self.mkt)
+        self.prices = self.symbol.prices
+        self.sizes = self.symbol.sizes
+        self.symbol_ttl = 3600.0
+        self.book = OrderBook(self.prices, self.sizes, self.now)
+        self.shadow = ShadowBook(self.prices)
         self.tick_len = 86400
+        # Seconds between ticker fetches by an intake thread, apart from
+        # the iterations, or 0 to fetch the ticker in each iteration.
+        self.ticker_interval = 0.0
+        self.intake: Optional[TickerIntake] = None
+        # Wall clock time and sleeping, which a replay replaces.
+        self.clock: Callable[[], float] = time.time
+        self.sleep: Callable[[float], None] = self.kill_switch.sleep
         self.ticker = Ticker()
 
         self.config = config
@@ -42,6 +178,27 @@ class Bot:
         self.market = kcc.Market(**thekeys)
         self.trade = kcc.Trade(**thekeys)
         self.user = kcc.User(**thekeys)
+        for wrapper in wrappers:
+            self.market = wrapper("market", self.market)
+            self.trade = wrapper("trade", self.trade)
+            self.user = wrapper("user", self.user)
+        # The kill switch cancels through a client without latency control:
+        # no cap on requests in flight, and no deadline.
+        self.kill_trade = self.trade
+        self.api_key: Optional[str] = thekeys.get("key")
+        # Outermost, so that waiting for other wrappers (e.g. for a rate
+        # limit) counts towards timeouts, and hedged requests go through
+        # them too.
+        self.latency = LatencyControl()
+        self.market = self.latency.wrap("market", self.market)
+        self.trade = self.latency.wrap("trade", self.trade)
+        self.user = self.latency.wrap("user", self.user)
+        for wrapper in outer_wrappers:
+            self.market = wrapper("market", self.market)
+            self.trade = wrapper("trade", self.trade)
+            self.user = wrapper("user", self.user)
+            self.kill_trade = wrapper("trade", self.kill_trade)
+        self.symbols = SymbolCache(self.market, self.symbol_ttl, self.now)
 
         logging.basicConfig(
             level=logging.INFO,
@@ -53,50 +210,218 @@ class Bot:
         )
         self.logger = logging.getLogger("KCBot")
 
-    def get_all(self, func, cached: bool, **kwargs) -> List[Dict[str, Any]]:
-        pages: List[Dict[str, Any]] = []
-        filename = kwargs["side"] + "_" + kwargs["status"] + ".json"
+    def now(self) -> float:
+        """
+        Return the time by the Bot's clock: the clock of its caches, which
+        follows the Bot's if a replay replaces it.
+        """
+        return self.clock()
+
+    def account_file(self, filename: str) -> str:
+        """
+        Return the file to keep the account's state in: filename, with the
+        account's name before the base name (if the Bot has an account),
+        so that accounts sharing a config keep their own.
+        """
+        if not filename or not self.account:
+            return filename
+        head, tail = os.path.split(filename)
+        return os.path.join(head, f"{self.account}_{tail}")
+
+    @property
+    def lease_name(self) -> str:
+        """
+        Return the name of the market's lease, of the account's if any.
+        """
+        return f"{self.account}/{self.mkt}" if self.account else self.mkt
+
+    def order_cache_file(self, side: str, status: str) -> str:
+        """
+        Return the file to cache a market's order list pages in (for
+        "cached" runs), or "" if order_cache_dir is not set.
+        """
+        if not self.order_cache_dir:
+            return ""
+        name = "_".join(
+            part for part in (self.account, self.mkt, side, status) if part
+        )
+        return os.path.join(self.order_cache_dir, name + ".json")
+
+    def iter_orders(
+        self,
+        func,
+        cached: bool,
+        since: int,
+        **kwargs,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield orders newest first, fetching each page only when the previous
+        one is used up, and stopping at the first order created before since
+        (in ms). Pages fetched are also written, as they arrive, to the
+        order cache file (if order_cache_dir is set), which a cached call
+        reads instead.
+        """
+        filename = self.order_cache_file(kwargs["side"], kwargs["status"])
         if cached:
             self.logger.debug(
-                "Getting %s %s orders (cached)",
+                "Streaming %s %s orders (cached)",
                 kwargs["status"],
                 kwargs["side"],
             )
             with open(filename, encoding="utf-8") as handle:
                 pages = json.load(handle)
-            return pages
+            for page in pages:
+                for order in page["items"]:
+                    if order["createdAt"] < since:
+                        return
+                    yield order
+            return
 
-        self.logger.debug(
-            "Getting %s %s orders, page 1",
-            kwargs["status"],
-            kwargs["side"],
-        )
-        kwargs["currentPage"] = 1
         kwargs["pageSize"] = 500
-        pages.append(func(**kwargs))
-        page_count = pages[0]["totalPage"]
-        if page_count > 1:
-            for page in range(2, page_count + 1):
-                kwargs["currentPage"] = page
-                self.logger.debug(
-                    "Getting %s %s orders, page %d/%d",
-                    kwargs["status"],
-                    kwargs["side"],
-                    page,
-                    page_count,
-                )
-                pages.append(func(**kwargs))
-
+        if not filename:
+            yield from self.fetch_orders(func, since, None, kwargs)
+            return
         with open(filename, "w", encoding="utf-8") as handle:
-            json.dump(pages, handle, sort_keys=True, indent=2)
+            handle.write("[")
+            try:
+                yield from self.fetch_orders(func, since, handle, kwargs)
+            finally:
+                handle.write("]\n")
 
-        self.logger.debug(
-            "Got %s %s orders, total %d",
-            kwargs["status"],
-            kwargs["side"],
-            pages[0]["totalNum"],
+    def fetch_orders(
+        self,
+        func,
+        since: int,
+        handle: Optional[TextIO],
+        kwargs: Dict[str, Any],
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield orders from each page in turn, for iter_orders, writing the
+        pages to handle (if any) as a JSON list's items.
+        """
+        page_num, page_count = 1, 1
+        while page_num <= page_count:
+            self.logger.debug(
+                "Getting %s %s orders, page %d",
+                kwargs["status"],
+                kwargs["side"],
+                page_num,
+            )
+            kwargs["currentPage"] = page_num
+            page = func(**kwargs)
+            if handle is not None:
+                if page_num > 1:
+                    handle.write(",\n")
+                json.dump(page, handle, sort_keys=True)
+            page_count = page["totalPage"]
+            page_num += 1
+            for order in page["items"]:
+                if order["createdAt"] < since:
+                    return
+                yield order
+
+    def done_orders(
+        self,
+        cached: bool,
+        side: str,
+        start_at: int,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the filled (at least partly) done orders of one side created
+        since start_at (in ms), newest first.
+        """
+        return (
+            order
+            for order in self.iter_orders(
+                self.trade.get_order_list,
+                cached,
+                start_at,
+                status="done",
+                symbol=self.mkt,
+                side=side,
+                tradeType="TRADE",  # spot
+                type="limit",
+                startAt=start_at,
+            )
+            if order["dealSize"] != "0"
         )
-        return pages
+
+    def fill_times(self, side: str, start_at: int) -> Dict[str, int]:
+        """
+        Return when the orders of one side filled (their last fill, in ms),
+        by order ID, from the fills since start_at (in ms): only for
+        FillStats, so a failure is logged, and returns none.
+        """
+        times: Dict[str, int] = {}
+        page_num, page_count = 1, 1
+        try:
+            while page_num <= page_count:
+                page = self.trade.get_fill_list(
+                    tradeType="TRADE",
+                    symbol=self.mkt,
+                    side=side,
+                    startAt=start_at,
+                    currentPage=page_num,
+                    pageSize=500,
+                )
+                page_count = page["totalPage"]
+                page_num += 1
+                for fill in page["items"]:
+                    oid = fill["orderId"]
+                    times[oid] = max(times.get(oid, 0), int(fill["createdAt"]))
+        except Exception as exc:
+            self.logger.warning("Getting %s fill times failed: %s", side, exc)
+        return times
+
+    def get_fills(self, cached: bool = False) -> None:
+        """
+        Fetch the fills of both sides in the window, for the rebuy and
+        resell phases, and account for them oldest first: realized PnL at
+        average cost depends on the order of the fills.
+        """
+        start_at = int((self.clock() - self.tick_len * 2) * 1000.0)
+        self.fills = {
+            side: list(self.done_orders(cached, side, start_at))
+            for side in ("buy", "sell")
+        }
+        self.account_fills(
+            sorted(
+                self.fills["buy"] + self.fills["sell"],
+                key=lambda order: order["createdAt"],
+            ),
+            start_at,
+        )
+
+    def account_fills(
+        self,
+        fills: Iterable[Dict[str, Any]],
+        start_at: int,
+    ) -> None:
+        """
+        Apply the fills not yet accounted for, in the order given.
+        """
+        filled = 0
+        for fill in fills:
+            if self.accounting.apply_order(fill):
+                filled += 1
+                self.publish(Fill(self.mkt, fill))
+        if self.lease is not None:
+            self.lease.fence()
+        # Fills created before the window will not be fetched again.
+        self.accounting.prune(start_at)
+        self.accounting.save()
+        if filled:
+            position = self.accounting.position(self.mkt)
+            self.logger.info(
+                "Accounted %d fills. %s: inventory %.4f at %.4f, "
+                "realized %.4f, fees %.4f",
+                filled,
+                self.mkt,
+                position.inventory,
+                position.avg_cost,
+                position.realized,
+                position.fees,
+            )
 
     def opposite_orders(
         self,
@@ -104,99 +429,54 @@ class Bot:
         direction: str,
     ) -> List[Dict[str, Any]]:
         """
-        Create opposite direction orders.
+        Create opposite direction orders for fills not yet paired in the
+        ledger, and pair them. The fills are those fetched by get_fills
+        this iteration, or else fetched (and accounted for) here.
         :param direction:
           - "resell" to add new sell orders opposite to executed buy orders
           - "rebuy" to add new buy orders opposite to executed sell orders.
         """
         open_dir = "buy" if direction == "resell" else "sell"
         close_dir = "sell" if direction == "resell" else "buy"
-        start = datetime.datetime.utcnow()
-        start -= datetime.timedelta(seconds=self.tick_len * 2)
-        start_at = int(start.timestamp() * 1000.0)
-
-        openorder_pages = self.get_all(
-            self.trade.get_order_list,
-            cached,
-            status="done",
-            symbol=self.mkt,
-            side=open_dir,
-            tradeType="TRADE",  # spot
-            type="limit",
-            startAt=start_at,
-        )
-        closeorder_active_pages = self.get_all(
-            self.trade.get_order_list,
-            cached,
-            status="active",
-            symbol=self.mkt,
-            side=close_dir,
-            tradeType="TRADE",  # spot
-            type="limit",
-            startAt=start_at,
-        )
-        closeorder_done_pages = self.get_all(
-            self.trade.get_order_list,
-            cached,
-            status="done",
-            symbol=self.mkt,
-            side=close_dir,
-            tradeType="TRADE",  # spot
-            type="limit",
-            startAt=start_at,
-        )
+        start_at = int((self.clock() - self.tick_len * 2) * 1000.0)
 
-        openorders: List[Dict[str, Any]] = []
-        for openorder_page in openorder_pages:
-            for openorder in openorder_page["items"]:
-                if openorder["dealSize"] != "0":
-                    openorders.append(openorder)
-        openorders = sorted(
-            openorders, key=lambda item: item["createdAt"], reverse=True
-        )
+        openorders: Iterator[Dict[str, Any]]
+        if open_dir in self.fills:
+            openorders = iter(self.fills.pop(open_dir))
+        else:
+            fetched = list(self.done_orders(cached, open_dir, start_at))
+            self.account_fills(reversed(fetched), start_at)
+            openorders = iter(fetched)
 
-        closeorders_active: List[Dict[str, Any]] = []
-        for closeorder_active_page in closeorder_active_pages:
-            closeorders_active.extend(closeorder_active_page["items"])
-        closeorders_active = sorted(
-            closeorders_active,
-            key=lambda item: item["createdAt"],
-            reverse=True,
-        )
+        if direction not in self.ledger.migrated:
+            # Migrating goes over the fills twice, so keep them.
+            fills = list(openorders)
+            self.migrate_pairs(cached, direction, start_at, fills)
+            openorders = iter(fills)
 
-        closeorders_done: List[Dict[str, Any]] = []
-        for closeorder_done_page in closeorder_done_pages:
-            closeorders_done.extend(closeorder_done_page["items"])
-        closeorders_done = sorted(
-            closeorders_done, key=lambda item: item["createdAt"], reverse=True
-        )
+        # open-low-buy => close-high-sell at +5%,
+        # open-high-sell => close-low-buy at -5%.
+        permille = 1050 if close_dir == "sell" else 950
 
         new_orders: List[Dict[str, Any]] = []
+        joined = 0
+        now = int(self.clock() * 1000.0)
+        # Fetched for the first order placed at a rung which filled.
+        filled_at: Optional[Dict[str, int]] = None
         for openorder in openorders:
-            price = float(openorder["price"])
-            size = float(openorder["dealSize"])
-            if close_dir == "sell":
-                # open-low-buy => close-high-sell
-                expected_close_price_min = price * 1.045
-                expected_close_price_max = price * 1.055
-            else:
-                # open-high-sell => close-low-buy
-                expected_close_price_min = price * 0.945
-                expected_close_price_max = price * 0.955
-            matching_closeorders_active = [
-                closeorder
-                for closeorder in closeorders_active
-                if abs(float(closeorder["size"]) - size) < 0.0001
-                and float(closeorder["price"]) > expected_close_price_min
-                and float(closeorder["price"]) < expected_close_price_max
-            ]
-            matching_closeorders_done = [
-                closeorder
-                for closeorder in closeorders_done
-                if abs(float(closeorder["dealSize"]) - size) < 0.0001
-                and float(closeorder["price"]) > expected_close_price_min
-                and float(closeorder["price"]) < expected_close_price_max
-            ]
+            if openorder.get("clientOid") in self.fill_stats.pending:
+                if filled_at is None:
+                    filled_at = (
+                        {} if cached else self.fill_times(open_dir, start_at)
+                    )
+                self.fill_stats.fill(
+                    openorder, filled_at.get(openorder["id"], now)
+                )
+                joined += 1
+            if openorder["id"] in self.ledger:
+                continue
+            price = self.prices.units(openorder["price"])
+            size = self.sizes.units(openorder["dealSize"])
             openorder_created_at = datetime.datetime.fromtimestamp(
                 int(openorder["createdAt"] / 1000.0)
             )
@@ -204,98 +484,336 @@ class Bot:
                 "%s %s %10.4f at %9.4f",
                 openorder_created_at.isoformat(),
                 open_dir,
-                size,
-                price,
+                self.sizes.to_float(size),
+                self.prices.to_float(price),
             )
-            if matching_closeorders_active:
-                for mch in matching_closeorders_active:
-                    closeorder_created_at = datetime.datetime.fromtimestamp(
-                        int(mch["createdAt"] / 1000.0)
-                    )
-                    self.logger.debug(
-                        "--> %s %s %10.4f at %9.4f",
-                        closeorder_created_at.isoformat(),
-                        close_dir,
-                        float(mch["size"]),
-                        float(mch["price"]),
-                    )
+            # Round half up to the nearest tick.
+            close_price = (price * permille + 500) // 1000
+            close_size = self.fit_order(close_dir, close_price, size)
+            if close_size == 0:
+                continue
+            self.logger.debug(
+                "--> SHOULD %s %10.4f at %9.4f",
+                close_dir,
+                self.sizes.to_float(size),
+                self.prices.to_float(close_price),
+            )
+            new_order = {
+                "clientOid": str(uuid.uuid4()),
+                "side": close_dir,
+                "symbol": self.mkt,
+                "type": "limit",
+                "stp": "DC",
+                "price": self.prices.to_str(close_price),
+                "size": self.sizes.to_str(close_size),
+                "timeInForce": "GTC",
+            }
+            # Saved once the close order is placed.
+            self.ledger.pair(
+                openorder["id"],
+                new_order["clientOid"],
+                openorder["createdAt"],
+                placed=False,
+            )
+            new_orders.append(new_order)
 
-            if matching_closeorders_done:
-                for mch in matching_closeorders_done:
-                    closeorder_created_at = datetime.datetime.fromtimestamp(
-                        int(mch["createdAt"] / 1000.0)
-                    )
-                    self.logger.debug(
-                        "--> (%s %s %10.4f at %9.4f, done)",
-                        closeorder_created_at.isoformat(),
-                        close_dir,
-                        float(mch["dealSize"]),
-                        float(mch["price"]),
-                    )
+        if self.lease is not None:
+            self.lease.fence()
+        # Fills created before the window will not be fetched again.
+        self.ledger.prune(start_at)
+        self.ledger.save()
+        expired = self.fill_stats.expire(start_at)
+        self.fill_stats.save()
+        self.logger.debug(
+            "Joined %d %s fills to rungs, %d expired unfilled",
+            joined,
+            open_dir,
+            expired,
+        )
+        return new_orders
 
-            if (
-                not matching_closeorders_active
-                and not matching_closeorders_done
-            ):
-                if close_dir == "sell":
-                    # open-low-buy => close-high-sell
-                    close_price = round(price * 1.05, 4)
-                else:
-                    # open-high-sell => close-low-buy
-                    close_price = round(price * 0.95, 4)
+    def migrate_pairs(
+        self,
+        cached: bool,
+        direction: str,
+        start_at: int,
+        openorders: List[Dict[str, Any]],
+    ) -> None:
+        """
+        Pair fills from before the ledger with their existing close orders,
+        matched by the same size, at a price within 0.5% of the close price.
+        """
+        close_dir = "sell" if direction == "resell" else "buy"
+        closeorders_active = self._index_by_lots(
+            self.iter_orders(
+                self.trade.get_order_list,
+                cached,
+                start_at,
+                status="active",
+                symbol=self.mkt,
+                side=close_dir,
+                tradeType="TRADE",  # spot
+                type="limit",
+                startAt=start_at,
+            ),
+            "size",
+        )
+        closeorders_done = self._index_by_lots(
+            self.iter_orders(
+                self.trade.get_order_list,
+                cached,
+                start_at,
+                status="done",
+                symbol=self.mkt,
+                side=close_dir,
+                tradeType="TRADE",  # spot
+                type="limit",
+                startAt=start_at,
+            ),
+            "dealSize",
+        )
+
+        if close_dir == "sell":
+            # open-low-buy => close-high-sell, +4.5% .. +5.5%
+            permille_min, permille_max = 1045, 1055
+        else:
+            # open-high-sell => close-low-buy, -5.5% .. -4.5%
+            permille_min, permille_max = 945, 955
+
+        for openorder in openorders:
+            if openorder["id"] in self.ledger:
+                continue
+            price = self.prices.units(openorder["price"])
+            size = self.sizes.units(openorder["dealSize"])
+            close_min = price * permille_min
+            close_max = price * permille_max
+            matching_closeorders = [
+                (status, closeorder)
+                for status, index in (
+                    ("active", closeorders_active),
+                    ("done", closeorders_done),
+                )
+                for close_price, closeorder in index.get(size, [])
+                if close_min < close_price * 1000 < close_max
+            ]
+            for status, mch in matching_closeorders:
+                closeorder_created_at = datetime.datetime.fromtimestamp(
+                    int(mch["createdAt"] / 1000.0)
+                )
                 self.logger.debug(
-                    "--> SHOULD %s %10.4f at %9.4f",
+                    "%s --> %s %s %s at %s (%s)",
+                    openorder["id"],
+                    closeorder_created_at.isoformat(),
                     close_dir,
-                    size,
-                    close_price,
+                    self.sizes.to_str(size),
+                    mch["price"],
+                    status,
+                )
+            if matching_closeorders:
+                mch = matching_closeorders[0][1]
+                self.ledger.pair(
+                    openorder["id"],
+                    mch.get("clientOid") or mch["id"],
+                    openorder["createdAt"],
                 )
-                new_order = {
-                    "clientOid": str(uuid.uuid4()),
-                    "side": close_dir,
-                    "symbol": self.mkt,
-                    "type": "limit",
-                    "stp": "DC",
-                    "price": str(close_price),
-                    "size": str(size),
-                    "timeInForce": "GTC",
-                }
-                new_orders.append(new_order)
 
-        return new_orders
+        self.ledger.migrated.add(direction)
+        self.logger.info(
+            "Migrated %s pairs to the ledger (%d pairs)",
+            direction,
+            len(self.ledger),
+        )
+
+    def _index_by_lots(
+        self,
+        orders: Iterable[Dict[str, Any]],
+        size_key: str,
+    ) -> Dict[int, List[Tuple[int, Dict[str, Any]]]]:
+        """
+        Index orders (newest first) by size in lots, so that matching is an
+        exact dict lookup followed by an integer price range check, keeping
+        the price (in ticks) alongside each order.
+        """
+        index: Dict[int, List[Tuple[int, Dict[str, Any]]]] = {}
+        for order in orders:
+            index.setdefault(self.sizes.units(order[size_key]), []).append(
+                (self.prices.units(order["price"]), order)
+            )
+        return index
 
     def get_balances(self):
-        accounts = self.user.get_account_list(account_type="trade")
-        # self.logger.debug(
-        #     "accounts: %s",
-        #     json.dumps(accounts, indent=2, sort_keys=True),
-        # )
-        bal_base = float(
-            [acc for acc in accounts if acc["currency"] == self.base][0][
-                "available"
-            ]
-        )
-        bal_quot = float(
-            [acc for acc in accounts if acc["currency"] == self.quote][0][
-                "available"
-            ]
-        )
-        self.balances = {
-            self.base: bal_base,
-            self.quote: bal_quot,
-        }
+        """
+        Update the balances: a full refresh every balance_refresh seconds,
+        or as soon as orders placed since have expired or been cancelled,
+        and in between only the account ledger entries since the last one.
+        """
+        before = {cur: self.balances[cur] for cur in (self.base, self.quote)}
+        released = self.balances.expire()
+        if self.kill_switch.paused:
+            # The kill switch cancelled all our orders.
+            released += self.balances.release(list(self.balances.reserved))
+        if released:
+            self.logger.debug("Released the funds of %d orders", released)
+        if self.balances.age() >= self.balance_refresh:
+            self.balances.refresh(
+                self.user.get_account_list(account_type="trade")
+            )
+        else:
+            page = self.user.get_account_ledger(
+                startAt=self.balances.synced_at,
+                currentPage=1,
+                pageSize=500,
+            )
+            if page["totalPage"] > 1:
+                self.logger.debug("Many ledger entries, refreshing balances")
+                self.balances.refresh(
+                    self.user.get_account_list(account_type="trade")
+                )
+            else:
+                applied = self.balances.apply_ledger(page["items"])
+                self.logger.debug("Applied %d ledger entries", applied)
+        for cur, available in before.items():
+            if self.balances[cur] != available:
+                self.publish(BalanceChange(self.mkt, cur, self.balances[cur]))
         self.logger.info(
             "Balances: %f %s, %f %s",
-            bal_base,
+            self.balances[self.base],
             self.base,
-            bal_quot,
+            self.balances[self.quote],
             self.quote,
         )
 
-    def get_ticker(self):
-        self.ticker = Ticker.from_kucoin(
-            self.market.get_ticker(self.mkt),
-            self.market.get_24h_stats(self.mkt),
+    def get_symbol_info(self) -> None:
+        """
+        Get the market's trading rules, from the cache if not expired.
+        """
+        self.set_symbol_info(self.symbols.get(self.mkt))
+
+    def set_symbol_info(self, symbol: SymbolInfo) -> None:
+        self.symbol = symbol
+        self.prices = symbol.prices
+        self.sizes = symbol.sizes
+
+    def fit_order(self, side: str, price: int, size: int) -> int:
+        """
+        Fit an order to the market's trading rules, so that it is not
+        rejected. Return the (possibly clamped) size, or 0 to drop it.
+        """
+        fitted, reason = self.symbol.fit(price, size)
+        if not fitted:
+            self.logger.info(
+                "Dropping %s order for %s %s at %s %s: %s",
+                side,
+                self.sizes.to_str(size),
+                self.base,
+                self.prices.to_str(price),
+                self.quote,
+                reason,
+            )
+        return fitted
+
+    def get_klines(self) -> None:
+        """
+        Update the local candle stores (if kline_dir is set): backfill each
+        interval once, then append new candles as they close.
+        """
+        if not self.kline_dir:
+            return
+        for interval in self.kline_intervals:
+            store = self.klines.get(interval)
+            if store is None or store.symbol != self.mkt:
+                store = KlineStore(self.kline_dir, self.mkt, interval)
+                self.klines[interval] = store
+            count = store.update(
+                self.market, self.kline_backfill, now=self.clock()
+            )
+            self.logger.debug(
+                "Stored %d new %s candles (total %d)",
+                count,
+                interval,
+                len(store),
+            )
+
+    def get_book(self) -> None:
+        """
+        Seed the local order book from a snapshot of the top book_depth (20
+        or 100) levels if it is out of sync, or if no changes have been
+        applied for book_max_age seconds. Off if book_depth is 0.
+        Without a level-2 change feed calling apply_book_change (the bot
+        runs none: changes are only pushed over a websocket), this is a
+        fresh snapshot every book_max_age seconds.
+        """
+        if not self.book_depth:
+            return
+        if self.book.prices != self.prices or self.book.sizes != self.sizes:
+            self.book = OrderBook(self.prices, self.sizes, self.now)
+        if not self.book.synced or self.book.age() > self.book_max_age:
+            self.book.seed(
+                self.market.get_part_order(self.book_depth, self.mkt)
+            )
+            self.logger.debug(
+                "Order book: %d bids, %d asks, sequence %d",
+                len(self.book.bids),
+                len(self.book.asks),
+                self.book.sequence,
+            )
+
+    def apply_book_change(self, data: Dict[str, Any]) -> None:
+        """
+        Apply a level-2 order book change message, seeding the book again if
+        a gap in the sequence shows that changes were missed. For a change
+        feed to call, from the thread which runs the iterations.
+        """
+        if not self.book.apply(data):
+            self.logger.info(
+                "Order book sequence gap (%d to %s), resyncing",
+                self.book.sequence,
+                data["sequenceStart"],
+            )
+            self.book.seed(
+                self.market.get_part_order(self.book_depth, self.mkt)
+            )
+
+    def depth_price(
+        self,
+        side: str,
+        strategy: Dict[str, Any],
+    ) -> Optional[float]:
+        """
+        Return the price beyond the given depth (in base currency) of the
+        book on our side: the bids for buys and the asks for sells.
+        """
+        depth = self.sizes.units(strategy[side]["depth"])
+        price = self.book.price_to_fill(
+            "sell" if side == "buy" else "buy", depth
         )
+        if price is None:
+            self.logger.info(
+                "%s: book shallower than %s %s",
+                side.capitalize(),
+                strategy[side]["depth"],
+                self.base,
+            )
+            return None
+        return self.prices.to_float(price)
+
+    def get_ticker(self):
+        ticker = None
+        if self.intake is not None:
+            # Published by the intake thread already.
+            ticker = self.intake.latest()
+        if ticker is None:
+            if self.market_data is not None:
+                ticker = self.market_data.get(self.mkt)
+            if ticker is None:
+                ticker = Ticker.from_kucoin(
+                    self.market.get_ticker(self.mkt),
+                    self.market.get_24h_stats(self.mkt),
+                )
+            self.publish(TickerUpdate(self.mkt, ticker))
+        self.kill_switch.shock(self.mkt, self.history.last(), ticker.mid)
+        self.ticker = ticker
+        self.history.append(self.ticker)
         self.logger.info(
             "Ticker for %s (in %s): %s",
             self.mkt,
@@ -322,23 +840,121 @@ class Bot:
 
         self.logger.setLevel(self.loglevel)
         self.mkt = f"{self.base}-{self.quote}"
+        if self.mkt not in self.symbols.symbols:
+            # Until the exchange's metadata has been fetched.
+            self.set_symbol_info(
+                SymbolInfo(
+                    self.mkt,
+                    base_increment=self.size_increment,
+                    price_increment=self.price_increment,
+                )
+            )
+        self.symbols.ttl = self.symbol_ttl
+        if self.history.size != self.history_len:
+            self.history = TickerHistory(self.history_len)
+        self.retries.max_attempts = self.retry_attempts
+        self.latency.timeouts = self.request_timeouts
+        self.latency.default_timeout = self.request_timeout
+        self.latency.hedge_pct = self.hedge_pct
+        if self.kill_file:
+            self.kill_switch.filename = self.kill_file
+        if self.kill_shock_pct:
+            self.kill_switch.shock_pct = self.kill_shock_pct
+        self.kill_switch.register(self.mkt, self.kill_trade, self.api_key)
+        ledger_file = self.account_file(self.ledger_file)
+        if self.ledger.filename != ledger_file:
+            self.ledger = Ledger(ledger_file)
+        accounting_file = self.account_file(self.accounting_file)
+        if self.accounting.filename != accounting_file:
+            self.accounting = Accounting(accounting_file)
+        fill_stats_file = self.account_file(self.fill_stats_file)
+        if self.fill_stats.filename != fill_stats_file:
+            self.fill_stats = FillStats(fill_stats_file)
+        self.load_lease()
+        self.load_intake()
+
+    def load_lease(self) -> None:
+        """
+        Start (or restart) claiming the market's lease, as configured.
+        """
+        if self.lease is not None:
+            if (
+                self.lease.store.filename == self.lease_file
+                and self.lease.name == self.lease_name
+            ):
+                self.lease.ttl = self.lease_ttl
+                return
+            self.lease.stop()
+            self.lease = None
+            self.lease_token = None
+        if self.lease_file:
+            self.lease = Lease(
+                LeaseStore(self.lease_file),
+                self.lease_name,
+                self.lease_holder,
+                self.lease_ttl,
+                self.logger,
+            )
+            self.lease.start()
+
+    def load_intake(self) -> None:
+        """
+        Start (or restart, or stop) the ticker intake thread, as configured.
+        """
+        if self.intake is not None:
+            if (
+                self.intake.mkt == self.mkt
+                and self.ticker_interval
+                and self.intake.thread is not None
+            ):
+                self.intake.interval = self.ticker_interval
+                return
+            self.intake.stop()
+            self.intake = None
+        if self.ticker_interval:
+            self.intake = TickerIntake(
+                self.market,
+                self.mkt,
+                self.events,
+                self.ticker_interval,
+                self.kill_switch,
+                self.logger,
+            )
+            self.intake.start()
+
+    def take_over(self) -> None:
+        """
+        Having just taken the lease, reload the state which the previous
+        holder kept up to date (if its files are shared).
+        """
+        self.logger.info(
+            "Trading %s, lease token %s", self.mkt, self.lease_token
+        )
+        self.ledger = Ledger(self.account_file(self.ledger_file))
+        self.accounting = Accounting(self.account_file(self.accounting_file))
+        self.fill_stats = FillStats(self.account_file(self.fill_stats_file))
 
     def loop(self):
+        profiler: Optional[MemoryProfiler] = None
+        iteration = 0
+        self.kill_switch.install()
         while True:
+            start = time.monotonic()
             try:
-                self.load_config()
-                self.get_balances()
-                self.get_ticker()
-                self.create_orders(
-                    "REBUY",
-                    self.opposite_orders(False, "rebuy"),
-                )
-                self.create_orders(
-                    "RESELL",
-                    self.opposite_orders(False, "resell"),
-                )
-                for strategy in self.strategies:
-                    self.tick(strategy)
+                results = self.run_once()
+                failed = [name for name, ok in results.items() if not ok]
+                if failed:
+                    self.logger.warning("Failed phases: %s", ", ".join(failed))
+                iteration += 1
+                if not self.memory_profile_every:
+                    if profiler is not None:
+                        profiler.stop()
+                        profiler = None
+                else:
+                    if profiler is None:
+                        profiler = MemoryProfiler(logger=self.logger)
+                    profiler.every = self.memory_profile_every
+                    profiler.sample(iteration)
             except KeyboardInterrupt:
                 self.logger.info("Interrupted")
                 break
@@ -350,15 +966,427 @@ class Bot:
                 )
 
             try:
-                self.logger.info("Sleeping for %d seconds", self.tick_len)
-                time.sleep(self.tick_len)
+                # Keep to the schedule, however long the iteration took.
+                sleep_len = max(
+                    0.0, self.tick_len - (time.monotonic() - start)
+                )
+                self.logger.info("Sleeping for %d seconds", sleep_len)
+                if self.lease is not None and not self.lease.held:
+                    # A standby wakes as soon as it takes the lease over.
+                    self.lease.gained.wait(sleep_len)
+                else:
+                    self.sleep(sleep_len)
             except KeyboardInterrupt:
                 self.logger.info("Interrupted")
                 break
+        if self.lease is not None:
+            self.lease.stop()
+        if self.intake is not None:
+            self.intake.stop()
+
+    def run_once(self) -> Dict[str, bool]:
+        """
+        Run one loop iteration, phase by phase. A failed phase only skips
+        the phases which require it. Return whether each phase succeeded.
+        """
+        results: Dict[str, bool] = {}
+        self.pending = []
+        self.fills = {}
+        self.release_unplaced()
+        config = Phase("config", self.load_config)
+        results[config.name] = config.run(self.logger)
+        self.kill_switch.poll()
+        if self.lease is not None:
+            token = self.lease.token if self.lease.renew() else None
+            if token is not None and token != self.lease_token:
+                self.lease_token = token
+                self.take_over()
+            self.lease_token = token
+        deadline = Deadline(self.iteration_deadline or self.tick_len)
+        try:
+            for phase in self.phases():
+                if self.kill_switch.triggered:
+                    results["kill"] = self.kill()
+                    break
+                missing = [
+                    req for req in phase.requires if not results.get(req)
+                ]
+                if missing:
+                    self.logger.warning(
+                        "Skipping phase %s: %s failed",
+                        phase.name,
+                        ", ".join(missing),
+                    )
+                    results[phase.name] = False
+                    continue
+                # A phase's requests end by its own deadline, or the
+                # iteration's, whichever is sooner.
+                self.latency.deadline = min(
+                    deadline, Deadline(phase.deadline), key=lambda d: d.at
+                )
+                results[phase.name] = phase.run(self.logger)
+        finally:
+            self.latency.deadline = None
+        self.log_latency()
+        self.log_events()
+        return results
+
+    def kill(self) -> bool:
+        """
+        Cancel all orders (of every market sharing the kill switch), drop
+        the orders queued, and pause trading.
+        """
+        # Cancelling must not be cut short by the iteration's deadline.
+        self.latency.deadline = None
+        self.pending = []
+        self.retries = RetryQueue(self.retry_attempts)
+        self.release_unplaced()
+        self.kill_switch.kill()
+        return True
+
+    def release_unplaced(self) -> None:
+        """
+        Unpair the fills whose close orders were queued but dropped before
+        they were placed (by a failed iteration, or a kill), except those
+        waiting for a retry, so that they are paired again.
+        """
+        retrying = [order["clientOid"] for *_, order in self.retries.pending]
+        released = self.ledger.release_unplaced(retrying)
+        if released:
+            self.logger.info(
+                "Unpaired %d fills whose close orders were not placed",
+                len(released),
+            )
+
+    def release_cancelled(self) -> None:
+        """
+        Unpair the fills whose close orders a kill cancelled (done, with
+        nothing filled), so that they are closed again when trading
+        resumes. Close orders partly filled stay paired: what they filled
+        is traded on as a fill of its own.
+        """
+        kills = self.kill_switch.kills
+        close_oids = {close_oid for close_oid, _ in self.ledger.pairs.values()}
+        cancelled: List[str] = []
+        if close_oids:
+            # Close orders are placed after the fills they close.
+            start_at = min(
+                created_at for _, created_at in self.ledger.pairs.values()
+            )
+            cancelled = [
+                order["clientOid"]
+                for side in ("buy", "sell")
+                for order in self.iter_orders(
+                    self.trade.get_order_list,
+                    False,
+                    start_at,
+                    status="done",
+                    symbol=self.mkt,
+                    side=side,
+                    tradeType="TRADE",  # spot
+                    type="limit",
+                    startAt=start_at,
+                )
+                if order["dealSize"] == "0"
+                and order.get("clientOid") in close_oids
+            ]
+        if cancelled:
+            if self.lease is not None:
+                self.lease.fence()
+            released = self.ledger.release(cancelled)
+            self.ledger.save()
+            self.logger.info(
+                "Unpaired %d fills whose close orders were cancelled",
+                len(released),
+            )
+        self.kills_seen = kills
+
+    def publish(self, event: Event) -> None:
+        """
+        Publish an event. A subscriber which stays full for event_timeout
+        seconds loses it (and counts it as dropped), rather than holding up
+        trading.
+        """
+        try:
+            self.events.publish(event, self.event_timeout)
+        except QueueFull as exc:
+            self.logger.warning(
+                "Dropped %s event: %s", type(event).__name__, exc
+            )
+
+    def log_latency(self) -> None:
+        tracker = self.latency.tracker
+        for name in sorted(tracker.samples):
+            p50 = tracker.percentile(name, 50.0)
+            if p50 is None:
+                continue
+            self.logger.debug(
+                "Latency of %s: p50 %.3fs, p95 %.3fs, p99 %.3fs",
+                name,
+                p50,
+                tracker.percentile(name, 95.0),
+                tracker.percentile(name, 99.0),
+            )
+
+    def log_events(self) -> None:
+        for name, metrics in sorted(self.events.metrics().items()):
+            self.logger.debug(
+                "Events for %s: depth %d/%d, lag %.3fs, dropped %d",
+                name,
+                metrics["depth"],
+                metrics["maxsize"],
+                metrics["lag"],
+                metrics["dropped"],
+            )
+
+    def phases(self) -> List[Phase]:
+        """
+        Return the phases of a loop iteration after the config is loaded.
+        The deadline, retries and backoff of each phase can be overridden
+        in the "phase_settings" config section, by phase name. A standby
+        (without the lease) only runs the phases which keep its caches
+        warm, and places no orders.
+        """
+        phases = [
+            Phase("symbol", self.get_symbol_info, retries=2),
+            Phase("balances", self.get_balances, retries=2),
+            Phase("ticker", self.get_ticker, retries=2),
+            Phase("klines", self.get_klines, retries=1),
+            Phase("book", self.get_book, retries=1),
+        ]
+        if self.lease is not None and self.lease_token is None:
+            self.logger.info("Standing by for lease %s", self.lease_name)
+            return self.apply_phase_settings(phases)
+        if self.kills_seen != self.kill_switch.kills:
+            phases.append(Phase("unpair", self.release_cancelled, retries=2))
+        if self.kill_switch.paused:
+            self.logger.warning(
+                "Trading paused by kill switch: %s", self.kill_switch.reason
+            )
+            return self.apply_phase_settings(phases)
+        phases += [
+            Phase("fills", self.get_fills, retries=1),
+            Phase(
+                "rebuy",
+                lambda: self.queue_orders(
+                    "REBUY", self.opposite_orders(False, "rebuy")
+                ),
+                retries=1,
+                requires=("fills",),
+            ),
+            Phase(
+                "resell",
+                lambda: self.queue_orders(
+                    "RESELL", self.opposite_orders(False, "resell")
+                ),
+                retries=1,
+                requires=("fills",),
+            ),
+        ]
+        for strategy in self.strategies:
+            phases.append(
+                Phase(
+                    "strategy " + self.strategy_name(strategy),
+                    functools.partial(self.tick, strategy),
+                    retries=1,
+                    requires=("balances", "ticker")
+                    + (
+                        ("book",)
+                        if strategy.get("strategy") == "depth"
+                        else ()
+                    ),
+                )
+            )
+        if self.shadow_strategies:
+            phases.append(
+                Phase("shadow fills", self.shadow_fills, requires=("ticker",))
+            )
+        for strategy in self.shadow_strategies:
+            phases.append(
+                Phase(
+                    "shadow " + self.strategy_name(strategy),
+                    functools.partial(self.shadow_tick, strategy),
+                    retries=1,
+                    requires=("shadow fills", "balances", "ticker")
+                    + (
+                        ("book",)
+                        if strategy.get("strategy") == "depth"
+                        else ()
+                    ),
+                )
+            )
+        # Not retried: a retry could place the same orders twice.
+        phases.append(Phase("submit", self.submit_orders))
+        return self.apply_phase_settings(phases)
+
+    def apply_phase_settings(self, phases: List[Phase]) -> List[Phase]:
+        for phase in phases:
+            for key, val in self.phase_settings.get(phase.name, {}).items():
+                setattr(phase, key, val)
+        return phases
+
+    def average_price(self) -> float:
+        """
+        Return the rolling mean price once there is enough ticker history.
+        Until then, return the mean close of the stored candles over the
+        same window (if there are enough), or else the mid-point of the
+        day's high and low.
+        """
+        if len(self.history) >= self.history_min:
+            return self.history.mean
+        closes = self.kline_closes(self.history_len * self.tick_len)
+        if len(closes) >= self.history_min:
+            return float(closes.mean())
+        return (self.ticker.high + self.ticker.low) / 2.0
+
+    def kline_closes(self, seconds: float) -> np.ndarray:
+        """
+        Return a view of the closes of the last seconds of the finest
+        interval stored for the market (empty if none).
+        """
+        stores = [
+            store for store in self.klines.values() if store.symbol == self.mkt
+        ]
+        if not stores:
+            return np.empty(0)
+        store = min(stores, key=lambda store: store.seconds)
+        return store.since("close", self.clock() - seconds)
+
+    @staticmethod
+    def strategy_name(strategy: Dict[str, Any]) -> str:
+        """
+        Return a strategy's name, or its kind if it has none.
+        """
+        return strategy.get("name") or strategy.get("strategy") or "unnamed"
 
     def tick(self, strategy: Dict[str, Any]) -> None:
-        self.create_orders("BUY", self.buy_orders(strategy))
-        self.create_orders("SELL", self.sell_orders(strategy))
+        self.queue_orders(
+            self.strategy_name(strategy),
+            self.buy_orders(strategy) + self.sell_orders(strategy),
+        )
+
+    def shadow_fills(self) -> None:
+        """
+        Fill the shadow strategies' resting orders which the price crossed
+        since the last tick.
+        """
+        self.shadow.prices = self.prices
+        now = int(self.clock() * 1000.0)
+        self.record_shadow(self.shadow.match(self.ticker, now), now)
+
+    def shadow_tick(self, strategy: Dict[str, Any]) -> None:
+        """
+        Run a shadow strategy on the same ticker, balances and book as the
+        live ones, and fill its orders locally instead of placing them.
+        Its results are kept as those of strategy "shadow:<name>".
+        """
+        label = "shadow:" + self.strategy_name(strategy)
+        now = int(self.clock() * 1000.0)
+        orders = self.buy_orders(strategy) + self.sell_orders(strategy)
+        for order in orders:
+            order["remark"] = label
+            rung = self.rungs.pop(order["clientOid"], None)
+            if rung is not None:
+                self.fill_stats.placed(self.mkt, order, rung, now)
+        self.record_shadow(self.shadow.add(orders, self.ticker, now), now)
+        shadow = self.accounting.position(self.mkt, label)
+        live = self.accounting.position(self.mkt)
+        self.logger.info(
+            "%s: %d orders resting, inventory %.4f, realized %.4f "
+            "(live: inventory %.4f, realized %.4f)",
+            label,
+            len(self.shadow),
+            shadow.inventory,
+            shadow.realized,
+            live.inventory,
+            live.realized,
+        )
+
+    def record_shadow(self, fills: List[Dict[str, Any]], now: int) -> None:
+        for fill in fills:
+            self.accounting.apply_shadow(self.mkt, fill)
+            self.fill_stats.fill(dict(fill, dealSize=fill["size"]), now)
+        if fills:
+            self.logger.info("Shadow fills: %d", len(fills))
+            self.accounting.save()
+            self.fill_stats.save()
+
+    def queue_orders(self, label: str, orders: List[Dict[str, Any]]) -> None:
+        """
+        Queue orders to be netted and submitted at the end of the iteration,
+        labelled (as the order remark) with where they came from.
+        """
+        for order in orders:
+            order["remark"] = label
+        self.pending.extend(orders)
+
+    def net_pending(self) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """
+        Take the orders queued this iteration, and return them netted with
+        sizes fitted to the market, and the aliases of the orders merged.
+        """
+        orders, self.pending = self.pending, []
+        aliases: Dict[str, str] = {}
+        netted: List[Dict[str, Any]] = []
+        for order in net_orders(orders, self.prices, self.sizes, aliases):
+            size = self.fit_order(
+                order["side"],
+                self.prices.units(order["price"]),
+                self.sizes.units(order["size"]),
+            )
+            if size:
+                netted.append(dict(order, size=self.sizes.to_str(size)))
+        self.logger.info(
+            "Netted %d queued orders to %d", len(orders), len(netted)
+        )
+        for oid in aliases:
+            self.rungs.pop(oid, None)
+        return netted, aliases
+
+    def plan_orders(self) -> List[Dict[str, Any]]:
+        """
+        Return the orders which the strategies would place this tick,
+        netted and each with its "rung", without placing them. Close
+        orders (rebuy and resell) are left out, as they depend on fills and
+        would change the ledger.
+        """
+        self.load_config()
+        self.get_symbol_info()
+        self.get_balances()
+        self.get_ticker()
+        if any(strat.get("strategy") == "depth" for strat in self.strategies):
+            self.get_book()
+        self.pending = []
+        for strategy in self.strategies:
+            self.tick(strategy)
+        netted, _ = self.net_pending()
+        return [
+            dict(order, rung=self.rungs.pop(order["clientOid"], None))
+            for order in netted
+        ]
+
+    def submit_orders(self) -> None:
+        """
+        Net the orders queued this iteration and submit them as one set,
+        then unpair fills whose close orders failed.
+        """
+        netted, aliases = self.net_pending()
+        if self.lease is not None:
+            # Another instance may have taken over since the orders were
+            # made, and be making the same ones.
+            self.lease.fence()
+        self.ledger.rename(aliases)
+        try:
+            self.create_orders("NET", netted)
+        finally:
+            if self.failed_oids:
+                released = self.ledger.release(self.failed_oids)
+                self.logger.info("Unpaired %d fills", len(released))
+                for oid in self.failed_oids:
+                    self.rungs.pop(oid, None)
+                self.failed_oids.clear()
+            # With the pairs of the close orders placed, so far.
+            self.ledger.save()
 
     def buy_orders(self, strategy: Dict[str, Any]) -> List[Dict[str, Any]]:
         self.logger.info("--- Buy %s ---", self.mkt)
@@ -374,15 +1402,14 @@ class Bot:
             bal_base,
             self.base,
         )
-        vol_total = sum(math.sqrt(i) for i in range(1, buy_order_count + 1))
         vol_p = strategy["buy"]["vol_percent"]
-        vol_mul = bal_base / vol_total * vol_p / 100.0
+        vol_buy = bal_base * vol_p / 100.0
         if strategy["strategy"] == "day-high-low":
             base_price = self.ticker.low
         elif strategy["strategy"] == "bid-and-ask":
             base_price = self.ticker.bid
         elif strategy["strategy"] == "bid-or-ask":
-            avg = (self.ticker.high + self.ticker.low) / 2.0
+            avg = self.average_price()
             if self.ticker.bid < avg:
                 self.logger.info(
                     "Buy: bid < avg (%8.4f < %8.4f)",
@@ -391,32 +1418,42 @@ class Bot:
                 )
                 return []
             base_price = self.ticker.bid
+        elif strategy["strategy"] == "depth":
+            depth_price = self.depth_price("buy", strategy)
+            if depth_price is None:
+                return []
+            base_price = depth_price
         else:
             raise Exception("Unknown strategy: " + strategy["strategy"])
         orders: List[Dict[str, Any]] = []
-        for n in range(1, buy_order_count + 1):
-            pcnt_bump_buy = (
-                strategy["buy"]["pcnt_bump_a"] * n**2
-                + strategy["buy"]["pcnt_bump_c"]
-            )
-            p_buy = round(base_price * (1 - pcnt_bump_buy / 100), 4)
-            if p_buy <= 0.0:
+        for rung, (pcnt_bump_buy, share) in enumerate(
+            zip(bumps(strategy["buy"]), shares(buy_order_count))
+        ):
+            p_buy = self.prices.units(base_price * (1 - pcnt_bump_buy / 100))
+            if p_buy <= 0:
                 self.logger.warning(
                     "Skipping buy order. price=%9.4f %s",
-                    p_buy,
+                    self.prices.to_float(p_buy),
                     self.quote,
                 )
                 continue
 
-            vol_buy = round(vol_mul * math.sqrt(n), 4)
+            size_buy = self.fit_order(
+                "buy", p_buy, self.sizes.units_down(vol_buy * share)
+            )
+            if size_buy == 0:
+                continue
+
+            client_oid = str(uuid.uuid4())
+            self.rungs[client_oid] = rung
             order = {
-                "clientOid": str(uuid.uuid4()),
+                "clientOid": client_oid,
                 "side": "buy",
                 "symbol": self.mkt,
                 "type": "limit",
                 "stp": "DC",
-                "price": str(p_buy),
-                "size": str(vol_buy),
+                "price": self.prices.to_str(p_buy),
+                "size": self.sizes.to_str(size_buy),
                 "timeInForce": "GTT",
                 "cancelAfter": self.tick_len,
             }
@@ -437,15 +1474,14 @@ class Bot:
             return []
 
         self.logger.info("Balance: %10.3f %s", bal_base, self.base)
-        vol_total = sum(math.sqrt(i) for i in range(1, sell_order_count + 1))
         vol_p = strategy["sell"]["vol_percent"]
-        vol_mul = bal_base / vol_total * vol_p / 100.0
+        vol_sell = bal_base * vol_p / 100.0
         if strategy["strategy"] == "day-high-low":
             base_price = self.ticker.high
         elif strategy["strategy"] == "bid-and-ask":
             base_price = self.ticker.ask
         elif strategy["strategy"] == "bid-or-ask":
-            avg = (self.ticker.high + self.ticker.low) / 2.0
+            avg = self.average_price()
             if self.ticker.ask > avg:
                 self.logger.info(
                     "Sell: ask > avg (%8.4f > %8.4f)",
@@ -454,26 +1490,35 @@ class Bot:
                 )
                 return []
             base_price = self.ticker.ask
+        elif strategy["strategy"] == "depth":
+            depth_price = self.depth_price("sell", strategy)
+            if depth_price is None:
+                return []
+            base_price = depth_price
         else:
             raise Exception("Unknown strategy: " + strategy["strategy"])
         orders: List[Dict[str, Any]] = []
-        for n in range(1, sell_order_count + 1):
-            pcnt_bump_sell = (
-                strategy["sell"]["pcnt_bump_a"] * n**2
-                + strategy["sell"]["pcnt_bump_c"]
-            )
-            p_sell = round(base_price * (1 + pcnt_bump_sell / 100), 4)
+        for rung, (pcnt_bump_sell, share) in enumerate(
+            zip(bumps(strategy["sell"]), shares(sell_order_count))
+        ):
+            p_sell = self.prices.units(base_price * (1 + pcnt_bump_sell / 100))
 
-            vol_sell = round(vol_mul * math.sqrt(n), 4)
+            size_sell = self.fit_order(
+                "sell", p_sell, self.sizes.units_down(vol_sell * share)
+            )
+            if size_sell == 0:
+                continue
 
+            client_oid = str(uuid.uuid4())
+            self.rungs[client_oid] = rung
             order = {
-                "clientOid": str(uuid.uuid4()),
+                "clientOid": client_oid,
                 "side": "sell",
                 "symbol": self.mkt,
                 "type": "limit",
                 "stp": "DC",
-                "price": str(p_sell),
-                "size": str(vol_sell),
+                "price": self.prices.to_str(p_sell),
+                "size": self.sizes.to_str(size_sell),
                 "timeInForce": "GTT",
                 "cancelAfter": self.tick_len,
             }
@@ -497,16 +1542,140 @@ class Bot:
                     self.quote,
                     self.base,
                 )
-            result = self.trade.create_bulk_orders(self.mkt, batch)
-            # self.logger.debug(
-            #     "Bulk %s order results: %s",
-            #     side,
-            #     json.dumps(result, indent=2, sort_keys=True),
-            # )
-            failed = [
-                res for res in result["data"] if res["failMsg"] is not None
-            ]
-            count += len(batch) - len(failed)
+            count += self.submit_batch(side, batch, 0)
+
+        # Only retry once every batch has had its first attempt.
+        retried = self.retry_orders()
+        count += retried.pop(side, 0)
+        for other_side, other_count in retried.items():
+            self.logger.info(
+                "Placed %d %s orders on retry", other_count, other_side
+            )
 
         self.logger.info("Placed %d/%d %s orders", count, len(orders), side)
         return count
+
+    def submit_batch(
+        self,
+        side: str,
+        batch: List[Dict[str, Any]],
+        attempt: int,
+    ) -> int:
+        """
+        Submit one batch of up to 5 orders, queueing any that failed for a
+        transient reason to be retried. Return the number of orders placed.
+        """
+        try:
+            result = self.trade.create_bulk_orders(self.mkt, batch)
+        except Exception as exc:
+            kind = classify(str(exc))
+            self.logger.warning(
+                "Bulk %s order request failed (%s): %s", side, kind, exc
+            )
+            if kind == "retry":
+                self.queue_retry(side, attempt, batch)
+            else:
+                self.failed_oids.update(order["clientOid"] for order in batch)
+                for order in batch:
+                    self.publish(OrderResult(self.mkt, order, False, str(exc)))
+            return 0
+
+        # self.logger.debug(
+        #     "Bulk %s order results: %s",
+        #     side,
+        #     json.dumps(result, indent=2, sort_keys=True),
+        # )
+        placed = 0
+        placed_oids: List[str] = []
+        failed: List[Dict[str, Any]] = []
+        for order, res in zip(batch, result["data"]):
+            kind = "ok" if res["failMsg"] is None else classify(res["failMsg"])
+            if kind in ("ok", "duplicate"):
+                # A duplicate was placed by an earlier attempt with the same
+                # clientOid, whose result was lost.
+                placed += 1
+                placed_oids.append(order["clientOid"])
+                self.balances.reserve(
+                    self.base,
+                    self.quote,
+                    order["side"],
+                    float(order["price"]),
+                    float(order["size"]),
+                    order["clientOid"],
+                    (
+                        float(order["cancelAfter"])
+                        if order.get("timeInForce") == "GTT"
+                        else None
+                    ),
+                )
+                rung = self.rungs.pop(order["clientOid"], None)
+                if rung is not None:
+                    self.fill_stats.placed(
+                        self.mkt, order, rung, int(self.clock() * 1000.0)
+                    )
+                self.publish(OrderResult(self.mkt, order, True))
+            elif kind == "retry":
+                failed.append(order)
+            else:
+                self.failed_oids.add(order["clientOid"])
+                self.logger.warning(
+                    "%s order %s failed: %s",
+                    side,
+                    order["clientOid"],
+                    res["failMsg"],
+                )
+                self.publish(
+                    OrderResult(self.mkt, order, False, res["failMsg"])
+                )
+        self.ledger.confirm(placed_oids)
+        if failed:
+            self.queue_retry(side, attempt, failed)
+        return placed
+
+    def queue_retry(
+        self,
+        side: str,
+        attempt: int,
+        orders: List[Dict[str, Any]],
+    ) -> None:
+        if not self.retries.add(self.clock(), attempt, side, orders):
+            self.failed_oids.update(order["clientOid"] for order in orders)
+            self.logger.warning(
+                "Giving up on %d %s orders after %d attempts",
+                len(orders),
+                side,
+                attempt + 1,
+            )
+
+    def retry_orders(self) -> Dict[str, int]:
+        """
+        Resubmit queued orders as they become due, for up to retry_wait
+        seconds. Orders not yet due by then stay queued for the next call.
+        Return the number of orders placed, by side.
+        """
+        placed: Dict[str, int] = {}
+        deadline = self.clock() + self.retry_wait
+        while True:
+            next_due = self.retries.next_due()
+            if next_due is None or next_due > deadline:
+                break
+            now = self.clock()
+            if next_due > now:
+                self.sleep(next_due - now)
+            groups: Dict[Tuple[int, str], List[Dict[str, Any]]] = {}
+            for attempt, side, order in self.retries.pop_due(
+                max(now, next_due)
+            ):
+                groups.setdefault((attempt, side), []).append(order)
+            for (attempt, side), orders in groups.items():
+                self.logger.info(
+                    "Retrying %d %s orders (attempt %d)",
+                    len(orders),
+                    side,
+                    attempt + 1,
+                )
+                for i in range(0, len(orders), 5):
+                    placed[side] = placed.get(side, 0) + self.submit_batch(
+                        side, orders[slice(i, i + 5)], attempt
+                    )
+        return placed
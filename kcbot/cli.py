@@ -0,0 +1,322 @@
+"""
+The kcbot command line: run the bot, plan a tick's orders, replay a
+journal, simulate a config's exposure, or benchmark the hot paths.
+Modules are imported by the subcommands which need them, so that those
+which need neither the exchange client nor numpy start quickly.
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def add_run_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser("run", help="Run the bot")
+    parser.add_argument(
+        "--configfile",
+        help="One config file per market",
+        nargs="+",
+    )
+    parser.add_argument("--keysfile", help="")
+    parser.add_argument(
+        "--accountsfile",
+        help="Run the markets of several accounts, instead of one",
+    )
+    parser.add_argument(
+        "--workers",
+        help="Run markets sharded across this many processes",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--rate",
+        help="Requests per second shared by all workers",
+        type=float,
+        default=10.0,
+    )
+    parser.add_argument(
+        "--tick-len",
+        help="Seconds between a worker's checks for markets due to run "
+        "(each runs at its config's tick_len)",
+        type=float,
+        default=60.0,
+    )
+    parser.add_argument(
+        "--record",
+        help="Append every exchange request and response to this journal",
+    )
+    parser.add_argument(
+        "--replay",
+        help="Run the config over a recorded journal, without the exchange",
+    )
+    parser.set_defaults(func=run)
+
+
+def add_plan_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "plan",
+        help="Show the orders a tick would place, without placing them",
+    )
+    parser.add_argument("--configfile", help="", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--keysfile", help="Use live data")
+    source.add_argument(
+        "--journal",
+        help="Use the data at the start of a recorded journal",
+    )
+    parser.add_argument(
+        "--json",
+        help="Print the orders as JSON",
+        action="store_true",
+    )
+    parser.set_defaults(func=plan)
+
+
+def add_replay_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "replay", help="Run a config over a recorded journal"
+    )
+    parser.add_argument("--configfile", help="", required=True)
+    parser.add_argument("--journal", help="", required=True)
+    parser.add_argument(
+        "--iterations",
+        help="Stop after this many iterations",
+        type=int,
+    )
+    parser.set_defaults(func=replay)
+
+
+def add_simulate_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "simulate",
+        help="Simulate the exposure of a config's strategies, from the "
+        "volatility of its stored candles",
+    )
+    parser.add_argument("--configfile", help="", required=True)
+    parser.add_argument(
+        "--base-balance",
+        help="Starting balance of the base currency",
+        type=float,
+        required=True,
+    )
+    parser.add_argument(
+        "--quote-balance",
+        help="Starting balance of the quote currency",
+        type=float,
+        required=True,
+    )
+    parser.add_argument(
+        "--interval",
+        help="Candles to use (default: the config's first kline interval)",
+    )
+    parser.add_argument(
+        "--days",
+        help="Days of candles to take the volatility from",
+        type=float,
+        default=30.0,
+    )
+    parser.add_argument(
+        "--ticks",
+        help="Ticks per path (default: a day)",
+        type=int,
+    )
+    parser.add_argument("--paths", help="", type=int, default=4000)
+    parser.add_argument(
+        "--workers",
+        help="Processes (default: one per CPU)",
+        type=int,
+    )
+    parser.add_argument("--seed", help="", type=int)
+    parser.add_argument(
+        "--json",
+        help="Print the percentiles as JSON",
+        action="store_true",
+    )
+    parser.set_defaults(func=simulate)
+
+
+def add_bench_parser(subparsers: Any) -> None:
+    parser = subparsers.add_parser(
+        "bench", help="Benchmark the hot paths, without the exchange"
+    )
+    parser.add_argument(
+        "names",
+        help="Benchmarks to run (default: all)",
+        nargs="*",
+    )
+    parser.add_argument(
+        "--number",
+        help="Calls per repeat (default: enough to take 0.2s)",
+        type=int,
+    )
+    parser.add_argument("--repeat", help="", type=int, default=1)
+    parser.set_defaults(func=bench)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parse cmdline arguments"""
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # Before subcommands, options alone ran the bot.
+    if argv and argv[0].startswith("-") and argv[0] not in ("-h", "--help"):
+        argv.insert(0, "run")
+
+    parser = argparse.ArgumentParser(
+        prog="kcbot", description="Interact with KuCoin"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_run_parser(subparsers)
+    add_plan_parser(subparsers)
+    add_replay_parser(subparsers)
+    add_simulate_parser(subparsers)
+    add_bench_parser(subparsers)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        if args.replay:
+            if not args.configfile:
+                parser.error("--replay needs --configfile")
+        elif not args.accountsfile and not (args.configfile and args.keysfile):
+            parser.error("--configfile and --keysfile, or --accountsfile")
+    return args
+
+
+def run(args: argparse.Namespace) -> None:
+    if args.replay:
+        from .journal import replay_session
+
+        replay_session(args.configfile[0], args.replay)
+        return
+    if args.accountsfile:
+        from .accounts import Accounts
+
+        Accounts(args.accountsfile).run()
+        return
+    if args.workers or len(args.configfile) > 1:
+        from .supervisor import Supervisor
+
+        supervisor = Supervisor(
+            configs=args.configfile,
+            keys=args.keysfile,
+            workers=max(1, args.workers),
+            rate=args.rate,
+            tick_len=args.tick_len,
+        )
+        supervisor.run()
+        return
+
+    from .bot import Bot
+    from .journal import Recorder
+
+    wrappers = [Recorder(args.record).wrap] if args.record else []
+    bot = Bot(
+        config=args.configfile[0],
+        keys=args.keysfile,
+        outer_wrappers=wrappers,
+    )
+    bot.loop()
+
+
+def plan(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from .bot import Bot
+
+    with open(args.configfile, encoding="utf-8") as configf:
+        cfg = json.load(configf)
+    # Planning takes no lease, so does not make a running bot stand by.
+    cfg["lease_file"] = ""
+    if args.journal:
+        from .journal import Replay
+
+        replay = Replay(args.journal)
+        bot = Bot(config=cfg, keys={}, outer_wrappers=[replay.wrap])
+        bot.clock = replay.clock
+    else:
+        bot = Bot(config=cfg, keys=args.keysfile)
+    orders = bot.plan_orders()
+    if args.json:
+        print(json.dumps(orders, indent=2, sort_keys=True))
+        return orders
+    print(f"{'side':4s} {'price':>12s} {'size':>12s} rung strategy")
+    for order in orders:
+        print(
+            f"{order['side']:4s} {order['price']:>12s} {order['size']:>12s} "
+            f"{'-' if order['rung'] is None else order['rung']:>4} "
+            f"{order['remark']}"
+        )
+    return orders
+
+
+def replay(args: argparse.Namespace) -> None:
+    from .journal import replay_session
+
+    replay_session(args.configfile, args.journal, args.iterations)
+
+
+def simulate(args: argparse.Namespace) -> Dict[str, Dict[float, float]]:
+    from .klines import INTERVALS, KlineStore
+    from .simulate import kline_volatility
+    from .simulate import simulate as run_simulation
+
+    with open(args.configfile, encoding="utf-8") as configf:
+        cfg = json.load(configf)
+    symbol = f"{cfg['base']}-{cfg['quote']}"
+    interval = args.interval or (cfg.get("kline_intervals") or ["1hour"])[0]
+    kline_dir = cfg.get("kline_dir", "")
+    if not kline_dir or not os.path.isdir(
+        os.path.join(kline_dir, symbol, interval)
+    ):
+        raise SystemExit(
+            f"No {interval} candles stored for {symbol}: "
+            "run the bot with kline_dir and kline_intervals set"
+        )
+    store = KlineStore(kline_dir, symbol, interval)
+    last = store.last_time()
+    closes = store.since("close", (last or 0) - args.days * 86400.0)
+    if len(closes) < 3:
+        raise SystemExit(f"Too few {interval} candles stored for {symbol}")
+    tick_len = float(cfg.get("tick_len", 86400))
+    volatility = kline_volatility(closes, INTERVALS[interval], tick_len)
+    price = float(closes[-1])
+    report = run_simulation(
+        cfg["strategies"],
+        price=price,
+        volatility=volatility,
+        base=args.base_balance,
+        quote=args.quote_balance,
+        tick_len=tick_len,
+        ticks=args.ticks or max(1, round(86400.0 / tick_len)),
+        paths=args.paths,
+        workers=args.workers,
+        seed=args.seed,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+        return report
+    print(
+        f"{symbol}: price {price:.6g}, volatility {volatility:.4%} per "
+        f"tick, from {len(closes)} {interval} candles"
+    )
+    pcts = next(iter(report.values()))
+    print(f"{'':12s}" + "".join(f"{f'p{pct:g}':>14s}" for pct in pcts))
+    for name, values in report.items():
+        print(f"{name:12s}" + "".join(f"{values[pct]:14.4f}" for pct in pcts))
+    return report
+
+
+def bench(args: argparse.Namespace) -> Dict[str, float]:
+    from .bench import run_benchmarks
+
+    results = run_benchmarks(args.names, args.number, args.repeat)
+    for name, seconds in results.items():
+        print(f"{name:10s} {seconds * 1e6:12.1f} us/call")
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
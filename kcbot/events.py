@@ -0,0 +1,350 @@
+"""
+Classes for an internal event bus: typed events, published to bounded
+queues, one per subscriber, with backpressure; and a TickerIntake, which
+fetches market data at its own pace, apart from the order stages.
+"""
+
+import collections
+import logging
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple, Type
+
+from .ticker import Ticker
+
+
+class Event:
+    """
+    An event. Lossy events (market data) are superseded by the next one of
+    their kind, so a subscriber falling behind drops the oldest, whatever
+    its policy, rather than slowing the publisher down.
+    """
+
+    __slots__ = ("market",)
+    lossy = False
+
+    def __init__(self, market: str):
+        self.market = market
+
+
+class TickerUpdate(Event):
+    __slots__ = ("ticker",)
+    lossy = True
+
+    def __init__(self, market: str, ticker: Ticker):
+        super().__init__(market)
+        self.ticker = ticker
+
+
+class BalanceChange(Event):
+    __slots__ = ("currency", "available")
+    lossy = True
+
+    def __init__(self, market: str, currency: str, available: float):
+        super().__init__(market)
+        self.currency = currency
+        self.available = available
+
+
+class Fill(Event):
+    """
+    A done order, filled (at least partly).
+    """
+
+    __slots__ = ("order",)
+
+    def __init__(self, market: str, order: Dict[str, Any]):
+        super().__init__(market)
+        self.order = order
+
+
+class OrderResult(Event):
+    """
+    The result of submitting an order: placed, or failed with a message.
+    """
+
+    __slots__ = ("order", "ok", "message")
+
+    def __init__(
+        self,
+        market: str,
+        order: Dict[str, Any],
+        ok: bool,
+        message: Optional[str] = None,
+    ):
+        super().__init__(market)
+        self.order = order
+        self.ok = ok
+        self.message = message
+
+
+class QueueFull(Exception):
+    """
+    A blocking subscription stayed full for longer than the publisher was
+    prepared to wait.
+    """
+
+
+class Subscription:
+    """
+    A bounded queue of the events of one type (and its subtypes), of one
+    market or all, for one subscriber. When full, a "drop_oldest"
+    subscription drops its oldest event to make room, and a "block" one
+    makes the publisher wait for the subscriber (for up to timeout
+    seconds, or the publisher's own limit, whichever is shorter, then
+    drops the event and raises QueueFull). Lossy
+    events never wait: whatever the policy, they replace the oldest lossy
+    event queued (or are dropped, if there is none).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        event_type: Type[Event],
+        maxsize: int = 100,
+        policy: str = "",
+        timeout: Optional[float] = None,
+        market: str = "",
+    ):
+        self.name = name
+        self.event_type = event_type
+        self.market = market
+        self.maxsize = maxsize
+        self.policy = policy or (
+            "drop_oldest" if event_type.lossy else "block"
+        )
+        if self.policy not in ("drop_oldest", "block"):
+            raise ValueError(f"Unknown policy: {self.policy}")
+        self.timeout = timeout
+        # (event, published at, by time.monotonic()).
+        self.events: Deque[Tuple[Event, float]] = collections.deque()
+        self.cond = threading.Condition()
+        self.dropped = 0
+        self.delivered = 0
+        # Seconds from publishing to delivery, of the latest delivered.
+        self.last_lag = 0.0
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def wants(self, event: Event) -> bool:
+        return isinstance(event, self.event_type) and (
+            not self.market or event.market == self.market
+        )
+
+    def put(self, event: Event, timeout: Optional[float] = None) -> None:
+        """
+        Queue an event, waiting for room for up to the subscription's
+        timeout or timeout seconds, whichever is shorter (forever if both
+        are None).
+        """
+        limits = [t for t in (self.timeout, timeout) if t is not None]
+        wait = min(limits) if limits else None
+        with self.cond:
+            if len(self.events) >= self.maxsize:
+                if self.policy == "drop_oldest":
+                    self.events.popleft()
+                    self.dropped += 1
+                elif event.lossy:
+                    self.dropped += 1
+                    oldest = next(
+                        (item for item in self.events if item[0].lossy), None
+                    )
+                    if oldest is None:
+                        return
+                    self.events.remove(oldest)
+                elif not self.cond.wait_for(
+                    lambda: len(self.events) < self.maxsize, wait
+                ):
+                    self.dropped += 1
+                    raise QueueFull(f"Subscription {self.name} is full")
+            self.events.append((event, time.monotonic()))
+            self.cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        Return the oldest event, waiting up to timeout seconds (forever if
+        None) for one, or None.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.events, timeout):
+                return None
+            event, published = self.events.popleft()
+            self.delivered += 1
+            self.last_lag = time.monotonic() - published
+            self.cond.notify_all()
+            return event
+
+    def drain(self) -> List[Event]:
+        """
+        Return every event queued, without waiting.
+        """
+        events: List[Event] = []
+        while True:
+            event = self.get(0.0)
+            if event is None:
+                return events
+            events.append(event)
+
+    def lag(self) -> float:
+        """
+        Return how long the oldest queued event has waited, in seconds.
+        """
+        with self.cond:
+            if not self.events:
+                return 0.0
+            return time.monotonic() - self.events[0][1]
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "depth": len(self.events),
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "lag": self.lag(),
+            "last_lag": self.last_lag,
+        }
+
+
+class EventBus:
+    """
+    Publishes events to the subscriptions to their type, each a bounded
+    queue consumed at its subscriber's own pace.
+    """
+
+    def __init__(self) -> None:
+        self.subscriptions: List[Subscription] = []
+        self.lock = threading.Lock()
+        self.published: Dict[str, int] = {}
+
+    def subscribe(
+        self,
+        event_type: Type[Event],
+        name: str,
+        maxsize: int = 100,
+        policy: str = "",
+        timeout: Optional[float] = None,
+        market: str = "",
+    ) -> Subscription:
+        subscription = Subscription(
+            name, event_type, maxsize, policy, timeout, market
+        )
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            self.subscriptions.remove(subscription)
+
+    def publish(self, event: Event, timeout: Optional[float] = None) -> None:
+        """
+        Queue an event for each subscription to its type, which may wait
+        for a blocking subscription with no room, for up to timeout seconds
+        each (if given). If one stays full, the others still get the event,
+        then QueueFull is raised.
+        """
+        kind = type(event).__name__
+        with self.lock:
+            self.published[kind] = self.published.get(kind, 0) + 1
+            subscriptions = [
+                sub for sub in self.subscriptions if sub.wants(event)
+            ]
+        full: Optional[QueueFull] = None
+        for subscription in subscriptions:
+            try:
+                subscription.put(event, timeout)
+            except QueueFull as exc:
+                full = full or exc
+        if full is not None:
+            raise full
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the depth, lag and counts of each subscription, by name.
+        """
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        return {sub.name: sub.metrics() for sub in subscriptions}
+
+
+class TickerIntake:
+    """
+    Fetches a market's ticker every interval seconds in a thread of its
+    own, checks it for a price shock, and publishes it as a TickerUpdate.
+    The order stages take the latest with latest(): older updates are
+    dropped, so that however long they take, intake keeps its pace and a
+    shock is seen (and the kill switch triggered) within interval seconds.
+    """
+
+    def __init__(
+        self,
+        market: Any,
+        mkt: str,
+        events: EventBus,
+        interval: float,
+        kill_switch: Any = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.market = market
+        self.mkt = mkt
+        self.events = events
+        self.interval = interval
+        self.kill_switch = kill_switch
+        self.logger = logger or logging.getLogger("KCBot.TickerIntake")
+        self.tickers = events.subscribe(
+            TickerUpdate, f"tickers {mkt}", maxsize=1, market=mkt
+        )
+        self.previous: Optional[Ticker] = None
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def fetch(self) -> Optional[Ticker]:
+        """
+        Fetch and publish the ticker. Return it, or None if fetching failed.
+        """
+        try:
+            ticker = Ticker.from_kucoin(
+                self.market.get_ticker(self.mkt),
+                self.market.get_24h_stats(self.mkt),
+            )
+        except Exception as exc:
+            self.logger.warning("Failed to fetch %s ticker: %s", self.mkt, exc)
+            return None
+        if self.kill_switch is not None and self.previous is not None:
+            self.kill_switch.shock(self.mkt, self.previous.mid, ticker.mid)
+        self.previous = ticker
+        self.events.publish(TickerUpdate(self.mkt, ticker))
+        return ticker
+
+    def latest(self) -> Optional[Ticker]:
+        """
+        Return the latest ticker published since the last call, or None.
+        """
+        tickers = [
+            update.ticker
+            for update in self.tickers.drain()
+            if isinstance(update, TickerUpdate)
+        ]
+        return tickers[-1] if tickers else None
+
+    def run(self) -> None:
+        while not self.stopping.is_set():
+            self.fetch()
+            self.stopping.wait(self.interval)
+
+    def start(self) -> None:
+        self.thread = threading.Thread(
+            target=self.run,
+            name=f"kcbot-intake-{self.mkt}",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.events.unsubscribe(self.tickers)
@@ -0,0 +1,220 @@
+"""
+Classes for fill analytics: how often, how fully and how soon the orders
+placed at each rung of a strategy's ladder fill.
+"""
+
+import bisect
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+# Upper bounds (in seconds) of the time to fill histogram buckets. The last
+# bucket has no upper bound.
+TTF_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1800, 3600, 14400)
+
+
+class RungStats:
+    """
+    Aggregates of the orders placed at one rung: how many, how many filled
+    (at all), their sizes, and a histogram of their times to fill.
+    """
+
+    __slots__ = ("placed", "filled", "size", "dealt", "ttf_sum", "ttf")
+
+    def __init__(self) -> None:
+        self.placed = 0
+        self.filled = 0
+        self.size = 0.0
+        self.dealt = 0.0
+        self.ttf_sum = 0.0
+        self.ttf = [0] * (len(TTF_BUCKETS) + 1)
+
+    @property
+    def fill_rate(self) -> float:
+        """
+        Return the fraction of orders which filled, at least partly.
+        """
+        return self.filled / self.placed if self.placed else 0.0
+
+    @property
+    def fill_ratio(self) -> float:
+        """
+        Return the fraction of the size placed which filled.
+        """
+        return self.dealt / self.size if self.size else 0.0
+
+    @property
+    def mean_ttf(self) -> Optional[float]:
+        return self.ttf_sum / self.filled if self.filled else None
+
+    def add_fill(self, dealt: float, seconds: float) -> None:
+        self.filled += 1
+        self.dealt += dealt
+        self.ttf_sum += seconds
+        self.ttf[bisect.bisect_left(TTF_BUCKETS, seconds)] += 1
+
+    def ttf_percentile(self, pct: float) -> Optional[float]:
+        """
+        Return the upper bound of the histogram bucket holding the pct
+        percentile time to fill, or None if nothing filled. The last bucket
+        is unbounded, so is given as infinity.
+        """
+        if not self.filled:
+            return None
+        rank = self.filled * pct / 100.0
+        total = 0
+        for idx, count in enumerate(self.ttf):
+            total += count
+            if count and total >= rank:
+                break
+        if idx < len(TTF_BUCKETS):
+            return float(TTF_BUCKETS[idx])
+        return float("inf")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RungStats":
+        stats = cls()
+        for name in cls.__slots__:
+            setattr(stats, name, data[name])
+        return stats
+
+
+class FillStats:
+    """
+    Joins the orders placed at each rung, by clientOid, with their fills,
+    and keeps RungStats keyed by "market/strategy/side/rung", where the
+    strategy is the order remark. An order is pending until its fill is
+    seen, or until it drops out of the window of done orders fetched,
+    unfilled. The time to fill is measured to the order's last fill. State
+    is kept in memory, and checkpointed to a JSON file if a filename is
+    given.
+    """
+
+    def __init__(self, filename: str = ""):
+        self.filename = filename
+        self.rungs: Dict[str, RungStats] = {}
+        # clientOid => [key, placed at (ms), size].
+        self.pending: Dict[str, List[Any]] = {}
+        if filename and os.path.exists(filename):
+            with open(filename, encoding="utf-8") as handle:
+                data = json.load(handle)
+            self.rungs = {
+                key: RungStats.from_dict(val)
+                for key, val in data["rungs"].items()
+            }
+            self.pending = data["pending"]
+
+    def placed(
+        self,
+        market: str,
+        order: Dict[str, Any],
+        rung: int,
+        now: int,
+    ) -> None:
+        """
+        Record an order placed at a rung, at a time (in ms).
+        """
+        key = "/".join(
+            (
+                market,
+                order.get("remark") or "unknown",
+                order["side"],
+                str(rung),
+            )
+        )
+        stats = self.rungs.setdefault(key, RungStats())
+        stats.placed += 1
+        stats.size += float(order["size"])
+        self.pending[order["clientOid"]] = [key, now, float(order["size"])]
+
+    def fill(self, order: Dict[str, Any], filled_at: int) -> bool:
+        """
+        Join a KuCoin done order with the order placed, if it is pending,
+        filled at a time (in ms). Return True if joined.
+        """
+        placed = self.pending.pop(order.get("clientOid") or "", None)
+        if placed is None:
+            return False
+        key, placed_at, _ = placed
+        self.rungs[key].add_fill(
+            float(order["dealSize"]), max(0, filled_at - placed_at) / 1000.0
+        )
+        return True
+
+    def expire(self, before: int) -> int:
+        """
+        Stop waiting for fills of orders placed before a time (in ms),
+        whose fills would have been seen. Return the number expired.
+        """
+        old = [oid for oid, val in self.pending.items() if val[1] < before]
+        for oid in old:
+            del self.pending[oid]
+        return len(old)
+
+    def summary(
+        self,
+        market: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the stats of each rung (of one market, or all), by key.
+        """
+        rows: List[Dict[str, Any]] = []
+        for key in sorted(self.rungs):
+            row_market, strategy, side, rung = key.split("/")
+            if market is not None and row_market != market:
+                continue
+            stats = self.rungs[key]
+            rows.append(
+                {
+                    "market": row_market,
+                    "strategy": strategy,
+                    "side": side,
+                    "rung": int(rung),
+                    "placed": stats.placed,
+                    "filled": stats.filled,
+                    "fill_rate": stats.fill_rate,
+                    "fill_ratio": stats.fill_ratio,
+                    "mean_ttf": stats.mean_ttf,
+                    "p50_ttf": stats.ttf_percentile(50),
+                    "p90_ttf": stats.ttf_percentile(90),
+                }
+            )
+        return rows
+
+    def never_filled(self, min_placed: int = 100) -> List[str]:
+        """
+        Return the keys of rungs placed at least min_placed times (not
+        counting those pending), none of which filled.
+        """
+        pending: Dict[str, int] = {}
+        for key, _, _ in self.pending.values():
+            pending[key] = pending.get(key, 0) + 1
+        return [
+            key
+            for key, stats in sorted(self.rungs.items())
+            if stats.filled == 0
+            and stats.placed - pending.get(key, 0) >= min_placed
+        ]
+
+    def save(self) -> None:
+        """
+        Write the state to its file (if any), atomically.
+        """
+        if not self.filename:
+            return
+        tmpname = self.filename + ".tmp"
+        with open(tmpname, "w", encoding="utf-8") as handle:
+            json.dump(
+                {
+                    "pending": self.pending,
+                    "rungs": {
+                        key: val.to_dict() for key, val in self.rungs.items()
+                    },
+                },
+                handle,
+                sort_keys=True,
+            )
+        os.replace(tmpname, self.filename)
@@ -0,0 +1,126 @@
+"""
+A class for a TickerHistory object: a ring buffer of recent tickers.
+"""
+
+import math
+from array import array
+
+from .ticker import Ticker
+
+
+class TickerHistory:
+    """
+    A fixed-size ring buffer of ticker samples, stored in flat arrays, with
+    rolling statistics over the samples in the buffer, updated in O(1) per
+    sample:
+      - mean: the mean mid price
+      - vwap: the last trade price, weighted by last trade size
+      - ema: an exponential moving average of the mid price
+      - volatility: the standard deviation of mid price log returns.
+    """
+
+    def __init__(self, size: int = 1440, span: int = 20):
+        if size < 2:
+            raise ValueError(f"History too short: {size}")
+        self.size = size
+        self.alpha = 2.0 / (span + 1.0)
+        self.mids = array("d", [0.0] * size)
+        self.turnovers = array("d", [0.0] * size)
+        self.volumes = array("d", [0.0] * size)
+        self.returns = array("d", [0.0] * size)
+        self.times = array("q", [0] * size)
+        self.count = 0
+        self.head = 0  # Where the next sample goes.
+        self.ema = 0.0
+        self.sum_mid = 0.0
+        self.sum_turnover = 0.0
+        self.sum_volume = 0.0
+        self.sum_ret = 0.0
+        self.sum_ret_sq = 0.0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, ticker: Ticker) -> None:
+        """
+        Add a sample, overwriting the oldest once the buffer is full.
+        """
+        mid = ticker.mid
+        prev = self.mids[self.head - 1] if self.count else 0.0
+        ret = math.log(mid / prev) if prev > 0.0 and mid > 0.0 else 0.0
+        turnover = ticker.price * ticker.size
+
+        if self.count == self.size:
+            # Remove the oldest sample (about to be overwritten). Its return
+            # relates it to an even older sample, no longer in the buffer.
+            self.sum_mid -= self.mids[self.head]
+            self.sum_turnover -= self.turnovers[self.head]
+            self.sum_volume -= self.volumes[self.head]
+            oldest_next = (self.head + 1) % self.size
+            self.sum_ret -= self.returns[oldest_next]
+            self.sum_ret_sq -= self.returns[oldest_next] ** 2
+            self.returns[oldest_next] = 0.0
+        else:
+            self.count += 1
+
+        self.mids[self.head] = mid
+        self.turnovers[self.head] = turnover
+        self.volumes[self.head] = ticker.size
+        self.returns[self.head] = ret
+        self.times[self.head] = ticker.time
+        self.sum_mid += mid
+        self.sum_turnover += turnover
+        self.sum_volume += ticker.size
+        self.sum_ret += ret
+        self.sum_ret_sq += ret * ret
+        self.ema = (
+            mid
+            if self.count == 1
+            else self.ema + self.alpha * (mid - self.ema)
+        )
+
+        self.head = (self.head + 1) % self.size
+        if self.head == 0:
+            # Once per lap, recompute the sums to stop rounding errors from
+            # accumulating. This is O(1) amortised per sample.
+            self.resum()
+
+    def resum(self) -> None:
+        """
+        Recompute the running sums from the buffer.
+        """
+        self.sum_mid = math.fsum(self.mids)
+        self.sum_turnover = math.fsum(self.turnovers)
+        self.sum_volume = math.fsum(self.volumes)
+        self.sum_ret = math.fsum(self.returns)
+        self.sum_ret_sq = math.fsum(ret * ret for ret in self.returns)
+
+    def last(self) -> float:
+        """
+        Return the latest mid price.
+        """
+        return self.mids[self.head - 1] if self.count else 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.sum_mid / self.count if self.count else 0.0
+
+    @property
+    def vwap(self) -> float:
+        if self.sum_volume <= 0.0:
+            return self.mean
+        return self.sum_turnover / self.sum_volume
+
+    @property
+    def volatility(self) -> float:
+        """
+        Return the sample standard deviation of the log returns between the
+        samples in the buffer.
+        """
+        n_returns = self.count - 1
+        if n_returns < 2:
+            return 0.0
+        variance = (
+            self.sum_ret_sq - self.sum_ret * self.sum_ret / n_returns
+        ) / (n_returns - 1)
+        return math.sqrt(max(variance, 0.0))
@@ -0,0 +1,74 @@
+"""
+A class for an Increment object: exact fixed-point prices and sizes.
+"""
+
+from decimal import ROUND_DOWN, ROUND_HALF_UP, Decimal
+from typing import Union
+
+
+class Increment:
+    """
+    A market increment (e.g. a price or size step), used to convert between
+    exchange strings and integer units (ticks for prices, lots for sizes).
+
+    Once converted, prices and sizes can be compared and combined exactly
+    using integer arithmetic.
+    """
+
+    def __init__(self, step: Union[str, Decimal] = "0.0001"):
+        self.step = Decimal(step)
+        if self.step <= 0:
+            raise ValueError(f"Invalid increment: {step}")
+        # Number of decimal places needed to print a multiple of the step.
+        exponent = self.step.normalize().as_tuple().exponent
+        self.places = max(0, -int(exponent))
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Increment) and self.step == other.step
+
+    def __repr__(self) -> str:
+        return f"Increment({str(self.step)!r})"
+
+    def units(
+        self,
+        value: Union[str, float, Decimal],
+        rounding: str = ROUND_HALF_UP,
+    ) -> int:
+        """
+        Convert a price or size to a whole number of increments.
+        Floats are converted via their shortest repr, so 1.05 is 1.05.
+        """
+        if isinstance(value, float):
+            value = repr(value)
+        return int(
+            (Decimal(value) / self.step).to_integral_value(rounding=rounding)
+        )
+
+    def units_down(self, value: Union[str, float, Decimal]) -> int:
+        """
+        Convert a price or size to a whole number of increments, rounding
+        towards zero (e.g. so a size never exceeds what is available).
+        """
+        return self.units(value, rounding=ROUND_DOWN)
+
+    def decimal(self, units: int) -> Decimal:
+        """
+        Convert a whole number of increments to an exact Decimal.
+        """
+        return self.step * units
+
+    def to_float(self, units: int) -> float:
+        """
+        Convert a whole number of increments to a float, for display.
+        """
+        return float(self.decimal(units))
+
+    def to_str(self, units: int) -> str:
+        """
+        Serialise a whole number of increments for an order payload, without
+        exponent notation or redundant trailing zeros.
+        """
+        text = f"{self.decimal(units):.{self.places}f}"
+        if "." in text:
+            text = text.rstrip("0").rstrip(".")
+        return text
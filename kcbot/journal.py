@@ -0,0 +1,251 @@
+"""
+Classes for recording exchange traffic to a journal, and replaying it.
+"""
+
+import collections
+import functools
+import gzip
+import io
+import json
+import threading
+import time
+from typing import IO, Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+# Request arguments which differ when replayed: computed from the time,
+# or random.
+VOLATILE_ARGS = ("clientOid", "endAt", "startAt")
+
+
+def open_journal(filename: str, mode: str) -> IO[str]:
+    """
+    Open a journal as text, gzipped if its name ends with ".gz".
+    """
+    if filename.endswith(".gz"):
+        return io.TextIOWrapper(
+            gzip.GzipFile(filename, mode + "b"), encoding="utf-8"
+        )
+    return open(filename, mode, encoding="utf-8")
+
+
+def stable(value: Any) -> Any:
+    """
+    Return a request argument without its VOLATILE_ARGS, at any depth.
+    """
+    if isinstance(value, dict):
+        return {
+            key: stable(val)
+            for key, val in value.items()
+            if key not in VOLATILE_ARGS
+        }
+    if isinstance(value, (list, tuple)):
+        return [stable(val) for val in value]
+    return value
+
+
+def request_key(
+    client: str,
+    method: str,
+    args: Any,
+    kwargs: Dict[str, Any],
+) -> Tuple[str, str, str]:
+    """
+    Return the key by which a replayed request finds its recorded answer.
+    """
+    return (
+        client,
+        method,
+        json.dumps(stable([args, kwargs]), sort_keys=True, default=str),
+    )
+
+
+class Recorder:
+    """
+    A Bot client wrapper which appends every request and its response (or
+    error) to a journal: one compact JSON object per line, with the time
+    the request was made and how long it took. Install it among a Bot's
+    outer_wrappers, so that only the answers the Bot gets are recorded,
+    and give it the Bot's clock.
+    """
+
+    def __init__(self, filename: str, clock: Callable[[], float] = time.time):
+        self.filename = filename
+        self.clock = clock
+        self.handle = open_journal(filename, "a")
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def wrap(self, name: str, client: Any) -> "Recording":
+        return Recording(name, client, self)
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        with self.lock:
+            self.handle.write(line + "\n")
+            self.handle.flush()
+            self.count += 1
+
+    def close(self) -> None:
+        with self.lock:
+            self.handle.close()
+
+
+class Recording:
+    """
+    A proxy for an exchange client which records each method call.
+    """
+
+    def __init__(self, name: str, client: Any, recorder: Recorder):
+        self.name = name
+        self.client = client
+        self.recorder = recorder
+
+    def __getattr__(self, method: str) -> Any:
+        attr = getattr(self.client, method)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def recorded(*args, **kwargs):
+            entry: Dict[str, Any] = {
+                "t": round(self.recorder.clock(), 3),
+                "c": self.name,
+                "m": method,
+                "a": args,
+                "k": kwargs,
+            }
+            start = time.monotonic()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as exc:
+                entry["d"] = round(time.monotonic() - start, 4)
+                entry["e"] = str(exc)
+                self.recorder.write(entry)
+                raise
+            entry["d"] = round(time.monotonic() - start, 4)
+            entry["r"] = result
+            self.recorder.write(entry)
+            return result
+
+        return recorded
+
+
+class ReplayExhausted(Exception):
+    """
+    A request was made with no recorded answer left for it.
+    """
+
+
+class Replay:
+    """
+    Answers requests from a journal, without the network. Each request
+    gets the next recorded answer to the same request, ignoring arguments
+    computed from the time or at random. Its clock is the recorded time of
+    the next request (in the order of the journal), at about which the Bot
+    decided what to request next, e.g. whether a cache had expired.
+    """
+
+    def __init__(self, filename: str):
+        self.entries: Dict[Tuple[str, str, str], Deque[Dict[str, Any]]] = {}
+        self.total = 0
+        # The recorded times of the requests, never decreasing, and how
+        # many were answered.
+        self.times: List[float] = []
+        self.answered = 0
+        with open_journal(filename, "r") as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                key = request_key(
+                    entry["c"], entry["m"], entry["a"], entry["k"]
+                )
+                self.entries.setdefault(key, collections.deque()).append(entry)
+                # Entries are written as requests end, so a request's
+                # start may be before that of the one written before it.
+                self.times.append(max(self.times[-1:] + [entry["t"]]))
+                self.total += 1
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """
+        Return the number of recorded answers not yet given.
+        """
+        return sum(len(entries) for entries in self.entries.values())
+
+    def clock(self) -> float:
+        if not self.times:
+            return time.time()
+        return self.times[min(self.answered, self.total - 1)]
+
+    def wrap(self, name: str, client: Any) -> "Replaying":
+        return Replaying(name, self)
+
+    def answer(
+        self,
+        client: str,
+        method: str,
+        args: Any,
+        kwargs: Dict[str, Any],
+    ) -> Any:
+        key = request_key(client, method, args, kwargs)
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                raise ReplayExhausted(
+                    f"No recorded answer left for {client}.{method}"
+                )
+            entry = entries.popleft()
+            self.answered += 1
+        if "e" in entry:
+            raise Exception(entry["e"])
+        return entry["r"]
+
+
+class Replaying:
+    """
+    A stand-in for an exchange client, answering from a Replay.
+    """
+
+    def __init__(self, name: str, replay: Replay):
+        self.name = name
+        self.replay = replay
+
+    def __getattr__(self, method: str) -> Any:
+        def replayed(*args, **kwargs):
+            return self.replay.answer(self.name, method, args, kwargs)
+
+        return replayed
+
+
+def replay_session(
+    config: Union[str, Dict[str, Any]],
+    filename: str,
+    iterations: Optional[int] = None,
+):
+    """
+    Run a Bot over a recorded session, as fast as possible: one iteration
+    after another without sleeping, until the recorded answers are used
+    up, an iteration uses none, or after a number of iterations. Return
+    the Bot.
+    """
+    # Imported here, as the Bot imports the exchange client.
+    from .bot import Bot
+
+    replay = Replay(filename)
+    bot = Bot(config=config, keys={}, outer_wrappers=[replay.wrap])
+    bot.clock = replay.clock
+    bot.sleep = lambda seconds: None
+    count = 0
+    while len(replay) and (iterations is None or count < iterations):
+        left = len(replay)
+        bot.run_once()
+        count += 1
+        if len(replay) == left:
+            break
+    bot.logger.info(
+        "Replayed %d of %d requests in %d iterations",
+        replay.total - len(replay),
+        replay.total,
+        count,
+    )
+    return bot
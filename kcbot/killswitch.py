@@ -0,0 +1,245 @@
+"""
+A class for a KillSwitch: cancels every order of the markets it guards, at
+once, and pauses trading.
+"""
+
+import concurrent.futures
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+class KillSwitch:
+    """
+    Guards the markets registered with it (each with a Trade client of
+    every account trading it), and is triggered by a signal, by a file
+    appearing, or by a price shock. When killed, it cancels all active
+    orders of every market concurrently (one request per market and
+    account), confirms they are gone from one snapshot (every page) of the
+    active orders per account (cancelling any left one by one),
+    and pauses. If it has a file, killing writes the reason to it, and
+    trading resumes when it is deleted; otherwise only a restart resumes
+    trading.
+    One KillSwitch can be shared by the Bots of a process.
+    """
+
+    def __init__(
+        self,
+        filename: str = "",
+        shock_pct: float = 0.0,
+        workers: int = 16,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.filename = filename
+        # The largest move of the mid price in one tick, in percent, or 0.
+        self.shock_pct = shock_pct
+        self.workers = workers
+        self.logger = logger or logging.getLogger("KCBot.KillSwitch")
+        # Trade clients, by (account, market).
+        self.markets: Dict[Tuple[Any, str], Any] = {}
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.reason = ""
+        self.paused = False
+        # The number of kills, so that each Bot can tell it has been killed
+        # since it last looked.
+        self.kills = 0
+
+    @property
+    def triggered(self) -> bool:
+        return self.event.is_set()
+
+    def register(
+        self, market: str, trade: Any, account: Optional[str] = None
+    ) -> None:
+        """
+        Guard a market traded through a Trade client. The account (e.g. the
+        API key) tells which clients trade for the same account, defaulting
+        to the client itself. The client should not limit the requests in
+        flight, as a kill sends many at once.
+        """
+        key = id(trade) if account is None else account
+        self.markets.setdefault((key, market), trade)
+
+    def trigger(self, reason: str) -> None:
+        """
+        Ask for a kill, which happens at the next check. Safe to call from
+        a signal handler.
+        """
+        if not self.paused:
+            self.reason = reason
+            self.event.set()
+
+    def install(self, signum: int = signal.SIGUSR1) -> bool:
+        """
+        Trigger on a signal. Return False if not in the main thread, where
+        only signal handlers can be installed.
+        """
+        try:
+            signal.signal(
+                signum,
+                lambda num, frame: self.trigger(f"signal {num}"),
+            )
+        except ValueError:
+            return False
+        return True
+
+    def sleep(self, seconds: float) -> None:
+        """
+        Sleep, waking early if triggered.
+        """
+        self.event.wait(seconds)
+
+    def wait(self, stop: Any, seconds: float, step: float = 0.1) -> None:
+        """
+        Wait for a stop event (threading or multiprocessing) for up to
+        seconds, waking early if triggered.
+        """
+        end = time.monotonic() + seconds
+        while not self.triggered and not stop.is_set():
+            left = end - time.monotonic()
+            if left <= 0.0:
+                break
+            stop.wait(min(step, left))
+
+    def poll(self) -> None:
+        """
+        Trigger if the file has appeared, or resume if it has gone.
+        """
+        if not self.filename:
+            return
+        exists = os.path.exists(self.filename)
+        if self.paused and not exists:
+            self.logger.warning("Kill file removed, resuming trading")
+            self.paused = False
+        elif not self.paused and exists:
+            self.trigger(f"file {self.filename}")
+
+    def shock(self, market: str, previous: float, price: float) -> bool:
+        """
+        Trigger if the price moved by more than shock_pct since the
+        previous tick. Return True if it did.
+        """
+        if self.shock_pct <= 0.0 or previous <= 0.0 or price <= 0.0:
+            return False
+        move = abs(price / previous - 1.0) * 100.0
+        if move <= self.shock_pct:
+            return False
+        self.trigger(
+            f"price shock: {market} moved {move:.2f}% "
+            f"({previous:.6g} to {price:.6g})"
+        )
+        return True
+
+    def kill(self) -> Dict[str, List[str]]:
+        """
+        Cancel the active orders of every market and pause. Return the IDs
+        of the orders cancelled, by market.
+        """
+        with self.lock:
+            if self.paused:
+                self.event.clear()
+                return {}
+            start = time.monotonic()
+            self.logger.warning(
+                "Kill switch (%s): cancelling orders in %d markets",
+                self.reason,
+                len({market for _, market in self.markets}),
+            )
+            with concurrent.futures.ThreadPoolExecutor(
+                self.workers, thread_name_prefix="kcbot-kill"
+            ) as executor:
+                cancelled = self.cancel_all(executor)
+                left = self.cancel_left(executor)
+            self.paused = True
+            self.kills += 1
+            self.event.clear()
+            if self.filename:
+                with open(self.filename, "w", encoding="utf-8") as handle:
+                    handle.write(self.reason + "\n")
+            self.logger.warning(
+                "Kill switch: cancelled %d orders (%d left over) in %.3fs, "
+                "trading paused",
+                sum(len(oids) for oids in cancelled.values()),
+                left,
+                time.monotonic() - start,
+            )
+            return cancelled
+
+    def cancel_all(
+        self,
+        executor: concurrent.futures.Executor,
+    ) -> Dict[str, List[str]]:
+        futures = {
+            key: executor.submit(
+                trade.cancel_all_orders, symbol=key[1], tradeType="TRADE"
+            )
+            for key, trade in self.markets.items()
+        }
+        cancelled: Dict[str, List[str]] = {}
+        for (_, market), future in futures.items():
+            oids = cancelled.setdefault(market, [])
+            try:
+                oids += future.result()["cancelledOrderIds"]
+            except Exception as exc:
+                self.logger.warning(
+                    "Kill switch: cancelling %s failed: %s", market, exc
+                )
+        return cancelled
+
+    @staticmethod
+    def active_orders(trade: Any) -> List[Dict[str, Any]]:
+        """
+        Return the active orders of a Trade client, every page of them.
+        """
+        orders: List[Dict[str, Any]] = []
+        page = 0
+        while True:
+            page += 1
+            response = trade.get_order_list(
+                status="active",
+                tradeType="TRADE",
+                currentPage=page,
+                pageSize=500,
+            )
+            orders += response["items"]
+            if page >= response["totalPage"]:
+                return orders
+
+    def cancel_left(self, executor: concurrent.futures.Executor) -> int:
+        """
+        Look for orders still active in the markets, in one snapshot per
+        account, and cancel them one by one. Return the number found.
+        """
+        clients: Dict[Any, Tuple[Any, Set[str]]] = {}
+        for (key, market), trade in self.markets.items():
+            clients.setdefault(key, (trade, set()))[1].add(market)
+        snapshots = [
+            (trade, markets, executor.submit(self.active_orders, trade))
+            for trade, markets in clients.values()
+        ]
+        futures: List[concurrent.futures.Future] = []
+        for trade, markets, snapshot in snapshots:
+            try:
+                orders = snapshot.result()
+            except Exception as exc:
+                self.logger.warning(
+                    "Kill switch: confirming cancellation failed: %s", exc
+                )
+                continue
+            futures.extend(
+                executor.submit(trade.cancel_order, order["id"])
+                for order in orders
+                if order["symbol"] in markets
+            )
+        for future in futures:
+            try:
+                future.result()
+            except Exception as exc:
+                self.logger.warning(
+                    "Kill switch: cancelling an order failed: %s", exc
+                )
+        return len(futures)
@@ -0,0 +1,172 @@
+"""
+A class for a KlineStore object: a local store of candles for one market.
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Columns in KuCoin kline order, and their types.
+COLUMNS = {
+    "time": np.int64,
+    "open": np.float64,
+    "close": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "volume": np.float64,
+    "turnover": np.float64,
+}
+
+# KuCoin kline types, and their lengths in seconds.
+INTERVALS = {
+    "1min": 60,
+    "3min": 180,
+    "5min": 300,
+    "15min": 900,
+    "30min": 1800,
+    "1hour": 3600,
+    "2hour": 7200,
+    "4hour": 14400,
+    "6hour": 21600,
+    "8hour": 28800,
+    "12hour": 43200,
+    "1day": 86400,
+    "1week": 604800,
+}
+
+# The most candles KuCoin returns per request.
+PAGE_LEN = 1500
+
+
+class KlineStore:
+    """
+    Closed candles for one market and interval, oldest first, stored in
+    append-only columnar files (one file per column) under
+    <root>/<symbol>/<interval>/. Columns are read as read-only memory-mapped
+    NumPy arrays, without copying.
+    """
+
+    def __init__(self, root: str, symbol: str, interval: str):
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown kline interval: {interval}")
+        self.symbol = symbol
+        self.interval = interval
+        self.seconds = INTERVALS[interval]
+        self.path = os.path.join(root, symbol, interval)
+        os.makedirs(self.path, exist_ok=True)
+        self.views: Dict[str, np.ndarray] = {}
+
+    def filename(self, column: str) -> str:
+        return os.path.join(self.path, column + ".bin")
+
+    def __len__(self) -> int:
+        try:
+            size = os.path.getsize(self.filename("time"))
+        except FileNotFoundError:
+            return 0
+        return size // np.dtype(np.int64).itemsize
+
+    def last_time(self) -> Optional[int]:
+        """
+        Return the start time (in seconds) of the newest candle stored.
+        """
+        count = len(self)
+        if count == 0:
+            return None
+        return int(self.column("time")[count - 1])
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Return a read-only, memory-mapped view of a column.
+        """
+        count = len(self)
+        view = self.views.get(name)
+        if view is None or len(view) != count:
+            if count == 0:
+                view = np.empty(0, dtype=COLUMNS[name])
+            else:
+                view = np.memmap(
+                    self.filename(name),
+                    dtype=COLUMNS[name],
+                    mode="r",
+                    shape=(count,),
+                )
+            self.views[name] = view
+        return view
+
+    def since(self, name: str, start: float) -> np.ndarray:
+        """
+        Return a read-only view of a column, from the first candle starting
+        at or after start (in seconds), without copying.
+        """
+        idx = int(np.searchsorted(self.column("time"), start))
+        return self.column(name)[idx:]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        Return read-only, memory-mapped views of all columns.
+        """
+        return {name: self.column(name) for name in COLUMNS}
+
+    def append(self, candles: List[List[Any]]) -> int:
+        """
+        Append KuCoin candles ([time, open, close, high, low, volume,
+        turnover], in any order) newer than the newest one stored.
+        Return the number appended.
+        """
+        last = self.last_time()
+        rows = sorted(
+            (row for row in candles if last is None or int(row[0]) > last),
+            key=lambda row: int(row[0]),
+        )
+        if not rows:
+            return 0
+        # Write the time column last: it defines the number of candles, so
+        # an interrupted append never exposes a partly written candle.
+        for idx, (name, dtype) in reversed(list(enumerate(COLUMNS.items()))):
+            # Truncate any partly written data left by an interrupted append.
+            with open(self.filename(name), "ab") as handle:
+                handle.truncate(len(self) * np.dtype(dtype).itemsize)
+                np.array([row[idx] for row in rows], dtype=dtype).tofile(
+                    handle
+                )
+        return len(rows)
+
+    def update(
+        self,
+        market: Any,
+        backfill: int,
+        now: Optional[float] = None,
+    ) -> int:
+        """
+        Fetch closed candles newer than the newest one stored, or for the
+        last backfill seconds if the store is empty, paging back from now.
+        Return the number of candles appended.
+        """
+        now = int(time.time() if now is None else now)
+        last = self.last_time()
+        start = now - backfill if last is None else last + self.seconds
+        start -= start % self.seconds
+        # Only closed candles: those starting at least an interval ago.
+        end = now - now % self.seconds
+        candles: Dict[int, List[Any]] = {}
+        page_end = end
+        while page_end > start:
+            rows = market.get_kline(
+                self.symbol,
+                self.interval,
+                startAt=start,
+                endAt=page_end,
+            )
+            if not rows:
+                break
+            for row in rows:
+                if start <= int(row[0]) < end:
+                    candles[int(row[0])] = row
+            oldest = min(int(row[0]) for row in rows)
+            if oldest >= page_end or len(rows) < PAGE_LEN:
+                break
+            page_end = oldest
+        return self.append(list(candles.values()))
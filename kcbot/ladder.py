@@ -0,0 +1,27 @@
+"""
+Functions for the ladders of orders a strategy places each tick, shared by
+the Bot and the simulator.
+"""
+
+import math
+from typing import Any, Dict, List
+
+
+def bumps(side: Dict[str, Any]) -> List[float]:
+    """
+    Return how far (in percent) each rung is from the base price, growing
+    with the square of the rung number.
+    """
+    return [
+        side["pcnt_bump_a"] * n**2 + side["pcnt_bump_c"]
+        for n in range(1, int(side["order_count"]) + 1)
+    ]
+
+
+def shares(count: int) -> List[float]:
+    """
+    Return the share of a ladder's volume in each rung, which grows with
+    the square root of the rung number.
+    """
+    total = sum(math.sqrt(n) for n in range(1, count + 1))
+    return [math.sqrt(n) / total for n in range(1, count + 1)]
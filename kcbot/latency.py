@@ -0,0 +1,232 @@
+"""
+Classes for bounding the latency of exchange requests: per-iteration
+deadlines, per-endpoint timeouts, and hedged reads.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, Optional
+
+# Requests which only read, so are safe to send twice.
+HEDGED = (
+    "get_24h_stats",
+    "get_account_ledger",
+    "get_account_list",
+    "get_all_tickers",
+    "get_kline",
+    "get_order_list",
+    "get_part_order",
+    "get_symbol_list",
+    "get_ticker",
+)
+
+
+class DeadlineExceeded(Exception):
+    """
+    The iteration's deadline passed before a request could be made.
+    """
+
+
+class RequestTimeout(Exception):
+    """
+    A request took longer than its timeout (or the rest of the deadline).
+    The message contains "timed out", so that orders are retried.
+    """
+
+
+class Deadline:
+    """
+    A point in time, seconds from now, by which an iteration should end.
+    """
+
+    def __init__(self, seconds: float):
+        self.at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+
+class LatencyTracker:
+    """
+    The most recent request durations, by endpoint (method name), for
+    percentiles.
+    """
+
+    def __init__(self, size: int = 256, min_samples: int = 20):
+        self.size = size
+        self.min_samples = min_samples
+        self.samples: Dict[str, Deque[float]] = {}
+        self.lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = collections.deque(maxlen=self.size)
+            self.samples[name].append(seconds)
+
+    def percentile(self, name: str, pct: float) -> Optional[float]:
+        """
+        Return the pct percentile of an endpoint's durations, or None until
+        there are min_samples of them.
+        """
+        with self.lock:
+            samples = sorted(self.samples.get(name, ()))
+        if len(samples) < self.min_samples:
+            return None
+        idx = min(len(samples) - 1, int(len(samples) * pct / 100.0))
+        return samples[idx]
+
+
+class LatencyControl:
+    """
+    A Bot client wrapper which runs each request in a thread, so that it
+    can be abandoned: after its endpoint's timeout, or when the current
+    deadline passes, whichever is sooner. A hedged request still pending
+    after its endpoint's hedge_pct percentile duration is sent again, and
+    the first answer wins. The thresholds adapt as durations are tracked.
+
+    An abandoned request keeps its worker until it ends, so each endpoint
+    may only have max_in_flight requests running: beyond that, requests
+    to it time out at once, leaving workers for the other endpoints, and
+    no request is hedged while its endpoint or the pool is full.
+    """
+
+    def __init__(
+        self,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = 10.0,
+        hedged: Iterable[str] = HEDGED,
+        hedge_pct: float = 95.0,
+        workers: int = 8,
+        max_in_flight: int = 3,
+    ):
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.hedged = set(hedged)
+        self.hedge_pct = hedge_pct
+        self.tracker = LatencyTracker()
+        self.deadline: Optional[Deadline] = None
+        self.hedges = 0
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        # Requests running (or waiting for a worker), by endpoint.
+        self.in_flight: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            workers, thread_name_prefix="kcbot-request"
+        )
+
+    def wrap(self, name: str, client: Any) -> "LatencyControlled":
+        """
+        A Bot client wrapper: return the client, with latency control.
+        """
+        return LatencyControlled(client, self)
+
+    def timeout(self, name: str) -> float:
+        """
+        Return the time allowed for a request, raising DeadlineExceeded if
+        there is none left.
+        """
+        timeout = self.timeouts.get(name, self.default_timeout)
+        if self.deadline is not None:
+            remaining = self.deadline.remaining()
+            if remaining <= 0.0:
+                raise DeadlineExceeded(f"Deadline exceeded before {name}")
+            timeout = min(timeout, remaining)
+        return timeout
+
+    def submit(self, name: str, func: Callable[[], Any]):
+        start = time.monotonic()
+
+        def timed() -> Any:
+            result = func()
+            self.tracker.record(name, time.monotonic() - start)
+            return result
+
+        with self.lock:
+            self.in_flight[name] = self.in_flight.get(name, 0) + 1
+        future = self.executor.submit(timed)
+        future.add_done_callback(lambda _: self.finished(name))
+        return future
+
+    def finished(self, name: str) -> None:
+        with self.lock:
+            self.in_flight[name] -= 1
+
+    def saturated(self, name: str) -> bool:
+        """
+        Return True if no more requests to an endpoint should be started:
+        it has max_in_flight running, or every worker is busy.
+        """
+        with self.lock:
+            return (
+                self.in_flight.get(name, 0) >= self.max_in_flight
+                or sum(self.in_flight.values()) >= self.workers
+            )
+
+    def call(self, name: str, func: Callable[[], Any]) -> Any:
+        timeout = self.timeout(name)
+        with self.lock:
+            running = self.in_flight.get(name, 0)
+        if running >= self.max_in_flight:
+            raise RequestTimeout(
+                f"{name} timed out: {running} earlier requests still running"
+            )
+        start = time.monotonic()
+        futures = {self.submit(name, func)}
+        hedge_after = None
+        if name in self.hedged:
+            hedge_after = self.tracker.percentile(name, self.hedge_pct)
+        if hedge_after is not None and hedge_after < timeout:
+            done, _ = concurrent.futures.wait(futures, hedge_after)
+            if not done and not self.saturated(name):
+                self.hedges += 1
+                futures.add(self.submit(name, func))
+
+        error: Optional[BaseException] = None
+        while futures:
+            left = timeout - (time.monotonic() - start)
+            done, futures = concurrent.futures.wait(
+                futures,
+                max(0.0, left),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        if error is not None and not futures:
+            raise error
+        raise RequestTimeout(f"{name} timed out after {timeout:.1f}s")
+
+
+class LatencyControlled:
+    """
+    A proxy for an exchange client which makes each method call through a
+    LatencyControl.
+    """
+
+    def __init__(self, client: Any, control: LatencyControl):
+        self.client = client
+        self.control = control
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def controlled(*args, **kwargs):
+            return self.control.call(
+                name, functools.partial(attr, *args, **kwargs)
+            )
+
+        return controlled
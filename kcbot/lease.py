@@ -0,0 +1,227 @@
+"""
+Classes for coordinating redundant Bot instances: a lease per market, held
+by one instance at a time, with a fencing token.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class LeaseLost(Exception):
+    """
+    The lease is no longer held (under the same fencing token), so another
+    instance may have taken over.
+    """
+
+
+class LeaseStore:
+    """
+    Leases in a SQLite database, which every instance opens: on local disk
+    for instances on one host, or on shared storage. Each lease has a
+    holder, an expiry time and a fencing token, which increases whenever
+    the lease changes hands. Expiry times are wall clock times, so hosts
+    sharing a store need synchronised clocks; the fencing token does not.
+    """
+
+    def __init__(self, filename: str, timeout: float = 5.0):
+        self.filename = filename
+        self.timeout = timeout
+        conn = self.connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "name TEXT PRIMARY KEY, holder TEXT NOT NULL, "
+                "token INTEGER NOT NULL, expires REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def connect(self) -> sqlite3.Connection:
+        # A connection per operation, so that threads do not share one.
+        return sqlite3.connect(
+            self.filename, timeout=self.timeout, isolation_level=None
+        )
+
+    def acquire(
+        self,
+        name: str,
+        holder: str,
+        ttl: float,
+        now: Optional[float] = None,
+    ) -> Optional[int]:
+        """
+        Take or renew a lease for ttl seconds, unless another holder has
+        it and it has not expired. Return the fencing token, or None.
+        """
+        now = time.time() if now is None else now
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT holder, token, expires FROM leases WHERE name = ?",
+                (name,),
+            ).fetchone()
+            if row is None:
+                token = 1
+            elif row[0] == holder and row[2] > now:
+                token = row[1]
+            elif row[2] <= now:
+                token = row[1] + 1
+            else:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, holder, token, expires) "
+                "VALUES (?, ?, ?, ?)",
+                (name, holder, token, now + ttl),
+            )
+            conn.execute("COMMIT")
+            return token
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def check(
+        self,
+        name: str,
+        holder: str,
+        token: int,
+        now: Optional[float] = None,
+    ) -> bool:
+        """
+        Return True if a holder still has a lease, under a fencing token.
+        """
+        now = time.time() if now is None else now
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                "SELECT holder, token, expires FROM leases WHERE name = ?",
+                (name,),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return False
+        return row[0] == holder and row[1] == token and row[2] > now
+
+    def release(self, name: str, holder: str) -> None:
+        """
+        Expire a lease now, if a holder has it, so that another can take
+        it over at once.
+        """
+        conn = self.connect()
+        try:
+            conn.execute(
+                "UPDATE leases SET expires = 0 WHERE name = ? AND holder = ?",
+                (name, holder),
+            )
+        finally:
+            conn.close()
+
+
+class Lease:
+    """
+    One instance's claim on a lease: renewed (or, by a standby, tried for)
+    every third of its ttl by a heartbeat thread, so that a standby takes
+    over within ttl seconds of the holder stopping.
+    """
+
+    def __init__(
+        self,
+        store: LeaseStore,
+        name: str,
+        holder: str,
+        ttl: float = 10.0,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.store = store
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.logger = logger or logging.getLogger("KCBot.Lease")
+        self.token: Optional[int] = None
+        self.expires = 0.0
+        # Set while the lease is held, for a standby to wait on.
+        self.gained = threading.Event()
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def held(self) -> bool:
+        return self.token is not None and time.time() < self.expires
+
+    def renew(self) -> bool:
+        """
+        Take or renew the lease. Return True if it is held.
+        """
+        now = time.time()
+        try:
+            token = self.store.acquire(self.name, self.holder, self.ttl, now)
+        except sqlite3.Error as exc:
+            # Still held until it expires, if it was.
+            self.logger.warning("Failed to renew lease %s: %s", self.name, exc)
+            return self.held
+        if token is None:
+            if self.token is not None:
+                self.logger.warning("Lost lease %s", self.name)
+            self.token = None
+            self.gained.clear()
+            return False
+        if token != self.token:
+            self.logger.info("Took lease %s, token %d", self.name, token)
+        self.token = token
+        self.expires = now + self.ttl
+        self.gained.set()
+        return True
+
+    def check(self) -> bool:
+        """
+        Return True if the lease is still held under the same fencing
+        token, according to the store.
+        """
+        if self.token is None:
+            return False
+        try:
+            return self.store.check(self.name, self.holder, self.token)
+        except sqlite3.Error as exc:
+            self.logger.warning("Failed to check lease %s: %s", self.name, exc)
+            return False
+
+    def fence(self) -> None:
+        """
+        Raise LeaseLost unless the lease is still held, before a write.
+        """
+        if not self.check():
+            raise LeaseLost(f"Lease {self.name} is no longer held")
+
+    def heartbeat(self) -> None:
+        while not self.stopping.wait(self.ttl / 3.0):
+            self.renew()
+
+    def start(self) -> None:
+        self.renew()
+        self.thread = threading.Thread(
+            target=self.heartbeat,
+            name=f"kcbot-lease-{self.name}",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop renewing the lease, and release it.
+        """
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.token is not None:
+            self.store.release(self.name, self.holder)
+            self.token = None
+            self.gained.clear()
@@ -0,0 +1,162 @@
+"""
+A class for a Ledger object: pairs filled orders with their close orders.
+"""
+
+import json
+import os
+from typing import Dict, Iterable, List, Set
+
+
+class Ledger:
+    """
+    Records, for each filled ("open") order, the clientOid of the opposite
+    ("close") order placed for it, so a fill is paired once on arrival and
+    never re-examined. Pairs are kept in memory, and in a JSON file if a
+    filename is given. A pair is only saved once its close order has been
+    placed (confirm): until then it is unplaced, and if its close order is
+    dropped (release_unplaced) or the process stops, the fill is paired
+    again.
+    """
+
+    def __init__(self, filename: str = ""):
+        self.filename = filename
+        # Open order ID => [close order clientOid, open order createdAt].
+        self.pairs: Dict[str, List] = {}
+        # Pairs whose close order is not placed yet, never saved.
+        self.unplaced: Dict[str, List] = {}
+        # Directions ("rebuy", "resell") whose existing history is paired.
+        self.migrated: Set[str] = set()
+        # Close order clientOid => the open order IDs it closes (several,
+        # once close orders are merged).
+        self.opens: Dict[str, Set[str]] = {}
+        if filename and os.path.exists(filename):
+            with open(filename, encoding="utf-8") as handle:
+                data = json.load(handle)
+            self.pairs = data["pairs"]
+            self.migrated = set(data["migrated"])
+            for open_id, (close_oid, _) in self.pairs.items():
+                self.opens.setdefault(close_oid, set()).add(open_id)
+
+    def __contains__(self, open_id: str) -> bool:
+        return open_id in self.pairs or open_id in self.unplaced
+
+    def __len__(self) -> int:
+        return len(self.pairs) + len(self.unplaced)
+
+    def close_oid(self, open_id: str) -> str:
+        return (self.pairs.get(open_id) or self.unplaced[open_id])[0]
+
+    def pair(
+        self,
+        open_id: str,
+        close_oid: str,
+        created_at: int,
+        placed: bool = True,
+    ) -> None:
+        """
+        Pair a fill with its close order, which is placed already, or is
+        not yet (and then the pair is unplaced until confirmed).
+        """
+        self.unpair(open_id)
+        (self.pairs if placed else self.unplaced)[open_id] = [
+            close_oid,
+            created_at,
+        ]
+        self.opens.setdefault(close_oid, set()).add(open_id)
+
+    def unpair(self, open_id: str) -> None:
+        """
+        Forget a fill's pair, if any.
+        """
+        pair = self.pairs.pop(open_id, None) or self.unplaced.pop(
+            open_id, None
+        )
+        if pair is None:
+            return
+        opens = self.opens[pair[0]]
+        opens.discard(open_id)
+        if not opens:
+            del self.opens[pair[0]]
+
+    def confirm(self, close_oids: Iterable[str]) -> int:
+        """
+        Record that close orders have been placed. Return the number of
+        pairs confirmed.
+        """
+        confirmed = [
+            open_id
+            for close_oid in set(close_oids)
+            for open_id in self.opens.get(close_oid, ())
+            if open_id in self.unplaced
+        ]
+        for open_id in confirmed:
+            self.pairs[open_id] = self.unplaced.pop(open_id)
+        return len(confirmed)
+
+    def rename(self, aliases: Dict[str, str]) -> None:
+        """
+        Follow close orders merged into others (clientOid => clientOid).
+        """
+        for old, new in aliases.items():
+            if old == new or old not in self.opens:
+                continue
+            opens = self.opens.pop(old)
+            for open_id in opens:
+                (self.pairs.get(open_id) or self.unplaced[open_id])[0] = new
+            self.opens.setdefault(new, set()).update(opens)
+
+    def release(self, close_oids: Iterable[str]) -> List[str]:
+        """
+        Unpair fills whose close order could not be placed, so that they
+        are paired again later. Return the open order IDs released.
+        """
+        released: List[str] = []
+        for close_oid in set(close_oids):
+            for open_id in self.opens.pop(close_oid, ()):
+                self.pairs.pop(open_id, None)
+                self.unplaced.pop(open_id, None)
+                released.append(open_id)
+        return released
+
+    def release_unplaced(self, keep: Iterable[str] = ()) -> List[str]:
+        """
+        Unpair the fills whose close orders were not placed, except those
+        still to be (keep: clientOids, e.g. waiting for a retry). Return
+        the open order IDs released.
+        """
+        keep = set(keep)
+        return self.release(
+            close_oid
+            for close_oid, _ in self.unplaced.values()
+            if close_oid not in keep
+        )
+
+    def prune(self, before: int) -> int:
+        """
+        Forget pairs for open orders created before a time (in ms), which
+        will not be seen again. Return the number forgotten.
+        """
+        old = [
+            open_id
+            for pairs in (self.pairs, self.unplaced)
+            for open_id, (_, created_at) in pairs.items()
+            if created_at < before
+        ]
+        for open_id in old:
+            self.unpair(open_id)
+        return len(old)
+
+    def save(self) -> None:
+        """
+        Write the ledger to its file (if any), atomically.
+        """
+        if not self.filename:
+            return
+        tmpname = self.filename + ".tmp"
+        with open(tmpname, "w", encoding="utf-8") as handle:
+            json.dump(
+                {"migrated": sorted(self.migrated), "pairs": self.pairs},
+                handle,
+                sort_keys=True,
+            )
+        os.replace(tmpname, self.filename)
@@ -0,0 +1,60 @@
+"""
+A class for a MarketData object: tickers for all markets, fetched at once.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .ticker import Ticker
+
+
+class MarketData:
+    """
+    Tickers for every market, fetched with one all tickers request and
+    cached for up to ttl seconds, so that Bots for many markets can share
+    one fetch per tick and look their own ticker up in a dict.
+    """
+
+    def __init__(
+        self,
+        market: Any,
+        ttl: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.market = market
+        self.ttl = ttl
+        self.clock = clock
+        self.tickers: Dict[str, Ticker] = {}
+        self.fetched_at: Optional[float] = None
+        self.fetches = 0
+
+    def expired(self) -> bool:
+        return (
+            self.fetched_at is None
+            or self.clock() - self.fetched_at >= self.ttl
+        )
+
+    def refresh(self) -> None:
+        """
+        Fetch and parse the tickers for all markets.
+        """
+        data = self.market.get_all_tickers()
+        self.tickers = {
+            item["symbol"]: Ticker.from_kucoin_all(item, int(data["time"]))
+            for item in data["ticker"]
+        }
+        self.fetched_at = self.clock()
+        self.fetches += 1
+
+    def get(self, symbol: str) -> Optional[Ticker]:
+        """
+        Return the ticker for a market, fetching all of them again if the
+        cached ones are too old, or None if the market is not listed, or
+        has no bid, ask or last price (e.g. halted, or not yet trading).
+        """
+        if self.expired():
+            self.refresh()
+        ticker = self.tickers.get(symbol)
+        if ticker is None or min(ticker.bid, ticker.ask, ticker.price) <= 0.0:
+            return None
+        return ticker
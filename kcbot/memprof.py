@@ -0,0 +1,134 @@
+"""
+Classes for profiling memory use over many loop iterations, to find leaks.
+"""
+
+import logging
+import tracemalloc
+from typing import Any, List, Optional, Tuple
+
+# Allocations by the profiler itself, which are not the Bot's.
+IGNORED = (
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+)
+
+
+class MemoryGrowthError(Exception):
+    """
+    Memory use grew by more than allowed, per iteration.
+    """
+
+
+class MemoryProfiler:
+    """
+    Takes a tracemalloc snapshot every so many iterations, and logs the
+    allocation sites which grew most since the previous one, and the
+    growth rate of the total traced memory.
+    """
+
+    def __init__(
+        self,
+        every: int = 100,
+        top: int = 10,
+        frames: int = 1,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.every = every
+        self.top = top
+        self.frames = frames
+        self.logger = logger or logging.getLogger("KCBot.Memory")
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        # (iteration, traced bytes) at each snapshot.
+        self.samples: List[Tuple[int, int]] = []
+        self.started = False
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started = True
+
+    def stop(self) -> None:
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
+        self.snapshot = None
+
+    def take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, name) for name in IGNORED]
+        )
+
+    def sample(self, iteration: int) -> List[Any]:
+        """
+        After every "every" iterations, snapshot the heap and return the
+        top statistics (tracemalloc.StatisticDiff) by growth since the last
+        snapshot, logging them. Otherwise return [].
+        """
+        if iteration % self.every:
+            return []
+        self.start()
+        snapshot = self.take()
+        current, _ = tracemalloc.get_traced_memory()
+        self.samples.append((iteration, current))
+        stats: List[Any] = []
+        if self.snapshot is not None:
+            stats = snapshot.compare_to(self.snapshot, "lineno")[: self.top]
+            self.logger.info(
+                "Memory at iteration %d: %.1f KiB traced, growing %.1f "
+                "B/iteration",
+                iteration,
+                current / 1024.0,
+                self.growth_rate(),
+            )
+            for stat in stats:
+                self.logger.info("Memory: %s", stat)
+        self.snapshot = snapshot
+        return stats
+
+    def growth_rate(self, skip: int = 0) -> float:
+        """
+        Return the growth in traced memory, in bytes per iteration, as the
+        least squares slope through the samples after the first skip.
+        """
+        samples = self.samples[skip:]
+        if len(samples) < 2:
+            return 0.0
+        count = len(samples)
+        mean_x = sum(x for x, _ in samples) / count
+        mean_y = sum(y for _, y in samples) / count
+        var = sum((x - mean_x) ** 2 for x, _ in samples)
+        cov = sum((x - mean_x) * (y - mean_y) for x, y in samples)
+        return cov / var if var else 0.0
+
+
+def soak(
+    bot: Any,
+    iterations: int = 2000,
+    every: int = 100,
+    warmup: int = 2,
+    max_growth: float = 256.0,
+) -> float:
+    """
+    Run a Bot (normally with mocked clients) for a number of iterations
+    without sleeping, profiling its memory use. Return the growth rate in
+    bytes per iteration, ignoring the first warmup samples while caches
+    fill, and raise MemoryGrowthError if it is more than max_growth.
+    """
+    profiler = MemoryProfiler(every=every, logger=bot.logger)
+    profiler.start()
+    try:
+        for iteration in range(iterations + 1):
+            if iteration:
+                bot.run_once()
+            profiler.sample(iteration)
+        rate = profiler.growth_rate(skip=warmup)
+    finally:
+        profiler.stop()
+    if rate > max_growth:
+        raise MemoryGrowthError(
+            f"Memory grew by {rate:.1f} bytes per iteration, more than "
+            f"{max_growth:.1f}"
+        )
+    return rate
@@ -0,0 +1,71 @@
+"""
+Functions for netting orders from several sources before submission.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from .increment import Increment
+
+
+def net_orders(
+    orders: List[Dict[str, Any]],
+    prices: Increment,
+    sizes: Increment,
+    aliases: Optional[Dict[str, str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Consolidate the limit orders intended for one tick:
+      - orders with the same side, price and time in force are merged into
+        one, keeping the first order's clientOid and remark
+      - buys priced at or above sells would trade with each other, so the
+        highest buys and lowest sells are reduced by the size they would
+        match, without either being placed.
+    Return the orders still to place, with exact sizes, in their original
+    order. If aliases is given, it is filled with the clientOid of each
+    order merged into another => the clientOid of the order it merged into.
+    """
+    merged: Dict[Tuple[Any, ...], Tuple[int, Dict[str, Any]]] = {}
+    for order in orders:
+        price = prices.units(order["price"])
+        key = (
+            order["side"],
+            price,
+            order.get("timeInForce"),
+            order.get("cancelAfter"),
+        )
+        size = sizes.units(order["size"])
+        if key in merged:
+            merged[key] = (merged[key][0] + size, merged[key][1])
+            if aliases is not None:
+                aliases[order["clientOid"]] = merged[key][1]["clientOid"]
+        else:
+            merged[key] = (size, order)
+
+    remaining = {id(order): size for size, order in merged.values()}
+    buys = sorted(
+        (val for key, val in merged.items() if key[0] == "buy"),
+        key=lambda val: -prices.units(val[1]["price"]),
+    )
+    sells = sorted(
+        (val for key, val in merged.items() if key[0] == "sell"),
+        key=lambda val: prices.units(val[1]["price"]),
+    )
+    buy_idx = sell_idx = 0
+    while buy_idx < len(buys) and sell_idx < len(sells):
+        buy, sell = buys[buy_idx][1], sells[sell_idx][1]
+        if prices.units(buy["price"]) < prices.units(sell["price"]):
+            break
+        matched = min(remaining[id(buy)], remaining[id(sell)])
+        remaining[id(buy)] -= matched
+        remaining[id(sell)] -= matched
+        if remaining[id(buy)] == 0:
+            buy_idx += 1
+        if remaining[id(sell)] == 0:
+            sell_idx += 1
+
+    netted: List[Dict[str, Any]] = []
+    for _, order in merged.values():
+        size = remaining[id(order)]
+        if size > 0:
+            netted.append(dict(order, size=sizes.to_str(size)))
+    return netted
@@ -0,0 +1,184 @@
+"""
+A class for an OrderBook object: a local level-2 order book.
+"""
+
+import bisect
+import itertools
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .increment import Increment
+
+
+class BookSide:
+    """
+    One side of an order book: sizes (in lots) by price (in ticks), with
+    the prices kept sorted best first, and cumulative sizes computed lazily
+    for depth queries.
+    """
+
+    def __init__(self, descending: bool):
+        # Prices are stored negated for bids, so both sides sort best first.
+        self.sign = -1 if descending else 1
+        self.sizes: Dict[int, int] = {}
+        self.keys: List[int] = []
+        self.cumulative: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def clear(self) -> None:
+        self.sizes.clear()
+        self.keys.clear()
+        self.cumulative = None
+
+    def set(self, price: int, size: int) -> None:
+        """
+        Set the size at a price level, removing the level if size is 0.
+        """
+        key = price * self.sign
+        if size == 0:
+            if self.sizes.pop(price, None) is not None:
+                del self.keys[bisect.bisect_left(self.keys, key)]
+                self.cumulative = None
+            return
+        if price not in self.sizes:
+            bisect.insort(self.keys, key)
+        self.sizes[price] = size
+        self.cumulative = None
+
+    def best(self) -> Optional[int]:
+        return self.keys[0] * self.sign if self.keys else None
+
+    def totals(self) -> List[int]:
+        """
+        Return the cumulative size from the best price to each level.
+        """
+        if self.cumulative is None:
+            self.cumulative = list(
+                itertools.accumulate(
+                    self.sizes[key * self.sign] for key in self.keys
+                )
+            )
+        return self.cumulative
+
+    def price_for(self, size: int) -> Optional[int]:
+        """
+        Return the worst price reached when filling size against this side,
+        or None if the side is not deep enough.
+        """
+        totals = self.totals()
+        idx = bisect.bisect_left(totals, size)
+        if idx == len(totals):
+            return None
+        return self.keys[idx] * self.sign
+
+    def depth_at(self, price: int) -> int:
+        """
+        Return the cumulative size from the best price to price, inclusive.
+        """
+        idx = bisect.bisect_right(self.keys, price * self.sign)
+        return self.totals()[idx - 1] if idx else 0
+
+
+class OrderBook:
+    """
+    A level-2 order book for one market, seeded from a snapshot and then
+    updated from incremental changes. A gap in the change sequence numbers
+    marks the book as out of sync, until it is seeded again.
+    """
+
+    def __init__(
+        self,
+        prices: Increment,
+        sizes: Increment,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.prices = prices
+        self.sizes = sizes
+        self.clock = clock
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.sequence = 0
+        self.synced = False
+        self.updated_at: Optional[float] = None
+
+    def age(self) -> float:
+        """
+        Return the number of seconds since the book was last updated.
+        """
+        if self.updated_at is None:
+            return float("inf")
+        return self.clock() - self.updated_at
+
+    def seed(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Replace the book with a KuCoin level-2 snapshot
+        ({"sequence": ..., "bids": [[price, size], ...], "asks": ...}).
+        """
+        for side, levels in (
+            (self.bids, snapshot["bids"]),
+            (self.asks, snapshot["asks"]),
+        ):
+            side.clear()
+            for price, size, *_ in levels:
+                side.set(self.prices.units(price), self.sizes.units(size))
+        self.sequence = int(snapshot["sequence"])
+        self.synced = True
+        self.updated_at = self.clock()
+
+    def apply(self, data: Dict[str, Any]) -> bool:
+        """
+        Apply a KuCoin level-2 change message ({"sequenceStart": ...,
+        "sequenceEnd": ..., "changes": {"asks": [[price, size, sequence]],
+        "bids": ...}}). Return False if there is a gap in the sequence, in
+        which case the book needs to be seeded again.
+        """
+        if not self.synced:
+            return False
+        if int(data["sequenceEnd"]) <= self.sequence:
+            return True  # Already in the snapshot.
+        if int(data["sequenceStart"]) > self.sequence + 1:
+            self.synced = False
+            return False
+        changes = sorted(
+            [
+                (int(seq), self.bids, price, size)
+                for price, size, seq in data["changes"].get("bids", [])
+            ]
+            + [
+                (int(seq), self.asks, price, size)
+                for price, size, seq in data["changes"].get("asks", [])
+            ],
+            key=lambda change: change[0],
+        )
+        for seq, side, price, size in changes:
+            if seq <= self.sequence:
+                continue
+            if price != "0":  # A price of "0" is a sequence-only message.
+                side.set(self.prices.units(price), self.sizes.units(size))
+            self.sequence = seq
+        self.sequence = max(self.sequence, int(data["sequenceEnd"]))
+        self.updated_at = self.clock()
+        return True
+
+    def best_bid(self) -> Optional[int]:
+        return self.bids.best()
+
+    def best_ask(self) -> Optional[int]:
+        return self.asks.best()
+
+    def price_to_fill(self, side: str, size: int) -> Optional[int]:
+        """
+        Return the worst price (in ticks) a market order of the given side
+        and size (in lots) would fill at: buys take the asks, sells take the
+        bids. None if the book is not deep enough.
+        """
+        return (self.asks if side == "buy" else self.bids).price_for(size)
+
+    def depth(self, side: str, price: int) -> int:
+        """
+        Return the cumulative size (in lots) on one side of the book ("bids"
+        or "asks") from the best price to price, inclusive.
+        """
+        return (self.bids if side == "bids" else self.asks).depth_at(price)
@@ -0,0 +1,82 @@
+"""
+A class for a Phase object: one independently failing step of a loop.
+"""
+
+import logging
+import os
+import time
+import traceback
+from typing import Any, Callable, Optional, Sequence
+
+
+class Phase:
+    """
+    A named step of a Bot loop iteration with its own error handling,
+    deadline and retry budget, so that its failure only affects itself and
+    the phases which require it. No retry starts past the deadline, and in
+    a Bot, requests to the exchange fail once it has passed (the phase is
+    not interrupted while computing, only reported as overrunning).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        deadline: float = 60.0,
+        retries: int = 0,
+        backoff: float = 1.0,
+        requires: Sequence[str] = (),
+    ):
+        self.name = name
+        self.func = func
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.requires = tuple(requires)
+        self.attempts = 0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def run(self, logger: logging.Logger) -> bool:
+        """
+        Run the phase, retrying on failure while the retry budget and the
+        deadline allow. Return True if it succeeded.
+        KeyboardInterrupt is not caught.
+        """
+        start = time.monotonic()
+        self.attempts = 0
+        self.error = None
+        try:
+            while True:
+                self.attempts += 1
+                try:
+                    self.func()
+                    self.error = None
+                    return True
+                except Exception:
+                    self.error = traceback.format_exc()
+                    logger.warning(
+                        "Phase %s failed (attempt %d/%d).%s%s",
+                        self.name,
+                        self.attempts,
+                        self.retries + 1,
+                        os.linesep,
+                        self.error,
+                    )
+
+                elapsed = time.monotonic() - start
+                if (
+                    self.attempts > self.retries
+                    or elapsed + self.backoff > self.deadline
+                ):
+                    return False
+                time.sleep(self.backoff)
+        finally:
+            self.duration = time.monotonic() - start
+            if self.duration > self.deadline:
+                logger.warning(
+                    "Phase %s overran its deadline (%.1fs > %.1fs)",
+                    self.name,
+                    self.duration,
+                    self.deadline,
+                )
@@ -0,0 +1,80 @@
+"""
+Classes for rate limiting exchange requests, across processes.
+"""
+
+import functools
+import multiprocessing
+import time
+from typing import Any
+
+
+class RateLimiter:
+    """
+    A token bucket holding up to burst tokens, refilled at rate tokens per
+    second. Its state is in shared memory, so one RateLimiter passed to
+    several worker processes gives them a single, global budget.
+    """
+
+    def __init__(self, rate: float = 10.0, burst: float = 30.0, ctx=None):
+        ctx = ctx or multiprocessing.get_context()
+        self.rate = rate
+        self.burst = burst
+        self.lock = ctx.Lock()
+        self.tokens = ctx.Value("d", burst, lock=False)
+        self.stamp = ctx.Value("d", time.monotonic(), lock=False)
+
+    def try_acquire(self, weight: float = 1.0) -> float:
+        """
+        Take weight tokens if available and return 0.0, or return how many
+        seconds to wait before they will be.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens.value = min(
+                self.burst,
+                self.tokens.value + (now - self.stamp.value) * self.rate,
+            )
+            self.stamp.value = now
+            if self.tokens.value >= weight:
+                self.tokens.value -= weight
+                return 0.0
+            return (weight - self.tokens.value) / self.rate
+
+    def acquire(self, weight: float = 1.0) -> None:
+        """
+        Take weight tokens, waiting for them if necessary.
+        """
+        while True:
+            wait = self.try_acquire(weight)
+            if wait <= 0.0:
+                return
+            time.sleep(wait)
+
+    def wrap(self, name: str, client: Any) -> "RateLimited":
+        """
+        A Bot client wrapper: return the client, rate limited by this bucket.
+        """
+        return RateLimited(client, self)
+
+
+class RateLimited:
+    """
+    A proxy for an exchange client which takes a token from a RateLimiter
+    before each method call.
+    """
+
+    def __init__(self, client: Any, limiter: RateLimiter):
+        self.client = client
+        self.limiter = limiter
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def limited(*args, **kwargs):
+            self.limiter.acquire()
+            return attr(*args, **kwargs)
+
+        return limited
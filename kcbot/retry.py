@@ -0,0 +1,120 @@
+"""
+Classes for retrying orders that failed to be placed.
+"""
+
+import heapq
+import random
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Failures worth retrying: rate limits and server-side errors, by the HTTP
+# status the client puts first ("429-..."), or by KuCoin's error code.
+# Not by any digits in the message, which may quote a price or size.
+RETRYABLE_STATUS = re.compile(
+    r'^(?:429|50[0234])-|"code"\s*:\s*"(?:429000|500000)"'
+)
+
+# Failures worth retrying, by their text: rate limits and timeouts.
+RETRYABLE = (
+    "busy",
+    "connection",
+    "timed out",
+    "timeout",
+    "too many",
+    "try again",
+)
+
+# Failures meaning a resubmitted order (same clientOid) was already placed.
+DUPLICATE = (
+    "clientoid duplicate",
+    "duplicate clientoid",
+    "duplicate order",
+    "clientoid repeat",
+)
+
+
+def classify(message: str) -> str:
+    """
+    Classify an order failure message or exception text as:
+      - "duplicate": the order was already placed (so count it as placed)
+      - "retry": a transient failure
+      - "fatal": anything else, e.g. insufficient balance.
+    """
+    message = message.strip().lower()
+    if any(text in message for text in DUPLICATE):
+        return "duplicate"
+    if RETRYABLE_STATUS.search(message) or any(
+        text in message for text in RETRYABLE
+    ):
+        return "retry"
+    return "fatal"
+
+
+class RetryQueue:
+    """
+    Orders waiting to be resubmitted, ordered by when they are due.
+
+    Each order keeps its clientOid, so that resubmitting an order which was
+    in fact placed is rejected as a duplicate instead of placed twice.
+    Delays use exponential backoff with full jitter.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.seq = 0
+        self.pending: List[Tuple[float, int, int, str, Dict[str, Any]]] = []
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def delay(self, attempt: int) -> float:
+        """
+        Return a jittered delay before the given attempt (1 = first retry).
+        """
+        cap = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0.0, cap)
+
+    def add(
+        self,
+        now: float,
+        attempt: int,
+        label: str,
+        orders: List[Dict[str, Any]],
+    ) -> bool:
+        """
+        Queue orders that failed together on the given attempt (0 = first
+        try), to be retried together after the same jittered delay.
+        Return False if they have run out of attempts.
+        """
+        if attempt + 1 >= self.max_attempts:
+            return False
+        due = now + self.delay(attempt + 1)
+        for order in orders:
+            self.seq += 1
+            heapq.heappush(
+                self.pending, (due, self.seq, attempt + 1, label, order)
+            )
+        return True
+
+    def next_due(self) -> Optional[float]:
+        """
+        Return when the next order is due, or None if there are none.
+        """
+        return self.pending[0][0] if self.pending else None
+
+    def pop_due(self, now: float) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """
+        Remove and return (attempt, label, order) for all orders now due.
+        """
+        due: List[Tuple[int, str, Dict[str, Any]]] = []
+        while self.pending and self.pending[0][0] <= now:
+            _, _, attempt, label, order = heapq.heappop(self.pending)
+            due.append((attempt, label, order))
+        return due
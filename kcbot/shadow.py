@@ -0,0 +1,101 @@
+"""
+A class for a ShadowBook: fills the orders of shadow strategies locally,
+against the live ticker, without placing them.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from .increment import Increment
+from .ticker import Ticker
+
+
+class ShadowBook:
+    """
+    The resting orders of shadow strategies, filled by the live price as
+    the Monte-Carlo simulator fills them: an order placed at a marketable
+    price fills at once, and a resting order fills when the price moves
+    through it between two ticks. Each fill is at the order's price, in
+    full, and rests a close order (rebuy or resell) close_pcnt away, as
+    the live Bot does. GTT orders expire after their cancelAfter.
+    """
+
+    def __init__(self, prices: Increment, close_pcnt: float = 5.0):
+        self.prices = prices
+        self.close_pcnt = close_pcnt
+        self.orders: List[Dict[str, Any]] = []
+        self.price: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    @staticmethod
+    def last_price(ticker: Ticker) -> float:
+        return ticker.price or ticker.mid
+
+    def match(self, ticker: Ticker, now: int) -> List[Dict[str, Any]]:
+        """
+        Fill the orders which the price crossed since the last tick, then
+        expire the GTT orders whose time is up (at now, in ms). Return the
+        fills.
+        """
+        price = self.last_price(ticker)
+        previous = price if self.price is None else self.price
+        self.price = price
+        low, high = min(previous, price), max(previous, price)
+        fills: List[Dict[str, Any]] = []
+        resting: List[Dict[str, Any]] = []
+        for order in self.orders:
+            order_price = float(order["price"])
+            if (order["side"] == "buy" and low <= order_price) or (
+                order["side"] == "sell" and high >= order_price
+            ):
+                fills.append(order)
+            elif order.get("expiresAt", now + 1) > now:
+                resting.append(order)
+        self.orders = resting
+        for fill in fills:
+            self.close(fill)
+        return fills
+
+    def add(
+        self,
+        orders: List[Dict[str, Any]],
+        ticker: Ticker,
+        now: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        Place orders made at now (in ms). Return those which fill at once.
+        """
+        fills: List[Dict[str, Any]] = []
+        for order in orders:
+            order = dict(order)
+            if order.get("timeInForce") == "GTT":
+                order["expiresAt"] = now + int(order["cancelAfter"]) * 1000
+            price = float(order["price"])
+            if (order["side"] == "buy" and price >= ticker.ask > 0.0) or (
+                order["side"] == "sell" and 0.0 < price <= ticker.bid
+            ):
+                fills.append(order)
+                self.close(order)
+            else:
+                self.orders.append(order)
+        return fills
+
+    def close(self, fill: Dict[str, Any]) -> None:
+        """
+        Rest the close order for a fill, rounded half up to the nearest
+        tick as the live Bot does.
+        """
+        side = "sell" if fill["side"] == "buy" else "buy"
+        step = int(round(self.close_pcnt * 10.0))
+        permille = 1000 + step if side == "sell" else 1000 - step
+        price = (self.prices.units(fill["price"]) * permille + 500) // 1000
+        self.orders.append(
+            {
+                "side": side,
+                "price": self.prices.to_str(price),
+                "size": fill["size"],
+                "remark": fill.get("remark"),
+                "timeInForce": "GTC",
+            }
+        )
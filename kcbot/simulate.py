@@ -0,0 +1,390 @@
+"""
+A Monte-Carlo simulator of the inventory and quote balance exposure that a
+set of strategies could create.
+"""
+
+import concurrent.futures
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .ladder import bumps, shares
+
+# Close orders (rebuy and resell) rest on a grid of log prices this far
+# apart, relative to the starting price.
+GRID_STEP = 0.0025
+
+PERCENTILES = (5.0, 50.0, 95.0, 99.0)
+
+
+def sample_paths(
+    price: float,
+    volatility: float,
+    ticks: int,
+    paths: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    Return price paths of shape (paths, ticks + 1), starting at price, from
+    a geometric Brownian motion without drift with volatility (the standard
+    deviation of log returns) per tick.
+    """
+    returns = rng.normal(
+        -0.5 * volatility**2, volatility, size=(paths, ticks)
+    )
+    log_paths = np.concatenate(
+        [np.zeros((paths, 1)), np.cumsum(returns, axis=1)], axis=1
+    )
+    return price * np.exp(log_paths)
+
+
+def kline_volatility(
+    closes: np.ndarray,
+    interval: float,
+    tick_len: float,
+) -> float:
+    """
+    Return the volatility per tick, from candle closes interval seconds
+    apart (e.g. a KlineStore column), scaled by the square root of time.
+    """
+    returns = np.diff(np.log(closes[closes > 0.0]))
+    if len(returns) < 2:
+        return 0.0
+    return float(np.std(returns, ddof=1) * math.sqrt(tick_len / interval))
+
+
+class Grid:
+    """
+    Resting close orders of one side for every path, as sizes (in base
+    currency) in bins of log price around the starting price. Sells rest
+    above the price and buys below it, so each tick only the bins that the
+    price moved through need to be looked at.
+    """
+
+    def __init__(self, side: str, price: float, paths: int, half: int):
+        self.side = side
+        self.price = price
+        self.offset = half
+        self.prices = price * np.exp(np.arange(-half, half + 1) * GRID_STEP)
+        self.sizes = np.zeros(paths * len(self.prices))
+        # The start of each path's bins in sizes.
+        self.rows = np.arange(paths) * len(self.prices)
+        # Totals by path, of size and funds (in quote currency).
+        self.held = np.zeros(paths)
+        self.funds = np.zeros(paths)
+
+    def bins(self, prices: np.ndarray, rounding) -> np.ndarray:
+        idx = rounding(np.log(prices / self.price) / GRID_STEP) + self.offset
+        return np.clip(idx, 0, len(self.prices) - 1).astype(np.int64)
+
+    def add(
+        self,
+        prices: np.ndarray,
+        sizes: np.ndarray,
+        price: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Place orders, of shape (paths, n), rounded away from the price to a
+        bin. Those already crossed by the price fill at once, at the price:
+        return their total size and funds, by path.
+        """
+        if self.side == "sell":
+            now = prices <= price[:, None]
+            bins = self.bins(prices, np.ceil)
+        else:
+            now = prices >= price[:, None]
+            bins = self.bins(prices, np.floor)
+        resting = np.where(now, 0.0, sizes)
+        # One rung at a time, as a bin indexed twice in one assignment
+        # would only be added to once.
+        flat = self.rows[:, None] + bins
+        for col in range(prices.shape[1]):
+            self.sizes[flat[:, col]] += resting[:, col]
+        self.held += resting.sum(axis=1)
+        self.funds += (resting * self.prices[bins]).sum(axis=1)
+        size = np.where(now, sizes, 0.0).sum(axis=1)
+        return size, size * price
+
+    def take(
+        self,
+        price: np.ndarray,
+        next_price: np.ndarray,
+        width: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fill the orders crossed by a move from price to next_price, of at
+        most width bins. Return their total size and funds, by path.
+        """
+        steps = np.arange(width)[None, :]
+        if self.side == "sell":
+            cols = self.bins(price, np.floor)[:, None] + 1 + steps
+            crossed = cols <= self.bins(next_price, np.floor)[:, None]
+        else:
+            cols = self.bins(price, np.ceil)[:, None] - 1 - steps
+            crossed = cols >= self.bins(next_price, np.ceil)[:, None]
+        cols = np.clip(cols, 0, len(self.prices) - 1)
+        flat = self.rows[:, None] + cols
+        taken = np.where(crossed, self.sizes[flat], 0.0)
+        self.sizes[flat] -= taken
+        size = taken.sum(axis=1)
+        funds = (taken * self.prices[cols]).sum(axis=1)
+        self.held -= size
+        self.funds -= funds
+        return size, funds
+
+
+def rolling_max(prices: np.ndarray, window: int) -> np.ndarray:
+    """
+    Return the highest of the last window prices (fewer at the start), at
+    each tick, in log2(window) passes.
+    """
+    result = prices.copy()
+    span = 1
+    while span * 2 <= window:
+        result[:, span:] = np.maximum(result[:, span:], result[:, :-span])
+        span *= 2
+    if span < window:
+        shift = window - span
+        result[:, shift:] = np.maximum(result[:, shift:], result[:, :-shift])
+    return result
+
+
+def rolling_mean(prices: np.ndarray, window: int) -> np.ndarray:
+    """
+    Return the mean of the last window prices (fewer at the start), at
+    each tick.
+    """
+    sums = np.cumsum(prices, axis=1)
+    sums[:, window:] -= sums[:, :-window].copy()
+    counts = np.minimum(np.arange(1, prices.shape[1] + 1), window)
+    return sums / counts[None, :]
+
+
+def ladder_orders(
+    side: str,
+    strategy: Dict[str, Any],
+    price: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    avg: np.ndarray,
+    volume: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the prices and sizes, of shape (paths, rungs), of one side of a
+    strategy's ladder, as Bot.buy_orders and Bot.sell_orders place them.
+    Sizes are 0.0 where no order would be placed. With no order book, the
+    "depth" strategy is taken to start at the best bid or ask, which
+    overstates its fills.
+    """
+    name = strategy["strategy"]
+    if name == "day-high-low":
+        base = low if side == "buy" else high
+    elif name in ("bid-and-ask", "bid-or-ask", "depth"):
+        base = price
+    else:
+        raise ValueError("Unknown strategy: " + name)
+    count = int(strategy[side]["order_count"])
+    sign = -1.0 if side == "buy" else 1.0
+    pcnt = np.array(bumps(strategy[side]))
+    prices = base[:, None] * (1.0 + sign * pcnt[None, :] / 100.0)
+    sizes = (
+        volume[:, None]
+        * strategy[side]["vol_percent"]
+        / 100.0
+        * np.array(shares(count))[None, :]
+    )
+    sizes = np.where(prices > 0.0, sizes, 0.0)
+    if name == "bid-or-ask":
+        if side == "buy":
+            sizes = np.where((price >= avg)[:, None], sizes, 0.0)
+        else:
+            sizes = np.where((price <= avg)[:, None], sizes, 0.0)
+    return prices, sizes
+
+
+def simulate_paths(
+    strategies: Sequence[Dict[str, Any]],
+    prices: np.ndarray,
+    base: float,
+    quote: float,
+    tick_len: float,
+    history_len: int = 1440,
+    min_sell: float = 100.0,
+    close_pcnt: float = 5.0,
+) -> Dict[str, np.ndarray]:
+    """
+    Run the strategies over price paths of shape (paths, ticks + 1), from
+    balances of base and quote. Each tick, every strategy places its
+    ladders at the tick's price, sized from the available balances; those
+    crossed by the next tick's price fill, and the rest expire. Each fill
+    places a close order close_pcnt away (rebuy or resell), which rests
+    until crossed. Return, by path, the peak base inventory, the lowest
+    quote balance, the peak value of the inventory, and the final value.
+    """
+    paths, ticks = prices.shape[0], prices.shape[1] - 1
+    day = max(1, int(round(86400.0 / tick_len)))
+    highs = rolling_max(prices, day)
+    lows = -rolling_max(-prices, day)
+    avgs = rolling_mean(prices, history_len)
+    up = 1.0 + close_pcnt / 100.0
+    down = 1.0 - close_pcnt / 100.0
+
+    # The most bins the price moves through in a tick, and enough bins for
+    # every price reached and the close orders around it.
+    log_prices = np.log(prices / prices[0, 0]) / GRID_STEP
+    width = int(np.ceil(np.abs(np.diff(log_prices, axis=1)).max())) + 2
+    half = (
+        int(np.ceil(np.abs(log_prices).max()))
+        + int(np.ceil(math.log(up) / GRID_STEP))
+        + width
+    )
+    sells = Grid("sell", prices[0, 0], paths, half)
+    buys = Grid("buy", prices[0, 0], paths, half)
+
+    # Totals, including funds held by resting orders.
+    bal_base = np.full(paths, float(base))
+    bal_quote = np.full(paths, float(quote))
+    peak_base = bal_base.copy()
+    low_quote = bal_quote.copy()
+    peak_value = bal_base * prices[:, 0]
+
+    for tick in range(ticks):
+        price, next_price = prices[:, tick], prices[:, tick + 1]
+        avail_base = bal_base - sells.held
+        avail_quote = bal_quote - buys.funds
+
+        # Resting close orders crossed by the next price.
+        size, funds = sells.take(price, next_price, width)
+        bal_base -= size
+        bal_quote += funds
+        size, funds = buys.take(price, next_price, width)
+        bal_base += size
+        bal_quote -= funds
+
+        for strategy in strategies:
+            for side in ("buy", "sell"):
+                if int(strategy[side]["order_count"]) == 0:
+                    continue
+                if side == "buy":
+                    volume = np.maximum(avail_quote, 0.0) / price
+                else:
+                    volume = np.where(avail_base >= min_sell, avail_base, 0.0)
+                order_prices, sizes = ladder_orders(
+                    side,
+                    strategy,
+                    price,
+                    highs[:, tick],
+                    lows[:, tick],
+                    avgs[:, tick],
+                    volume,
+                )
+                if side == "buy":
+                    filled = np.where(
+                        next_price[:, None] <= order_prices, sizes, 0.0
+                    )
+                    bal_base += filled.sum(axis=1)
+                    bal_quote -= (filled * order_prices).sum(axis=1)
+                    size, funds = sells.add(
+                        order_prices * up, filled, next_price
+                    )
+                    bal_base -= size
+                    bal_quote += funds
+                else:
+                    filled = np.where(
+                        next_price[:, None] >= order_prices, sizes, 0.0
+                    )
+                    bal_base -= filled.sum(axis=1)
+                    bal_quote += (filled * order_prices).sum(axis=1)
+                    size, funds = buys.add(
+                        order_prices * down, filled, next_price
+                    )
+                    bal_base += size
+                    bal_quote -= funds
+
+        peak_base = np.maximum(peak_base, bal_base)
+        low_quote = np.minimum(low_quote, bal_quote)
+        peak_value = np.maximum(peak_value, bal_base * next_price)
+
+    return {
+        "peak_base": peak_base,
+        "low_quote": low_quote,
+        "peak_value": peak_value,
+        "final_value": bal_base * prices[:, -1] + bal_quote,
+    }
+
+
+def _simulate_chunk(args: Tuple[Any, ...]) -> Dict[str, np.ndarray]:
+    (
+        strategies,
+        price,
+        volatility,
+        ticks,
+        paths,
+        base,
+        quote,
+        tick_len,
+        seed,
+    ) = args
+    rng = np.random.default_rng(seed)
+    prices = sample_paths(price, volatility, ticks, paths, rng)
+    return simulate_paths(strategies, prices, base, quote, tick_len)
+
+
+def simulate(
+    strategies: Sequence[Dict[str, Any]],
+    price: float,
+    volatility: float,
+    base: float,
+    quote: float,
+    tick_len: float = 60.0,
+    ticks: int = 1440,
+    paths: int = 4000,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> Dict[str, Dict[float, float]]:
+    """
+    Simulate the strategies over paths sampled price paths, split across
+    worker processes (one per CPU by default, none if workers is 1), and
+    return the PERCENTILES of each result of simulate_paths.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = min(workers, paths)
+    seeds = np.random.SeedSequence(seed).spawn(chunks)
+    sizes = [
+        paths // chunks + (1 if idx < paths % chunks else 0)
+        for idx in range(chunks)
+    ]
+    jobs = [
+        (
+            list(strategies),
+            price,
+            volatility,
+            ticks,
+            size,
+            base,
+            quote,
+            tick_len,
+            chunk_seed,
+        )
+        for size, chunk_seed in zip(sizes, seeds)
+    ]
+    if chunks == 1:
+        results: List[Dict[str, np.ndarray]] = [_simulate_chunk(jobs[0])]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(chunks) as executor:
+            results = list(executor.map(_simulate_chunk, jobs))
+    return {
+        name: {
+            pct: float(val)
+            for pct, val in zip(
+                PERCENTILES,
+                np.percentile(
+                    np.concatenate([result[name] for result in results]),
+                    PERCENTILES,
+                ),
+            )
+        }
+        for name in results[0]
+    }
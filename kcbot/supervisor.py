@@ -0,0 +1,265 @@
+"""
+A class for a Supervisor object: runs markets sharded across processes.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from .ratelimit import RateLimiter
+
+Config = Union[str, Dict[str, Any]]
+
+
+def market_name(config: Config) -> str:
+    """
+    Return a name for the market a config file (or dict) trades.
+    """
+    if isinstance(config, str):
+        with open(config, encoding="utf-8") as configf:
+            cfg = json.load(configf)
+    else:
+        cfg = config
+    return f"{cfg['base']}-{cfg['quote']}"
+
+
+def assign_shards(loads: Dict[str, float], count: int) -> List[List[str]]:
+    """
+    Split markets into count shards with loads as even as possible, by
+    giving each market, heaviest first, to the least loaded shard.
+    """
+    shards: List[List[str]] = [[] for _ in range(count)]
+    totals = [0.0] * count
+    for name in sorted(loads, key=lambda name: (-loads[name], name)):
+        idx = totals.index(min(totals))
+        shards[idx].append(name)
+        totals[idx] += loads[name]
+    return [sorted(shard) for shard in shards]
+
+
+def run_shard(
+    configs: Dict[str, Config],
+    keys: Config,
+    limiter: RateLimiter,
+    reports: Any,
+    stop: Any,
+    tick_len: float,
+) -> None:
+    """
+    Worker process main: run one Bot per market in the shard, sharing one
+    fetch of all tickers per tick, and reporting how long each iteration
+    takes, until stop is set. Each Bot runs once per tick_len of its own
+    config, which its GTT orders live for; every tick_len seconds (or
+    when triggered) the worker checks the kill switch and which are due.
+    """
+    # Imported here, so the supervisor process never imports the client.
+    import kucoin.client as kcc
+
+    from .bot import Bot
+    from .killswitch import KillSwitch
+    from .marketdata import MarketData
+
+    market_data = MarketData(
+        limiter.wrap("market", kcc.Market()), ttl=tick_len / 2.0
+    )
+    kill_switch = KillSwitch()
+    kill_switch.install()
+    bots = {
+        name: Bot(
+            config=config,
+            keys=keys,
+            wrappers=[limiter.wrap],
+            market_data=market_data,
+            kill_switch=kill_switch,
+        )
+        for name, config in configs.items()
+    }
+    logger = logging.getLogger("KCBot.Worker")
+    due = {name: 0.0 for name in bots}
+    while not stop.is_set():
+        start = time.monotonic()
+        kill_switch.poll()
+        for name, bot in bots.items():
+            bot_start = time.monotonic()
+            if bot_start < due[name] and not kill_switch.triggered:
+                continue
+            try:
+                bot.run_once()
+            except Exception:
+                logger.warning(
+                    "%s: caught exception while looping.%s%s",
+                    name,
+                    os.linesep,
+                    traceback.format_exc(),
+                )
+            due[name] = bot_start + bot.tick_len
+            reports.put((name, time.monotonic() - bot_start))
+        kill_switch.wait(
+            stop,
+            min([start + tick_len, *due.values()]) - time.monotonic(),
+        )
+
+
+class Worker:
+    """
+    A worker process and the shard of markets it runs.
+    """
+
+    def __init__(self, shard: List[str], ctx: Any):
+        self.shard = shard
+        self.stop = ctx.Event()
+        self.process: Optional[Any] = None
+        self.restarts = 0
+
+
+class Supervisor:
+    """
+    Runs the existing Bot logic for many markets, sharded across worker
+    processes which share one global rate limit. Crashed workers are
+    restarted, and shards are rebalanced by the measured time each market's
+    iterations take.
+    """
+
+    def __init__(
+        self,
+        configs: Sequence[Config],
+        keys: Config,
+        workers: int = 2,
+        rate: float = 10.0,
+        burst: float = 30.0,
+        tick_len: float = 60.0,
+        rebalance_len: float = 600.0,
+        imbalance: float = 1.5,
+        target: Callable[..., None] = run_shard,
+    ):
+        self.ctx = multiprocessing.get_context()
+        self.configs = {market_name(config): config for config in configs}
+        self.keys = keys
+        self.limiter = RateLimiter(rate, burst, ctx=self.ctx)
+        self.reports = self.ctx.Queue()
+        self.tick_len = tick_len
+        self.rebalance_len = rebalance_len
+        self.imbalance = imbalance
+        self.target = target
+        # Smoothed iteration time by market. Until measured, all equal.
+        self.loads = {name: 1.0 for name in self.configs}
+        self.workers = [
+            Worker(shard, self.ctx)
+            for shard in assign_shards(
+                self.loads, min(workers, len(self.configs))
+            )
+        ]
+        self.logger = logging.getLogger("KCBot.Supervisor")
+
+    def start(self, worker: Worker) -> None:
+        worker.stop = self.ctx.Event()
+        worker.process = self.ctx.Process(
+            target=self.target,
+            args=(
+                {name: self.configs[name] for name in worker.shard},
+                self.keys,
+                self.limiter,
+                self.reports,
+                worker.stop,
+                self.tick_len,
+            ),
+            daemon=True,
+        )
+        worker.process.start()
+        self.logger.info(
+            "Started worker %d for %s",
+            worker.process.pid,
+            ", ".join(worker.shard),
+        )
+
+    def stop_all(self, timeout: float = 10.0) -> None:
+        for worker in self.workers:
+            worker.stop.set()
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(timeout)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+
+    def collect(self, timeout: float) -> int:
+        """
+        Read iteration time reports for up to timeout seconds, updating the
+        smoothed loads. Return the number read.
+        """
+        count = 0
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                name, duration = self.reports.get(
+                    timeout=max(0.0, deadline - time.monotonic())
+                )
+            except queue.Empty:
+                return count
+            if name in self.loads:
+                self.loads[name] += 0.2 * (duration - self.loads[name])
+            count += 1
+
+    def restart_crashed(self) -> int:
+        """
+        Restart any worker whose process has died. Return how many were.
+        """
+        count = 0
+        for worker in self.workers:
+            if worker.process is not None and not worker.process.is_alive():
+                self.logger.warning(
+                    "Worker for %s exited with code %s, restarting",
+                    ", ".join(worker.shard),
+                    worker.process.exitcode,
+                )
+                worker.restarts += 1
+                self.start(worker)
+                count += 1
+        return count
+
+    def rebalance(self) -> bool:
+        """
+        Reassign shards if the busiest worker's load is more than imbalance
+        times the mean. Return True if workers were restarted with new
+        shards.
+        """
+        totals = [
+            sum(self.loads[name] for name in worker.shard)
+            for worker in self.workers
+        ]
+        mean = sum(totals) / len(totals)
+        if mean <= 0.0 or max(totals) <= mean * self.imbalance:
+            return False
+        shards = assign_shards(self.loads, len(self.workers))
+        if sorted(shards) == sorted(worker.shard for worker in self.workers):
+            return False
+        self.logger.info("Rebalancing shards: %s", shards)
+        self.stop_all()
+        self.workers = [Worker(shard, self.ctx) for shard in shards]
+        for worker in self.workers:
+            self.start(worker)
+        return True
+
+    def run(self, duration: Optional[float] = None) -> None:
+        """
+        Start the workers and supervise them, for duration seconds or
+        until interrupted.
+        """
+        for worker in self.workers:
+            self.start(worker)
+        start = last_rebalance = time.monotonic()
+        try:
+            while duration is None or time.monotonic() - start < duration:
+                self.collect(1.0)
+                self.restart_crashed()
+                if time.monotonic() - last_rebalance >= self.rebalance_len:
+                    last_rebalance = time.monotonic()
+                    self.rebalance()
+        except KeyboardInterrupt:
+            self.logger.info("Interrupted")
+        finally:
+            self.stop_all()
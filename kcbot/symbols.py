@@ -0,0 +1,134 @@
+"""
+Classes for market (symbol) metadata: increments and size limits.
+"""
+
+import time
+from decimal import ROUND_UP, Decimal
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from .increment import Increment
+
+
+class SymbolInfo:
+    """
+    The trading rules for one market, as published by the exchange.
+    """
+
+    def __init__(
+        self,
+        symbol: str,
+        base_increment: str = "0.0001",
+        price_increment: str = "0.0001",
+        base_min_size: str = "0",
+        base_max_size: str = "0",
+        min_funds: str = "0",
+        enable_trading: bool = True,
+    ):
+        self.symbol = symbol
+        self.prices = Increment(price_increment)
+        self.sizes = Increment(base_increment)
+        self.min_size = self.sizes.units(base_min_size, rounding=ROUND_UP)
+        # A max size of 0 means "no maximum".
+        self.max_size = self.sizes.units_down(base_max_size)
+        self.min_funds = Decimal(min_funds)
+        self.enable_trading = enable_trading
+
+    @classmethod
+    def from_kucoin(cls, data: Dict[str, Any]) -> "SymbolInfo":
+        """
+        Create a SymbolInfo object from a KuCoin API response item.
+        """
+        return SymbolInfo(
+            symbol=data["symbol"],
+            base_increment=data["baseIncrement"],
+            price_increment=data["priceIncrement"],
+            base_min_size=data["baseMinSize"],
+            base_max_size=data["baseMaxSize"],
+            min_funds=data.get("minFunds") or data["quoteMinSize"],
+            enable_trading=data.get("enableTrading", True),
+        )
+
+    def fit(self, price: int, size: int) -> Tuple[int, str]:
+        """
+        Fit an order (price in ticks, size in lots) to the trading rules.
+        Return the (possibly clamped) size, or 0 and the reason the order
+        would be rejected.
+        """
+        if not self.enable_trading:
+            return 0, "trading disabled"
+        if price <= 0:
+            return 0, "price not positive"
+        if 0 < self.max_size < size:
+            size = self.max_size
+        if size <= 0 or size < self.min_size:
+            return 0, "size below minimum"
+        funds = self.prices.decimal(price) * self.sizes.decimal(size)
+        if funds < self.min_funds:
+            return 0, "funds below minimum"
+        return size, ""
+
+
+class UnknownSymbol(KeyError):
+    """
+    A market is not listed by the exchange (or has been delisted).
+    """
+
+    def __str__(self) -> str:
+        return str(self.args[0])
+
+
+class SymbolCache:
+    """
+    A cache of SymbolInfo objects for all markets, fetched with a single
+    request and refreshed once it is older than ttl seconds. A market not
+    found is refetched once, then remembered as missing until the next
+    refresh.
+    """
+
+    def __init__(
+        self,
+        market: Any,
+        ttl: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.market = market
+        self.ttl = ttl
+        self.clock = clock
+        self.fetched_at: Optional[float] = None
+        self.symbols: Dict[str, SymbolInfo] = {}
+        # Markets not in the list last fetched.
+        self.missing: Set[str] = set()
+
+    def expired(self) -> bool:
+        """
+        Return True if the cache needs to be (re)fetched.
+        """
+        return (
+            self.fetched_at is None
+            or self.clock() - self.fetched_at >= self.ttl
+        )
+
+    def refresh(self) -> None:
+        """
+        Fetch metadata for all markets.
+        """
+        self.symbols = {
+            item["symbol"]: SymbolInfo.from_kucoin(item)
+            for item in self.market.get_symbol_list()
+        }
+        self.missing = set()
+        self.fetched_at = self.clock()
+
+    def get(self, symbol: str) -> SymbolInfo:
+        """
+        Get the metadata for a market, refreshing the cache if needed.
+        Raise UnknownSymbol if the exchange does not list it.
+        """
+        if self.expired() or (
+            symbol not in self.symbols and symbol not in self.missing
+        ):
+            self.refresh()
+        if symbol not in self.symbols:
+            self.missing.add(symbol)
+            raise UnknownSymbol(f"Market {symbol} is not listed")
+        return self.symbols[symbol]
@@ -10,14 +10,33 @@ class Ticker:
     A Ticker object.
     """
 
-    ask = 0.0
-    bid = 0.0
-    high = 0.0
-    low = 0.0
+    __slots__ = ("ask", "bid", "high", "low", "price", "size", "time")
 
-    def __init__(self, **kwargs):
-        for key, val in kwargs.items():
-            setattr(self, key, val)
+    def __init__(
+        self,
+        ask: float = 0.0,
+        bid: float = 0.0,
+        high: float = 0.0,
+        low: float = 0.0,
+        price: float = 0.0,
+        size: float = 0.0,
+        time: int = 0,
+    ):
+        self.ask = ask
+        self.bid = bid
+        self.high = high
+        self.low = low
+        # The last trade.
+        self.price = price
+        self.size = size
+        self.time = time
+
+    @property
+    def mid(self) -> float:
+        """
+        Return the mid price, between the best bid and ask.
+        """
+        return (self.ask + self.bid) / 2.0
 
     @classmethod
     def from_kucoin(
@@ -33,6 +52,25 @@ class Ticker:
             bid=float(tick["bestBid"]),
             high=float(day_stats["high"]),
             low=float(day_stats["low"]),
+            price=float(tick.get("price", 0.0)),
+            size=float(tick.get("size", 0.0)),
+            time=int(tick.get("time", 0)),
+        )
+
+    @classmethod
+    def from_kucoin_all(cls, item: Dict[str, Any], time: int) -> "Ticker":
+        """
+        Create a Ticker object from one item of a KuCoin all tickers API
+        response, which has no last trade size. Markets without trades
+        have no prices, which are 0.0.
+        """
+        return Ticker(
+            ask=float(item["sell"] or 0.0),
+            bid=float(item["buy"] or 0.0),
+            high=float(item["high"] or 0.0),
+            low=float(item["low"] or 0.0),
+            price=float(item["last"] or 0.0),
+            time=time,
         )
 
     def header(self) -> str:
@@ -22,4 +22,5 @@ setuptools.setup(
     install_requires=[],
     setup_requires=["wheel"],
     zip_safe=False,
+    entry_points={"console_scripts": ["kcbot=kcbot.cli:main"]},
 )
@@ -1,4 +1,31 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Union
+
+
+def create_mock_symbol(
+    base: str,
+    quote: str,
+    **kwargs,
+) -> Dict[str, Any]:
+    symbol = {
+        "symbol": f"{base}-{quote}",
+        "name": f"{base}-{quote}",
+        "baseCurrency": base,
+        "quoteCurrency": quote,
+        "baseMinSize": "0.0001",
+        "quoteMinSize": "0.01",
+        "baseMaxSize": "10000000000",
+        "quoteMaxSize": "99999999",
+        "baseIncrement": "0.0001",
+        "quoteIncrement": "0.0001",
+        "priceIncrement": "0.0001",
+        "feeCurrency": quote,
+        "enableTrading": True,
+        "isMarginEnabled": False,
+        "priceLimitRate": "0.1",
+        "minFunds": "0.1",
+    }
+    symbol.update(kwargs)
+    return symbol
 
 
 def create_mock_market(
@@ -8,8 +35,39 @@ def create_mock_market(
     bid: float,
     ask: float,
     high: float,
+    symbols: Optional[List[Dict[str, Any]]] = None,
 ):
+    symbol_list = symbols or [create_mock_symbol(base, quote)]
+
     class MockMarket:
+        all_tickers_calls = 0
+        kline_calls = 0
+        symbol_list_calls = 0
+
+        def get_all_tickers(self) -> Dict[str, Any]:
+            MockMarket.all_tickers_calls += 1
+            return {
+                "time": 1700000000000,
+                "ticker": [
+                    {
+                        "symbol": f"{base}-{quote}",
+                        "buy": str(bid),
+                        "sell": str(ask),
+                        "high": str(high),
+                        "low": str(low),
+                        "last": str(bid),
+                    },
+                    {
+                        "symbol": "UNTRADED-USDT",
+                        "buy": None,
+                        "sell": None,
+                        "high": None,
+                        "low": None,
+                        "last": None,
+                    },
+                ],
+            }
+
         def get_24h_stats(self, market: str) -> Dict[str, Any]:
             return {
                 "symbol": f"{base}-{quote}",
@@ -17,6 +75,40 @@ def create_mock_market(
                 "low": str(low),
             }
 
+        def get_kline(
+            self,
+            symbol: str,
+            kline_type: str,
+            **kwargs,
+        ) -> List[List[str]]:
+            # Synthetic hourly candles, newest first, at most 1500.
+            MockMarket.kline_calls += 1
+            start = kwargs["startAt"] + -kwargs["startAt"] % 3600
+            times = list(range(start, kwargs["endAt"], 3600))[-1500:]
+            return [
+                [str(t), "1.0", "1.1", "1.2", "0.9", "10.0", "11.0"]
+                for t in reversed(times)
+            ]
+
+        def get_part_order(self, pieces: int, symbol: str) -> Dict[str, Any]:
+            # Levels 1% apart, 10 base units each.
+            return {
+                "sequence": "1000",
+                "time": 1700000000000,
+                "bids": [
+                    [str(round(bid * (1 - i / 100), 4)), "10"]
+                    for i in range(pieces)
+                ],
+                "asks": [
+                    [str(round(ask * (1 + i / 100), 4)), "10"]
+                    for i in range(pieces)
+                ],
+            }
+
+        def get_symbol_list(self, **kwargs) -> List[Dict[str, Any]]:
+            MockMarket.symbol_list_calls += 1
+            return symbol_list
+
         def get_ticker(self, market: str) -> Dict[str, Any]:
             return {
                 "bestAsk": str(ask),
@@ -26,12 +118,80 @@ def create_mock_market(
     return MockMarket
 
 
-def create_mock_trade(order_lists: Dict[str, List[Dict[str, Any]]]):
+def create_mock_trade(
+    order_lists: Dict[str, List[Dict[str, Any]]],
+    bulk_responses: Optional[List[Union[Exception, List[Any]]]] = None,
+):
+    """
+    bulk_responses has one entry per create_bulk_orders call: either an
+    exception to raise, or one failMsg (or None for success) per order.
+    Calls beyond the end of the list succeed.
+    """
+    responses = list(bulk_responses or [])
+
     class MockTrade:
+        bulk_calls: List[List[Dict[str, Any]]] = []
+        order_list_calls: List[Dict[str, Any]] = []
+        cancel_calls: List[Dict[str, Any]] = []
+        fill_list_calls: List[Dict[str, Any]] = []
+
+        def create_bulk_orders(
+            self,
+            symbol: str,
+            orderList: List[Dict[str, Any]],
+        ) -> Dict[str, Any]:
+            MockTrade.bulk_calls.append(orderList)
+            response = responses.pop(0) if responses else []
+            if isinstance(response, Exception):
+                raise response
+            fail_msgs = response + [None] * (len(orderList) - len(response))
+            return {
+                "data": [
+                    dict(
+                        order,
+                        failMsg=fail_msg,
+                        status="fail" if fail_msg else "success",
+                    )
+                    for order, fail_msg in zip(orderList, fail_msgs)
+                ]
+            }
+
         def get_order_list(self, **kwargs) -> Dict[str, Any]:
+            MockTrade.order_list_calls.append(kwargs)
+            if "side" not in kwargs:
+                # Both sides: the first page of each.
+                items = [
+                    item
+                    for side in ("buy", "sell")
+                    for item in order_lists.get(
+                        side + "-" + kwargs["status"], [{"items": []}]
+                    )[0]["items"]
+                ]
+                return {
+                    "currentPage": 1,
+                    "items": items,
+                    "totalNum": len(items),
+                    "totalPage": 1,
+                }
             order_list = order_lists[kwargs["side"] + "-" + kwargs["status"]]
             return order_list[kwargs["currentPage"] - 1]
 
+        def get_fill_list(self, **kwargs) -> Dict[str, Any]:
+            MockTrade.fill_list_calls.append(kwargs)
+            fill_list = order_lists.get(
+                kwargs["side"] + "-fills",
+                [{"currentPage": 1, "items": [], "totalPage": 1}],
+            )
+            return fill_list[kwargs["currentPage"] - 1]
+
+        def cancel_all_orders(self, **kwargs) -> Dict[str, Any]:
+            MockTrade.cancel_calls.append(kwargs)
+            return {"cancelledOrderIds": []}
+
+        def cancel_order(self, orderId: str) -> Dict[str, Any]:
+            MockTrade.cancel_calls.append({"orderId": orderId})
+            return {"cancelledOrderIds": [orderId]}
+
     return MockTrade
 
 
@@ -40,12 +200,30 @@ def create_mock_user(
     quote: str,
     avail_base: float,
     avail_quote: float,
+    ledger_items: Optional[List[Dict[str, Any]]] = None,
 ):
     class MockUser:
+        account_list_calls = 0
+
+        def get_account_ledger(self, **kwargs) -> Dict[str, Any]:
+            items = [
+                item
+                for item in ledger_items or []
+                if item["createdAt"] >= kwargs.get("startAt", 0)
+            ]
+            return {
+                "currentPage": 1,
+                "pageSize": 500,
+                "totalNum": len(items),
+                "totalPage": 1,
+                "items": items,
+            }
+
         def get_account_list(
             self,
             account_type: str = "",
         ) -> List[Dict[str, Any]]:
+            MockUser.account_list_calls += 1
             return [
                 {
                     "available": avail_base,
@@ -0,0 +1,151 @@
+"""
+Test Accounting
+"""
+
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+import kcbot.bot
+from kcbot.accounting import Accounting, Position
+
+from .conftest import create_mock_trade
+
+
+def make_order(
+    oid: str,
+    side: str,
+    size: str,
+    funds: str,
+    remark: str = "careful",
+    **kwargs,
+) -> Dict[str, Any]:
+    order = {
+        "id": oid,
+        "symbol": "BASE-QUOTE",
+        "side": side,
+        "createdAt": 1700000000000,
+        "dealSize": size,
+        "dealFunds": funds,
+        "fee": "0",
+        "feeCurrency": "QUOTE",
+        "remark": remark,
+    }
+    order.update(kwargs)
+    return order
+
+
+def test_position() -> None:
+    position = Position()
+    position.apply("buy", 10.0, 10.0, 0.0)
+    position.apply("buy", 10.0, 20.0, 0.0)
+    assert position.avg_cost == pytest.approx(1.5)
+
+    position.apply("sell", 15.0, 45.0, 0.0)
+    assert position.realized == pytest.approx(22.5)
+    assert position.inventory == pytest.approx(5.0)
+    assert position.avg_cost == pytest.approx(1.5)
+    assert position.unrealized(2.0) == pytest.approx(2.5)
+
+    # Closes the 5 held at a loss, and opens a short of 5 at 1.0.
+    position.apply("sell", 10.0, 10.0, 0.0)
+    assert position.realized == pytest.approx(20.0)
+    assert position.inventory == pytest.approx(-5.0)
+    assert position.avg_cost == pytest.approx(1.0)
+
+    position.apply("buy", 5.0, 2.5, 0.1)
+    assert position.realized == pytest.approx(22.5)
+    assert position.net == pytest.approx(22.4)
+    assert position.inventory == pytest.approx(0.0)
+    assert (position.bought, position.sold) == (25.0, 25.0)
+
+
+def test_accounting(tmp_path) -> None:
+    filename = str(tmp_path / "accounting.json")
+    accounting = Accounting(filename)
+    assert accounting.apply_order(make_order("a", "buy", "10", "10"))
+    assert not accounting.apply_order(make_order("a", "buy", "10", "10"))
+    assert not accounting.apply_order(make_order("b", "buy", "0", "0"))
+    assert accounting.apply_order(
+        make_order(
+            "c", "sell", "4", "8", "resell", fee="0.1", feeCurrency="BASE"
+        )
+    )
+    assert accounting.apply_order(
+        make_order("d", "sell", "1", "2", fee="0.5", feeCurrency="KCS")
+    )
+
+    market = accounting.position("BASE-QUOTE")
+    assert market.inventory == pytest.approx(5.0)
+    assert market.realized == pytest.approx(5.0)
+    # A base currency fee is valued at the fill price.
+    assert market.fees == pytest.approx(0.2)
+    assert accounting.other_fees == {"KCS": 0.5}
+    assert accounting.position(
+        "BASE-QUOTE", "careful"
+    ).inventory == pytest.approx(9.0)
+    assert accounting.position(
+        "BASE-QUOTE", "resell"
+    ).inventory == pytest.approx(-4.0)
+    accounting.save()
+
+    accounting = Accounting(filename)
+    assert accounting.position("BASE-QUOTE").realized == pytest.approx(5.0)
+    assert not accounting.apply_order(make_order("a", "buy", "10", "10"))
+    assert accounting.prune(1700000000001) == 3
+    assert accounting.apply_order(make_order("a", "buy", "10", "10"))
+
+
+def test_bot_accounts_fills_in_order(monkeypatch) -> None:
+    now = int(time.time() * 1000)
+
+    def page(orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "currentPage": 1,
+                "items": orders,
+                "totalNum": len(orders),
+                "totalPage": 1,
+            }
+        ]
+
+    # Buy 10 at 1, sell 10 at 2, then buy 10 at 3: each side newest first.
+    mock_trade = create_mock_trade(
+        {
+            "buy-done": page(
+                [
+                    make_order(
+                        "b2", "buy", "10", "30", price="3", createdAt=now - 1
+                    ),
+                    make_order(
+                        "b1", "buy", "10", "10", price="1", createdAt=now - 3
+                    ),
+                ]
+            ),
+            "sell-done": page(
+                [
+                    make_order(
+                        "s1", "sell", "10", "20", price="2", createdAt=now - 2
+                    )
+                ]
+            ),
+        }
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    cfg: Dict[str, Any] = {"base": "BASE", "quote": "QUOTE", "tick_len": 60}
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    bot.load_config()
+    bot.get_fills()
+    position = bot.accounting.position("BASE-QUOTE")
+    assert position.realized == pytest.approx(10.0)
+    assert position.inventory == pytest.approx(10.0)
+    assert position.avg_cost == pytest.approx(3.0)
+
+    # The rebuy and resell passes pair the same fills, without fetching
+    # them again.
+    calls = len(mock_trade.order_list_calls)
+    bot.ledger.migrated.update(("rebuy", "resell"))
+    assert len(bot.opposite_orders(False, "rebuy")) == 1
+    assert len(bot.opposite_orders(False, "resell")) == 2
+    assert len(mock_trade.order_list_calls) == calls
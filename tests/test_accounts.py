@@ -0,0 +1,139 @@
+"""
+Test Accounts
+"""
+
+from typing import Any, Dict
+
+import kcbot.accounts
+import kcbot.bot
+from kcbot.accounts import Accounts
+from kcbot.ratelimit import RateLimited
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def strategy(name: str) -> Dict[str, Any]:
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 1,
+        "vol_percent": 10.0,
+    }
+    return {"name": name, "strategy": "bid-and-ask", "buy": side, "sell": side}
+
+
+def test_accounts(monkeypatch) -> None:
+    mock_market = create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2)
+    monkeypatch.setattr(kcbot.accounts.kcc, "Market", mock_market)
+    monkeypatch.setattr(kcbot.bot.kcc, "Market", mock_market)
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Trade",
+        create_mock_trade(
+            {
+                f"{side}-{status}": empty
+                for side in ("buy", "sell")
+                for status in ("active", "done")
+            }
+        ),
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    config = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "strategies": [strategy("careful")],
+    }
+    accounts = Accounts(
+        {
+            "tick_len": 60,
+            "accounts": {
+                "main": {"keys": {}, "configs": [config]},
+                "sub1": {"keys": {}, "configs": [config]},
+            },
+        }
+    )
+    main, sub1 = accounts.bots["main"][0], accounts.bots["sub1"][0]
+    assert isinstance(main.trade.client, RateLimited)
+    assert main.trade.client.limiter is accounts.limiters["main"]
+    assert sub1.trade.client.limiter is accounts.limiters["sub1"]
+    assert main.market.client is sub1.market.client is accounts.market
+
+    results = accounts.run_once()
+    assert set(results) == {"main/BASE-QUOTE", "sub1/BASE-QUOTE"}
+    assert all(results["main/BASE-QUOTE"].values())
+    # One all tickers fetch for both accounts.
+    assert mock_market.all_tickers_calls == 1
+
+    # Each Bot runs at its config's tick_len (a day, by default), however
+    # often the accounts are checked.
+    assert accounts.run_once(due_only=True) == {}
+    assert mock_market.all_tickers_calls == 1
+    accounts.kill_switch.trigger("test")
+    # The first Bot runs at once, and kills the orders of both.
+    results = accounts.run_once(due_only=True)
+    assert results == {"main/BASE-QUOTE": {"config": True, "kill": True}}
+    assert accounts.kill_switch.paused
+
+
+def test_accounts_sharing_a_config(monkeypatch, tmp_path) -> None:
+    mock_market = create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2)
+    monkeypatch.setattr(kcbot.accounts.kcc, "Market", mock_market)
+    monkeypatch.setattr(kcbot.bot.kcc, "Market", mock_market)
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Trade",
+        create_mock_trade(
+            {
+                f"{side}-{status}": empty
+                for side in ("buy", "sell")
+                for status in ("active", "done")
+            }
+        ),
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    config = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "ledger_file": str(tmp_path / "ledger.json"),
+        "accounting_file": str(tmp_path / "accounting.json"),
+        "fill_stats_file": str(tmp_path / "fill_stats.json"),
+        "lease_file": str(tmp_path / "leases.db"),
+        "strategies": [strategy("careful")],
+    }
+    accounts = Accounts(
+        {
+            "accounts": {
+                "main": {"keys": {}, "configs": [config]},
+                "sub1": {"keys": {}, "configs": [config]},
+            },
+        }
+    )
+    main, sub1 = accounts.bots["main"][0], accounts.bots["sub1"][0]
+    try:
+        results = accounts.run_once()
+        # Each account holds its own lease on the market, so both trade.
+        assert all(results["main/BASE-QUOTE"].values())
+        assert all(results["sub1/BASE-QUOTE"].values())
+        assert "submit" in results["sub1/BASE-QUOTE"]
+        assert main.ledger.filename == str(tmp_path / "main_ledger.json")
+        assert sub1.ledger.filename == str(tmp_path / "sub1_ledger.json")
+        assert sub1.accounting.filename == str(
+            tmp_path / "sub1_accounting.json"
+        )
+        assert sub1.fill_stats.filename == str(
+            tmp_path / "sub1_fill_stats.json"
+        )
+    finally:
+        for bot in (main, sub1):
+            if bot.lease is not None:
+                bot.lease.stop()
@@ -0,0 +1,174 @@
+"""
+Test balances
+"""
+
+import time
+from typing import Any, Dict
+
+import kcbot.balances
+import kcbot.bot
+from kcbot.balances import Balances
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def test_balances_missing_currency() -> None:
+    balances = Balances()
+    balances.refresh([{"currency": "GBPT", "available": "12.5"}])
+    assert balances["GBPT"] == 12.5
+    assert balances["SOMETOKEN"] == 0.0
+    assert "SOMETOKEN" not in balances
+
+
+def test_balances_orders() -> None:
+    balances = Balances()
+    balances.refresh(
+        [
+            {"currency": "SOMETOKEN", "available": "100", "holds": "0"},
+            {"currency": "GBPT", "available": "200", "holds": "0"},
+        ]
+    )
+    balances.reserve("SOMETOKEN", "GBPT", "buy", 2.0, 50.0, "a", ttl=60.0)
+    balances.reserve("SOMETOKEN", "GBPT", "sell", 3.0, 40.0, "b")
+    assert balances["GBPT"] == 100.0
+    assert balances.holds["GBPT"] == 100.0
+    assert balances["SOMETOKEN"] == 60.0
+    assert balances.age() < 1.0
+
+    # The GTT order expires, and the GTC one stays.
+    assert balances.expire(time.time() + 30.0) == 0
+    assert balances.expire(time.time() + 61.0) == 1
+    assert balances["GBPT"] == 200.0
+    assert balances.holds["GBPT"] == 0.0
+    assert list(balances.reserved) == ["b"]
+    # Part may have been filled, so the next update is a full refresh.
+    assert balances.age() == float("inf")
+
+    # Cancelled, after part of it was filled.
+    balances.holds["SOMETOKEN"] = 15.0
+    assert balances.release(["b", "unknown"]) == 1
+    assert balances["SOMETOKEN"] == 75.0
+    assert balances.holds["SOMETOKEN"] == 0.0
+    assert balances.reserved == {}
+
+
+def test_balances_ledger() -> None:
+    balances = Balances()
+    balances.refresh([{"currency": "GBPT", "available": "100", "holds": "0"}])
+    balances.reserve("SOMETOKEN", "GBPT", "buy", 2.0, 10.0)
+    start = balances.synced_at
+    entries = [
+        {
+            "id": "a",
+            "currency": "GBPT",
+            "amount": "20",
+            "direction": "out",
+            "createdAt": start + 1,
+            "context": {"orderId": "1", "symbol": "SOMETOKEN-GBPT"},
+        },
+        {
+            "id": "b",
+            "currency": "SOMETOKEN",
+            "amount": "10",
+            "direction": "in",
+            "createdAt": start + 1,
+            "context": {"orderId": "1", "symbol": "SOMETOKEN-GBPT"},
+        },
+    ]
+    assert balances.apply_ledger(entries) == 2
+    # Entries already applied are skipped.
+    assert balances.apply_ledger(entries) == 0
+    assert balances["GBPT"] == 80.0
+    assert balances.holds["GBPT"] == 0.0
+    assert balances["SOMETOKEN"] == 10.0
+
+
+def test_bot_balances_delta_poll(monkeypatch) -> None:
+    base = "SOMETOKEN"
+    quote = "GBPT"
+    ledger = [
+        {
+            "id": "deposit",
+            "currency": base,
+            "amount": "5",
+            "direction": "in",
+            "createdAt": 0,
+            "context": {},
+        }
+    ]
+    user_class = create_mock_user(base, quote, 100.0, 200.0, ledger)
+    monkeypatch.setattr(kcbot.bot.kcc, "User", user_class)
+    cfg: Dict[str, Any] = {
+        "base": base,
+        "loglevel": "INFO",
+        "quote": quote,
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    bot.load_config()
+    bot.get_balances()
+    ledger[0]["createdAt"] = bot.balances.synced_at + 1
+    bot.get_balances()
+    bot.get_balances()
+    assert user_class.account_list_calls == 1
+    assert bot.balances[base] == 105.0
+    assert bot.balances[quote] == 200.0
+
+
+def test_bot_balances_expired_orders(monkeypatch) -> None:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Trade",
+        create_mock_trade(
+            {
+                f"{side}-{status}": empty
+                for side in ("buy", "sell")
+                for status in ("active", "done")
+            }
+        ),
+    )
+    user_class = create_mock_user("BASE", "QUOTE", 1000.0, 1000.0)
+    monkeypatch.setattr(kcbot.bot.kcc, "User", user_class)
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side,
+                "sell": side,
+            }
+        ],
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    assert all(bot.run_once().values())
+    assert len(bot.balances.reserved) == 4
+    assert bot.balances["QUOTE"] < 1000.0
+    assert user_class.account_list_calls == 1
+
+    # Still open: the next update is a delta poll.
+    bot.get_balances()
+    assert user_class.account_list_calls == 1
+    assert bot.balances["QUOTE"] < 1000.0
+
+    # Expired (after a tick), so the funds are released, and refreshed.
+    later = time.time() + 61.0
+    bot.clock = lambda: later
+    bot.get_balances()
+    assert user_class.account_list_calls == 2
+    assert bot.balances.reserved == {}
+    assert bot.balances["QUOTE"] == 1000.0
@@ -2,11 +2,21 @@
 Test bot
 """
 
+import os
+import time
 from typing import Any, Dict
 
 import kcbot.bot
 
-from .conftest import create_mock_market, create_mock_trade, create_mock_user
+from .conftest import (
+    create_mock_market,
+    create_mock_symbol,
+    create_mock_trade,
+    create_mock_user,
+)
+
+# Orders are only looked at within a window before now.
+NOW = int(time.time() * 1000)
 
 
 def test_bot_config(monkeypatch) -> None:
@@ -415,8 +425,11 @@ def test_bot_resell(monkeypatch) -> None:
                 "currentPage": 1,
                 "items": [
                     {
-                        "createdAt": 1706256825125,
+                        "id": "order1",
+                        "createdAt": NOW,
+                        "dealFunds": "10",
                         "dealSize": "10",
+                        "symbol": "?-?",
                         "price": "1.0000",
                         "side": "buy",
                         "size": "123.456",
@@ -471,8 +484,11 @@ def test_bot_resell_already_active(monkeypatch) -> None:
                 "currentPage": 1,
                 "items": [
                     {
-                        "createdAt": 1700000000000,
+                        "id": "order2",
+                        "createdAt": NOW,
+                        "dealFunds": "10",
                         "dealSize": "10",
+                        "symbol": "?-?",
                         "price": "1.0000",
                         "side": "buy",
                     },
@@ -487,7 +503,8 @@ def test_bot_resell_already_active(monkeypatch) -> None:
                 "currentPage": 1,
                 "items": [
                     {
-                        "createdAt": 1700000000000,
+                        "id": "order3",
+                        "createdAt": NOW,
                         "size": "10",
                         "price": "1.0500",
                         "side": "sell",
@@ -530,8 +547,11 @@ def test_bot_resell_already_done(monkeypatch) -> None:
                 "currentPage": 1,
                 "items": [
                     {
-                        "createdAt": 1700000000000,
+                        "id": "order4",
+                        "createdAt": NOW,
+                        "dealFunds": "10",
                         "dealSize": "10",
+                        "symbol": "?-?",
                         "price": "1.0000",
                         "side": "buy",
                     },
@@ -555,8 +575,11 @@ def test_bot_resell_already_done(monkeypatch) -> None:
                 "currentPage": 1,
                 "items": [
                     {
-                        "createdAt": 1700000000000,
+                        "id": "order5",
+                        "createdAt": NOW,
+                        "dealFunds": "10.5",
                         "dealSize": "10",
+                        "symbol": "?-?",
                         "price": "1.0500",
                         "side": "sell",
                     },
@@ -580,3 +603,184 @@ def test_bot_resell_already_done(monkeypatch) -> None:
     bot.load_config()
     orders = bot.opposite_orders(False, "resell")
     assert len(orders) == 0
+
+
+def test_bot_resell_increments(monkeypatch) -> None:
+    mock_orders = {
+        "buy-done": [
+            {
+                "currentPage": 1,
+                "items": [
+                    {
+                        "id": "order6",
+                        "createdAt": NOW,
+                        "dealFunds": "0.0999",
+                        "dealSize": "0.3",
+                        "symbol": "?-?",
+                        "price": "0.333",
+                        "side": "buy",
+                    },
+                    {
+                        "id": "order7",
+                        "createdAt": NOW - 1,
+                        "dealFunds": "0.0333",
+                        "dealSize": "0.1",
+                        "symbol": "?-?",
+                        "price": "0.333",
+                        "side": "buy",
+                    },
+                ],
+                "pageSize": 500,
+                "totalNum": 2,
+                "totalPage": 1,
+            }
+        ],
+        "sell-active": [
+            {
+                "currentPage": 1,
+                "items": [
+                    {
+                        # 0.1 + 0.2 != 0.3 in floats, but is exact in lots.
+                        "id": "order8",
+                        "createdAt": NOW,
+                        "size": str(0.1 + 0.2),
+                        "price": "0.35",
+                        "side": "sell",
+                    },
+                ],
+                "pageSize": 500,
+                "totalNum": 1,
+                "totalPage": 1,
+            }
+        ],
+        "sell-done": [
+            {
+                "currentPage": 1,
+                "items": [],
+                "pageSize": 500,
+                "totalNum": 0,
+                "totalPage": 1,
+            }
+        ],
+    }
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Trade",
+        create_mock_trade(mock_orders),
+    )
+    cfg: Dict[str, Any] = {
+        "loglevel": "DEBUG",
+        "price_increment": "0.001",
+        "size_increment": "0.1",
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    bot.load_config()
+    orders = bot.opposite_orders(False, "resell")
+    assert len(orders) == 1
+    order = orders[0]
+    assert order["price"] == "0.35"
+    assert order["size"] == "0.1"
+
+
+def test_bot_symbol_info_drops_small_orders(monkeypatch) -> None:
+    base = "SOMETOKEN"
+    quote = "GBPT"
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market(
+            base,
+            quote,
+            100.0,
+            104.0,
+            106.0,
+            110.0,
+            symbols=[
+                create_mock_symbol(
+                    base,
+                    quote,
+                    baseMinSize="0.5",
+                    baseIncrement="0.01",
+                    priceIncrement="0.1",
+                ),
+            ],
+        ),
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user(base, quote, 100.0, 200.0),
+    )
+    cfg: Dict[str, Any] = {
+        "base": base,
+        "loglevel": "INFO",
+        "quote": quote,
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": {
+                    "pcnt_bump_a": 1.0,
+                    "pcnt_bump_c": 1.0,
+                    "order_count": 2,
+                    "vol_percent": 50.0,
+                },
+            },
+        ],
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    bot.load_config()
+    bot.get_symbol_info()
+    bot.get_balances()
+    bot.get_ticker()
+
+    # About 0.4 and 0.56 SOMETOKEN: the first is below the minimum size.
+    buys = bot.buy_orders(cfg["strategies"][0])
+    assert len(buys) == 1
+    assert buys[0]["price"] == "98.8"
+    assert buys[0]["size"] == "0.56"
+
+
+def test_bot_iter_orders(monkeypatch, tmp_path) -> None:
+    def page(num: int, times) -> Dict[str, Any]:
+        return {
+            "currentPage": num,
+            "items": [{"createdAt": t, "id": str(t)} for t in times],
+            "pageSize": 500,
+            "totalNum": 6,
+            "totalPage": 3,
+        }
+
+    mock_orders = {
+        "buy-done": [
+            page(1, [NOW, NOW - 1]),
+            page(2, [NOW - 2, NOW - 3]),
+            page(3, [NOW - 4, NOW - 5]),
+        ],
+    }
+    mock_trade = create_mock_trade(mock_orders)
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    bot = kcbot.bot.Bot(config={}, keys={}, account="main")
+    bot.order_cache_dir = str(tmp_path)
+    orders = bot.iter_orders(
+        bot.trade.get_order_list, False, NOW - 3, status="done", side="buy"
+    )
+
+    # Pages are fetched only as they are needed.
+    assert next(orders)["createdAt"] == NOW
+    assert len(mock_trade.order_list_calls) == 1
+    assert [order["createdAt"] for order in orders] == [
+        NOW - 1,
+        NOW - 2,
+        NOW - 3,
+    ]
+    # Stopped at the first order outside the window.
+    assert len(mock_trade.order_list_calls) == 3
+
+    cached = bot.iter_orders(
+        bot.trade.get_order_list, True, NOW - 1, status="done", side="buy"
+    )
+    assert [order["createdAt"] for order in cached] == [NOW, NOW - 1]
+    assert os.listdir(tmp_path) == ["main_?-?_buy_done.json"]
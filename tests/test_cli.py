@@ -0,0 +1,174 @@
+"""
+Test the command line
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+import kcbot.bot
+from kcbot.cli import main, parse_args
+from kcbot.klines import KlineStore
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def test_parse_args() -> None:
+    # Options without a subcommand run the bot, as before subcommands.
+    args = parse_args(["--configfile", "c.json", "--keysfile", "k.json"])
+    assert (args.command, args.configfile) == ("run", ["c.json"])
+    args = parse_args(["bench", "ladder", "netting"])
+    assert (args.command, args.names) == ("bench", ["ladder", "netting"])
+
+
+def test_lazy_imports() -> None:
+    code = (
+        "import sys, kcbot, kcbot.cli; "
+        "print(sorted({'kucoin', 'numpy'} & set(sys.modules)))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    assert out.strip() == "[]"
+    assert kcbot.Bot is kcbot.bot.Bot
+
+
+def test_bench(capsys) -> None:
+    main(["bench", "ladder", "--number", "10"])
+    assert capsys.readouterr().out.startswith("ladder ")
+
+
+def test_plan(monkeypatch, tmp_path, capsys) -> None:
+    mock_trade = create_mock_trade({})
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    configfile = tmp_path / "config.json"
+    configfile.write_text(
+        json.dumps(
+            {
+                "base": "BASE",
+                "quote": "QUOTE",
+                "lease_file": str(tmp_path / "leases.db"),
+                "strategies": [
+                    {
+                        "name": "careful",
+                        "strategy": "bid-and-ask",
+                        "buy": side,
+                        "sell": side,
+                    }
+                ],
+            }
+        )
+    )
+    keysfile = tmp_path / "keys.json"
+    keysfile.write_text("{}")
+
+    main(
+        [
+            "plan",
+            "--configfile",
+            str(configfile),
+            "--keysfile",
+            str(keysfile),
+            "--json",
+        ]
+    )
+    orders = json.loads(capsys.readouterr().out)
+    assert [(order["side"], order["rung"]) for order in orders] == [
+        ("buy", 0),
+        ("buy", 1),
+        ("sell", 0),
+        ("sell", 1),
+    ]
+    assert {order["remark"] for order in orders} == {"careful"}
+    # Nothing was placed, and no lease taken.
+    assert mock_trade.bulk_calls == []
+    assert not (tmp_path / "leases.db").exists()
+
+
+def test_simulate(tmp_path, capsys) -> None:
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    kline_dir = tmp_path / "klines"
+    configfile = tmp_path / "config.json"
+    configfile.write_text(
+        json.dumps(
+            {
+                "base": "BASE",
+                "quote": "QUOTE",
+                "tick_len": 3600,
+                "kline_dir": str(kline_dir),
+                "kline_intervals": ["1hour"],
+                "strategies": [
+                    {
+                        "name": "careful",
+                        "strategy": "bid-and-ask",
+                        "buy": side,
+                        "sell": side,
+                    }
+                ],
+            }
+        )
+    )
+    argv = [
+        "simulate",
+        "--configfile",
+        str(configfile),
+        "--base-balance",
+        "1000",
+        "--quote-balance",
+        "1000",
+        "--paths",
+        "20",
+        "--workers",
+        "1",
+        "--seed",
+        "1",
+    ]
+    with pytest.raises(SystemExit, match="No 1hour candles stored"):
+        main(argv)
+
+    store = KlineStore(str(kline_dir), "BASE-QUOTE", "1hour")
+    store.append(
+        [
+            [3600 * idx, 1, 1.0 + 0.01 * (idx % 2), 1, 1, 1, 1]
+            for idx in range(48)
+        ]
+    )
+    main(argv + ["--json"])
+    report = json.loads(capsys.readouterr().out)
+    assert set(report) == {
+        "peak_base",
+        "low_quote",
+        "peak_value",
+        "final_value",
+    }
+    assert report["peak_base"]["5.0"] >= 1000.0
+    main(argv)
+    out = capsys.readouterr().out
+    assert out.startswith("BASE-QUOTE: price 1.01, volatility ")
+    assert "from 48 1hour candles" in out
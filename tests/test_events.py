@@ -0,0 +1,259 @@
+"""
+Test EventBus and TickerIntake
+"""
+
+import threading
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+import kcbot.bot
+from kcbot.events import (
+    BalanceChange,
+    Event,
+    EventBus,
+    Fill,
+    OrderResult,
+    QueueFull,
+    TickerIntake,
+    TickerUpdate,
+)
+from kcbot.killswitch import KillSwitch
+from kcbot.ticker import Ticker
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def test_drop_oldest() -> None:
+    bus = EventBus()
+    tickers = bus.subscribe(TickerUpdate, "tickers", maxsize=2)
+    mine = bus.subscribe(TickerUpdate, "mine", maxsize=2, market="A-B")
+    assert tickers.policy == "drop_oldest"
+    for price in range(5):
+        bus.publish(TickerUpdate("C-D", Ticker(price=float(price))))
+    bus.publish(TickerUpdate("A-B", Ticker(price=9.0)))
+    assert [
+        event.ticker.price
+        for event in tickers.drain()
+        if isinstance(event, TickerUpdate)
+    ] == [4.0, 9.0]
+    assert tickers.metrics()["dropped"] == 4
+    assert tickers.metrics()["delivered"] == 2
+    assert len(mine) == 1 and mine.dropped == 0
+    assert bus.published == {"TickerUpdate": 6}
+
+
+def test_backpressure() -> None:
+    bus = EventBus()
+    fills = bus.subscribe(Fill, "fills", maxsize=1, timeout=0.05)
+    tickers = bus.subscribe(TickerUpdate, "tickers", maxsize=1)
+    assert fills.policy == "block"
+    bus.publish(Fill("A-B", {"id": "1"}))
+    with pytest.raises(QueueFull):
+        bus.publish(Fill("A-B", {"id": "2"}))
+    # A full order stage never holds up market data.
+    start = time.monotonic()
+    for _ in range(100):
+        bus.publish(TickerUpdate("A-B", Ticker()))
+    assert time.monotonic() - start < 0.05
+    assert len(tickers) == 1
+
+    # Without a timeout, the publisher waits for the slow subscriber, and
+    # nothing is lost.
+    fills.timeout = None
+    received: List[str] = []
+
+    def consume() -> None:
+        for _ in range(4):
+            time.sleep(0.02)
+            event = fills.get(1.0)
+            if isinstance(event, Fill):
+                received.append(event.order["id"])
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    start = time.monotonic()
+    for oid in ("3", "4", "5"):
+        bus.publish(Fill("A-B", {"id": oid}))
+    assert time.monotonic() - start >= 0.04
+    thread.join()
+    assert received == ["1", "3", "4", "5"]
+    # Only the event which timed out was lost.
+    assert fills.dropped == 1
+
+
+def test_lossy_per_event() -> None:
+    bus = EventBus()
+    everything = bus.subscribe(Event, "everything", maxsize=2, timeout=0.05)
+    assert everything.policy == "block"
+    bus.publish(Fill("A-B", {"id": "1"}))
+    bus.publish(TickerUpdate("A-B", Ticker(price=1.0)))
+    # Market data never waits, and replaces the oldest market data.
+    start = time.monotonic()
+    bus.publish(TickerUpdate("A-B", Ticker(price=2.0)))
+    assert time.monotonic() - start < 0.05
+    assert everything.dropped == 1
+    with pytest.raises(QueueFull):
+        bus.publish(Fill("A-B", {"id": "2"}))
+    assert everything.dropped == 2
+    events = everything.drain()
+    assert isinstance(events[0], Fill) and events[0].order["id"] == "1"
+    assert isinstance(events[1], TickerUpdate) and events[1].ticker.price == 2
+
+    # Full of fills, which are kept: the market data is dropped.
+    bus.publish(Fill("A-B", {"id": "3"}))
+    bus.publish(Fill("A-B", {"id": "4"}))
+    start = time.monotonic()
+    bus.publish(BalanceChange("A-B", "A", 1.0))
+    assert time.monotonic() - start < 0.05
+    assert everything.dropped == 3
+    assert [
+        event.order["id"]
+        for event in everything.drain()
+        if isinstance(event, Fill)
+    ] == ["3", "4"]
+
+
+def test_lag() -> None:
+    bus = EventBus()
+    results = bus.subscribe(OrderResult, "results")
+    bus.publish(OrderResult("A-B", {}, False, "Balance insufficient!"))
+    assert bus.metrics()["results"]["lag"] < 0.05
+    time.sleep(0.05)
+    metrics = bus.metrics()["results"]
+    assert metrics["depth"] == 1 and metrics["lag"] >= 0.05
+    event = results.get(0.0)
+    assert isinstance(event, OrderResult) and not event.ok
+    assert results.last_lag >= 0.05
+    assert results.lag() == 0.0
+    assert results.get(0.01) is None
+
+
+class ShockMarket:
+    """
+    A Market client whose price falls 20% on the second ticker.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def get_ticker(self, market: str) -> Dict[str, Any]:
+        self.calls += 1
+        price = "1.0" if self.calls == 1 else "0.8"
+        return {"bestBid": price, "bestAsk": price, "price": price}
+
+    def get_24h_stats(self, market: str) -> Dict[str, Any]:
+        return {"high": "1.0", "low": "0.8", "vol": "1", "volValue": "1"}
+
+
+def test_ticker_intake() -> None:
+    bus = EventBus()
+    kill_switch = KillSwitch(shock_pct=10.0)
+    intake = TickerIntake(ShockMarket(), "A-B", bus, 0.01, kill_switch)
+    assert intake.latest() is None
+    intake.start()
+    try:
+        kill_switch.sleep(1.0)
+        assert kill_switch.triggered
+        assert kill_switch.reason.startswith("price shock: A-B moved 20.00%")
+        ticker = intake.latest()
+        assert ticker is not None and ticker.bid == 0.8
+    finally:
+        intake.stop()
+    assert bus.metrics() == {}
+
+
+def test_bot_events(monkeypatch) -> None:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    mock_trade = create_mock_trade(
+        {
+            f"{side}-{status}": empty
+            for side in ("buy", "sell")
+            for status in ("active", "done")
+        }
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side,
+                "sell": side,
+            }
+        ],
+        "tick_len": 60,
+    }
+    bus = EventBus()
+    tickers = bus.subscribe(TickerUpdate, "tickers")
+    balances = bus.subscribe(BalanceChange, "balances")
+    results = bus.subscribe(OrderResult, "results")
+    bot = kcbot.bot.Bot(config=cfg, keys={}, events=bus)
+    assert all(bot.run_once().values())
+    assert len(tickers.drain()) == 1
+    assert {
+        event.currency
+        for event in balances.drain()
+        if isinstance(event, BalanceChange)
+    } == {"BASE", "QUOTE"}
+    placed = [order for orders in mock_trade.bulk_calls for order in orders]
+    assert [
+        event.order["clientOid"]
+        for event in results.drain()
+        if isinstance(event, OrderResult) and event.ok
+    ] == [order["clientOid"] for order in placed]
+
+    # A subscriber which stays full loses results, without failing orders.
+    slow = bus.subscribe(OrderResult, "slow", maxsize=1, timeout=0.01)
+    assert all(bot.run_once().values())
+    assert len(mock_trade.bulk_calls) == 2
+    assert len(slow) == 1 and slow.dropped == len(placed) - 1
+    assert len(results.drain()) == len(placed)
+    bus.unsubscribe(slow)
+
+    # A stalled subscriber with no timeout of its own only holds each
+    # event up for the Bot's event_timeout.
+    stalled = bus.subscribe(OrderResult, "stalled", maxsize=1)
+    assert stalled.timeout is None
+    bot.event_timeout = 0.01
+    start = time.monotonic()
+    assert all(bot.run_once().values())
+    assert time.monotonic() - start < 1.0
+    assert len(mock_trade.bulk_calls) == 3
+    assert len(stalled) == 1 and stalled.dropped == len(placed) - 1
+    bus.unsubscribe(stalled)
+    results.drain()
+
+    # With an intake thread, the iteration takes its ticker.
+    cfg["ticker_interval"] = 0.01
+    try:
+        bot.load_config()
+        assert bot.intake is not None
+        time.sleep(0.05)
+        bot.get_ticker()
+        assert bot.ticker.bid == 1.0
+        assert tickers.drain()
+        assert bot.events.metrics()["tickers BASE-QUOTE"]["depth"] <= 1
+    finally:
+        cfg["ticker_interval"] = 0
+        bot.load_config()
+    assert bot.intake is None
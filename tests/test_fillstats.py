@@ -0,0 +1,150 @@
+"""
+Test FillStats
+"""
+
+import math
+from typing import Any, Dict
+
+import pytest
+
+import kcbot.bot
+from kcbot.fillstats import FillStats
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def test_fill_stats(tmp_path) -> None:
+    filename = str(tmp_path / "fill_stats.json")
+    stats = FillStats(filename)
+    for idx in range(4):
+        stats.placed(
+            "BASE-QUOTE",
+            {
+                "clientOid": f"c{idx}",
+                "side": "buy",
+                "size": "10",
+                "remark": "careful",
+            },
+            idx % 2,
+            1000 * idx,
+        )
+    # Not placed here (e.g. a close order).
+    assert not stats.fill({"clientOid": "other", "dealSize": "1"}, 5000)
+    assert stats.fill({"clientOid": "c0", "dealSize": "10"}, 11000)
+    assert stats.fill({"clientOid": "c2", "dealSize": "5"}, 102000)
+    assert not stats.fill({"clientOid": "c2", "dealSize": "5"}, 103000)
+    assert stats.expire(2000) == 1
+    stats.save()
+
+    stats = FillStats(filename)
+    assert list(stats.pending) == ["c3"]
+    rung0, rung1 = stats.summary("BASE-QUOTE")
+    assert (rung0["rung"], rung0["placed"], rung0["filled"]) == (0, 2, 2)
+    assert rung0["fill_ratio"] == pytest.approx(0.75)
+    assert rung0["mean_ttf"] == pytest.approx(55.5)
+    assert (rung0["p50_ttf"], rung0["p90_ttf"]) == (15.0, 120.0)
+    assert (rung1["rung"], rung1["fill_rate"], rung1["p50_ttf"]) == (
+        1,
+        0.0,
+        None,
+    )
+    assert stats.summary("OTHER-QUOTE") == []
+
+    # c3 is still pending, so rung 1 has only been placed once for sure.
+    assert stats.never_filled(min_placed=1) == ["BASE-QUOTE/careful/buy/1"]
+    assert stats.never_filled(min_placed=2) == []
+    stats.rungs["BASE-QUOTE/careful/buy/0"].add_fill(1.0, 1e6)
+    assert math.isinf(
+        stats.rungs["BASE-QUOTE/careful/buy/0"].ttf_percentile(99) or 0.0
+    )
+
+
+def test_bot_fill_stats(monkeypatch) -> None:
+    page: Dict[str, Any] = {
+        "currentPage": 1,
+        "items": [],
+        "totalNum": 0,
+        "totalPage": 1,
+    }
+    fills = dict(page, items=[])
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    mock_trade = create_mock_trade(
+        {
+            "buy-active": empty,
+            "buy-done": [page],
+            "buy-fills": [fills],
+            "sell-active": empty,
+            "sell-done": empty,
+        }
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side,
+                "sell": side,
+            }
+        ],
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    assert all(bot.run_once().values())
+    assert len(bot.fill_stats.pending) == 4
+    assert bot.rungs == {}
+
+    # The lowest buy fills, in two parts, the last 5s after it was placed.
+    placed = mock_trade.bulk_calls[-1]
+    buy = [order for order in placed if order["side"] == "buy"][-1]
+    placed_at = bot.fill_stats.pending[buy["clientOid"]][1]
+    fills["items"] = [
+        {"orderId": "order1", "createdAt": placed_at + 5000},
+        {"orderId": "order1", "createdAt": placed_at + 2000},
+    ]
+    page["items"] = [
+        {
+            "id": "order1",
+            "clientOid": buy["clientOid"],
+            "createdAt": placed_at,
+            "dealFunds": str(float(buy["size"]) * float(buy["price"])),
+            "dealSize": buy["size"],
+            "symbol": "BASE-QUOTE",
+            "price": buy["price"],
+            "remark": "careful",
+            "side": "buy",
+            "size": buy["size"],
+        }
+    ]
+    page["totalNum"] = 1
+    assert all(bot.run_once().values())
+    keys = [
+        (row["side"], row["rung"], row["placed"], row["filled"])
+        for row in bot.fill_stats.summary()
+    ]
+    assert keys == [
+        ("buy", 0, 2, 0),
+        ("buy", 1, 2, 1),
+        ("sell", 0, 2, 0),
+        ("sell", 1, 2, 0),
+    ]
+    assert bot.fill_stats.summary()[1]["mean_ttf"] == pytest.approx(5.0)
+    assert len(mock_trade.fill_list_calls) == 1
@@ -0,0 +1,59 @@
+"""
+Test history
+"""
+
+import math
+import statistics
+
+import pytest
+
+from kcbot.history import TickerHistory
+from kcbot.ticker import Ticker
+
+
+def make_ticker(i: int) -> Ticker:
+    mid = 100.0 + 10.0 * math.sin(i / 3.0)
+    return Ticker(
+        ask=mid + 0.5,
+        bid=mid - 0.5,
+        price=mid,
+        size=1.0 + i % 4,
+        time=i,
+    )
+
+
+def test_ticker_slots() -> None:
+    tick = Ticker(ask=2.0, bid=1.0)
+    assert tick.mid == 1.5
+    with pytest.raises(AttributeError):
+        setattr(tick, "other", 1.0)
+
+
+def test_history_rolling_stats() -> None:
+    size = 16
+    history = TickerHistory(size, span=5)
+    tickers = [make_ticker(i) for i in range(50)]
+    for count, ticker in enumerate(tickers, start=1):
+        history.append(ticker)
+        start = max(0, count - size)
+        window = tickers[start:count]
+        mids = [tick.mid for tick in window]
+        assert len(history) == len(window)
+        assert history.last() == mids[-1]
+        assert history.mean == pytest.approx(statistics.fmean(mids))
+        assert history.vwap == pytest.approx(
+            sum(tick.price * tick.size for tick in window)
+            / sum(tick.size for tick in window)
+        )
+        if len(mids) >= 3:
+            returns = [
+                math.log(mids[i] / mids[i - 1]) for i in range(1, len(mids))
+            ]
+            assert history.volatility == pytest.approx(
+                statistics.stdev(returns)
+            )
+
+    ema = tickers[0].mid
+    for ticker in tickers[1:]:
+        ema += 2.0 / 6.0 * (ticker.mid - ema)
+    assert history.ema == pytest.approx(ema)
@@ -0,0 +1,30 @@
+"""
+Test increment
+"""
+
+import pytest
+
+from kcbot.increment import Increment
+
+
+def test_increment_units() -> None:
+    inc = Increment("0.0001")
+    assert inc.units("1.05") == 10500
+    assert inc.units(1.05) == 10500
+    assert inc.units(0.00005) == 1
+    assert inc.units_down("0.00019") == 1
+    assert inc.units("123.456") == 1234560
+
+
+def test_increment_to_str() -> None:
+    assert Increment("0.0001").to_str(10500) == "1.05"
+    assert Increment("0.0001").to_str(1) == "0.0001"
+    assert Increment("0.5").to_str(3) == "1.5"
+    assert Increment("1").to_str(100) == "100"
+    assert Increment("10").to_str(3) == "30"
+    assert Increment("1E-8").to_str(12345) == "0.00012345"
+
+
+def test_increment_invalid() -> None:
+    with pytest.raises(ValueError):
+        Increment("0")
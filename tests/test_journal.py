@@ -0,0 +1,256 @@
+"""
+Test the journal
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict
+
+import pytest
+
+import kcbot.bot
+from kcbot.journal import Recorder, Replay, ReplayExhausted, replay_session
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def test_record_and_replay(monkeypatch, tmp_path) -> None:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    mock_trade = create_mock_trade(
+        {
+            f"{side}-{status}": empty
+            for side in ("buy", "sell")
+            for status in ("active", "done")
+        }
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side,
+                "sell": side,
+            }
+        ],
+    }
+    filename = str(tmp_path / "journal.jsonl.gz")
+    recorder = Recorder(filename)
+    bot = kcbot.bot.Bot(config=cfg, keys={}, outer_wrappers=[recorder.wrap])
+    assert all(bot.run_once().values())
+    assert all(bot.run_once().values())
+    recorder.close()
+    assert len(mock_trade.bulk_calls) == 2
+
+    replay = Replay(filename)
+    assert replay.total == recorder.count
+    with pytest.raises(ReplayExhausted):
+        replay.answer("market", "get_fiat_price", (), {})
+
+    # The replay makes the same requests, without the exchange.
+    replayed = replay_session(cfg, filename)
+    assert len(mock_trade.bulk_calls) == 2
+    assert replayed.ticker.ask == 1.1
+    assert replayed.balances["QUOTE"] == bot.balances["QUOTE"]
+    assert len(replayed.history) == 2
+
+
+def test_replay_errors(tmp_path) -> None:
+    filename = str(tmp_path / "journal.jsonl")
+    entries = [
+        {"t": 1.0, "c": "market", "m": "get_ticker", "a": ["A-B"], "k": {}},
+        {"t": 2.0, "c": "market", "m": "get_ticker", "a": ["A-B"], "k": {}},
+    ]
+    entries[0]["e"] = "503-Service unavailable"
+    entries[1]["r"] = {"bestAsk": "1.1"}
+    with open(filename, "w", encoding="utf-8") as handle:
+        for entry in entries:
+            handle.write(json.dumps(entry) + "\n")
+
+    replay = Replay(filename)
+    client = replay.wrap("market", None)
+    assert replay.clock() == 1.0
+    with pytest.raises(Exception, match="503"):
+        client.get_ticker("A-B")
+    assert client.get_ticker("A-B") == {"bestAsk": "1.1"}
+    assert replay.clock() == 2.0
+    assert len(replay) == 0
+
+
+class SlowFirstTicker:
+    """
+    A Market client wrapper whose first get_ticker is slow.
+    """
+
+    def __init__(self, client: Any, delay: float):
+        self.client = client
+        self.delay = delay
+        self.calls = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def get_ticker(self, market: str) -> Dict[str, Any]:
+        self.calls += 1
+        if self.calls == 1:
+            time.sleep(self.delay)
+        return self.client.get_ticker(market)
+
+
+def test_record_and_replay_hedged(monkeypatch, tmp_path, caplog) -> None:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    mock_trade = create_mock_trade(
+        {
+            f"{side}-{status}": empty
+            for side in ("buy", "sell")
+            for status in ("active", "done")
+        }
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side,
+                "sell": side,
+            }
+        ],
+    }
+    filename = str(tmp_path / "journal.jsonl")
+    recorder = Recorder(filename)
+
+    def slow(name: str, client: Any) -> Any:
+        return SlowFirstTicker(client, 0.2) if name == "market" else client
+
+    bot = kcbot.bot.Bot(
+        config=cfg,
+        keys={},
+        wrappers=[slow],
+        outer_wrappers=[recorder.wrap],
+    )
+    for _ in range(20):
+        bot.latency.tracker.record("get_ticker", 0.01)
+    assert all(bot.run_once().values())
+    assert all(bot.run_once().values())
+    # Let the abandoned request end: it is not journaled.
+    time.sleep(0.3)
+    recorder.close()
+    assert bot.latency.hedges >= 1
+    with open(filename, encoding="utf-8") as handle:
+        methods = [json.loads(line)["m"] for line in handle]
+    assert methods.count("get_ticker") == 2
+
+    # Every answer the Bot got is replayed, in order.
+    with caplog.at_level(logging.INFO, logger="KCBot"):
+        replayed = replay_session(cfg, filename)
+    assert f"Replayed {len(methods)} of {len(methods)} requests in 2" in (
+        caplog.text
+    )
+    assert replayed.balances["QUOTE"] == bot.balances["QUOTE"]
+    assert replayed.ticker.ask == 1.1
+    assert len(replayed.history) == 2
+
+
+def test_replay_cache_expiry(monkeypatch, tmp_path, caplog) -> None:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Trade",
+        create_mock_trade(
+            {
+                f"{side}-{status}": empty
+                for side in ("buy", "sell")
+                for status in ("active", "done")
+            }
+        ),
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "symbol_ttl": 1500.0,
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side,
+                "sell": side,
+            }
+        ],
+    }
+    # Three ticks 1000s apart: the symbols expire in the third.
+    now = [1_700_000_000.0]
+    filename = str(tmp_path / "journal.jsonl")
+    recorder = Recorder(filename, clock=lambda: now[0])
+    bot = kcbot.bot.Bot(config=cfg, keys={}, outer_wrappers=[recorder.wrap])
+    bot.clock = lambda: now[0]
+    for _ in range(3):
+        assert all(bot.run_once().values())
+        now[0] += 1000.0
+    recorder.close()
+    with open(filename, encoding="utf-8") as handle:
+        methods = [json.loads(line)["m"] for line in handle]
+    assert methods.count("get_symbol_list") == 2
+
+    # The replayed Bot's caches expire at the same points, by the
+    # journal's clock, so it makes the same requests.
+    with caplog.at_level(logging.INFO, logger="KCBot"):
+        replayed = replay_session(cfg, filename)
+    assert f"Replayed {len(methods)} of {len(methods)} requests in 3" in (
+        caplog.text
+    )
+    assert replayed.symbols.fetched_at == bot.symbols.fetched_at
+    assert replayed.balances.refreshed_at == bot.balances.refreshed_at
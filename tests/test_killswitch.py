@@ -0,0 +1,307 @@
+"""
+Test KillSwitch
+"""
+
+import os
+import signal
+import threading
+import time
+from typing import Any, Dict, List
+
+import kcbot.bot
+from kcbot.killswitch import KillSwitch
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+class SlowTrade:
+    """
+    A Trade client whose cancel all requests take 0.2s each.
+    """
+
+    def __init__(self, active: List[Dict[str, Any]]):
+        self.active = active
+        self.cancelled: List[str] = []
+        self.lock = threading.Lock()
+
+    def cancel_all_orders(self, symbol: str, tradeType: str) -> Dict[str, Any]:
+        time.sleep(0.2)
+        return {"cancelledOrderIds": [f"{symbol}-{idx}" for idx in range(100)]}
+
+    def get_order_list(self, **kwargs) -> Dict[str, Any]:
+        size = kwargs["pageSize"]
+        start = (kwargs["currentPage"] - 1) * size
+        end = start + size
+        return {
+            "currentPage": kwargs["currentPage"],
+            "items": self.active[start:end],
+            "totalNum": len(self.active),
+            "totalPage": max(1, -(-len(self.active) // size)),
+        }
+
+    def cancel_order(self, orderId: str) -> Dict[str, Any]:
+        with self.lock:
+            self.cancelled.append(orderId)
+        return {"cancelledOrderIds": [orderId]}
+
+
+def test_kill_switch(tmp_path) -> None:
+    filename = str(tmp_path / "kill")
+    kill_switch = KillSwitch(filename, shock_pct=5.0)
+    trade = SlowTrade(
+        [
+            # Placed while cancelling.
+            {"id": "late", "symbol": "M0-QUOTE"},
+            {"id": "other", "symbol": "UNGUARDED-QUOTE"},
+        ]
+    )
+    for idx in range(8):
+        kill_switch.register(f"M{idx}-QUOTE", trade)
+
+    assert not kill_switch.shock("M0-QUOTE", 1.0, 1.04)
+    assert not kill_switch.triggered
+    assert kill_switch.shock("M0-QUOTE", 1.0, 0.9)
+    assert kill_switch.triggered
+    assert kill_switch.reason.startswith("price shock: M0-QUOTE moved 10.00%")
+
+    start = time.monotonic()
+    cancelled = kill_switch.kill()
+    # The markets are cancelled concurrently.
+    assert time.monotonic() - start < 0.5
+    assert sum(len(oids) for oids in cancelled.values()) == 800
+    assert trade.cancelled == ["late"]
+    assert kill_switch.paused and not kill_switch.triggered
+    with open(filename, encoding="utf-8") as handle:
+        assert handle.read().startswith("price shock")
+
+    # Paused, so not triggered again until the file is removed.
+    kill_switch.poll()
+    kill_switch.trigger("again")
+    assert not kill_switch.triggered
+    os.remove(filename)
+    kill_switch.poll()
+    assert not kill_switch.paused
+
+    with open(filename, "w", encoding="utf-8") as handle:
+        handle.write("bad config\n")
+    kill_switch.poll()
+    assert kill_switch.triggered
+
+
+def test_kill_switch_accounts() -> None:
+    kill_switch = KillSwitch()
+    # Two accounts trading one market: one with two pages of orders left.
+    first = SlowTrade(
+        [{"id": f"late-{idx}", "symbol": "M-QUOTE"} for idx in range(600)]
+    )
+    second = SlowTrade([])
+    kill_switch.register("M-QUOTE", first)
+    kill_switch.register("M-QUOTE", second)
+    kill_switch.register("M-QUOTE", second)
+    assert len(kill_switch.markets) == 2
+
+    kill_switch.trigger("test")
+    cancelled = kill_switch.kill()
+    assert len(cancelled["M-QUOTE"]) == 200
+    assert len(first.cancelled) == 600
+    assert second.cancelled == []
+
+
+class LeftoverTrade(SlowTrade):
+    """
+    A SlowTrade for every Bot of one account, whose cancel all requests
+    leave all orders active, and whose single cancels are slow too.
+    """
+
+    active: List[Dict[str, Any]] = []
+    cancelled: List[str] = []
+    snapshots = 0
+
+    def __init__(self, **keys):
+        # pylint: disable=super-init-not-called
+        self.lock = threading.Lock()
+
+    def get_order_list(self, **kwargs) -> Dict[str, Any]:
+        LeftoverTrade.snapshots += kwargs["currentPage"] == 1
+        return super().get_order_list(**kwargs)
+
+    def cancel_order(self, orderId: str) -> Dict[str, Any]:
+        time.sleep(0.05)
+        return super().cancel_order(orderId)
+
+
+def test_bot_kill_switch_leftovers(monkeypatch) -> None:
+    # More orders left over than the Bots' latency control lets through
+    # at once, in two markets of one account, and one of another market.
+    LeftoverTrade.active = [
+        {"id": f"{market}-{idx}", "symbol": market}
+        for market in ("A-QUOTE", "B-QUOTE")
+        for idx in range(20)
+    ] + [{"id": "other", "symbol": "C-QUOTE"}]
+    monkeypatch.setattr(kcbot.bot.kcc, "Market", lambda **keys: None)
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", LeftoverTrade)
+    monkeypatch.setattr(kcbot.bot.kcc, "User", lambda **keys: None)
+    kill_switch = KillSwitch()
+    keys = {"key": "K", "secret": "S", "passphrase": "P"}
+    bots = [
+        kcbot.bot.Bot(
+            config={"base": base, "quote": "QUOTE", "strategies": []},
+            keys=keys,
+            kill_switch=kill_switch,
+        )
+        for base in ("A", "B")
+    ]
+    for bot in bots:
+        bot.load_config()
+        assert bot.latency.max_in_flight < 20
+    assert len(kill_switch.markets) == 2
+
+    kill_switch.trigger("test")
+    kill_switch.kill()
+    assert LeftoverTrade.snapshots == 1
+    assert sorted(LeftoverTrade.cancelled) == sorted(
+        order["id"] for order in LeftoverTrade.active[:-1]
+    )
+
+
+def test_kill_switch_signal() -> None:
+    kill_switch = KillSwitch()
+    previous = signal.getsignal(signal.SIGUSR1)
+    try:
+        assert kill_switch.install()
+        os.kill(os.getpid(), signal.SIGUSR1)
+        kill_switch.sleep(1.0)
+        assert kill_switch.triggered
+        assert kill_switch.reason == f"signal {int(signal.SIGUSR1)}"
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+
+
+def test_bot_kill_switch(monkeypatch, tmp_path) -> None:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    mock_trade = create_mock_trade(
+        {
+            f"{side}-{status}": empty
+            for side in ("buy", "sell")
+            for status in ("active", "done")
+        }
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    kill_file = str(tmp_path / "kill")
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "kill_file": kill_file,
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side,
+                "sell": side,
+            }
+        ],
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    assert all(bot.run_once().values())
+    assert len(mock_trade.bulk_calls) == 1
+
+    with open(kill_file, "w", encoding="utf-8") as handle:
+        handle.write("\n")
+    results = bot.run_once()
+    assert results == {"config": True, "kill": True}
+    assert mock_trade.cancel_calls == [
+        {"symbol": "BASE-QUOTE", "tradeType": "TRADE"}
+    ]
+
+    # Paused: caches are kept warm, but no orders placed.
+    results = bot.run_once()
+    assert "submit" not in results and all(results.values())
+    assert len(mock_trade.bulk_calls) == 1
+
+    os.remove(kill_file)
+    assert all(bot.run_once().values())
+    assert len(mock_trade.bulk_calls) == 2
+
+
+def test_bot_kill_switch_closes_again(monkeypatch, tmp_path) -> None:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    fill = {
+        "id": "f1",
+        "createdAt": int(time.time() * 1000),
+        "dealFunds": "10",
+        "dealSize": "10",
+        "symbol": "BASE-QUOTE",
+        "price": "1.0000",
+        "side": "buy",
+    }
+    order_lists = {
+        "buy-active": empty,
+        "sell-active": empty,
+        "buy-done": [dict(empty[0], items=[fill], totalNum=1)],
+        "sell-done": empty,
+    }
+    mock_trade = create_mock_trade(order_lists)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    kill_file = str(tmp_path / "kill")
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "kill_file": kill_file,
+        "ledger_file": str(tmp_path / "ledger.json"),
+        "strategies": [],
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    assert all(bot.run_once().values())
+    closes = [order for orders in mock_trade.bulk_calls for order in orders]
+    assert [order["side"] for order in closes] == ["sell"]
+    assert bot.ledger.close_oid("f1") == closes[0]["clientOid"]
+
+    with open(kill_file, "w", encoding="utf-8") as handle:
+        handle.write("\n")
+    assert bot.run_once() == {"config": True, "kill": True}
+    # The kill cancelled the close order.
+    cancelled = dict(closes[0], dealSize="0", createdAt=fill["createdAt"])
+    order_lists["sell-done"] = [dict(empty[0], items=[cancelled])]
+    results = bot.run_once()
+    assert results["unpair"] and all(results.values())
+    assert "f1" not in bot.ledger
+    assert len(mock_trade.bulk_calls) == 1
+
+    os.remove(kill_file)
+    assert all(bot.run_once().values())
+    assert "unpair" not in bot.run_once()
+    closes = [order for orders in mock_trade.bulk_calls for order in orders]
+    assert len(closes) == 2
+    assert closes[1]["clientOid"] != closes[0]["clientOid"]
+    assert {key: closes[1][key] for key in ("side", "price", "size")} == {
+        key: closes[0][key] for key in ("side", "price", "size")
+    }
+    assert bot.ledger.close_oid("f1") == closes[1]["clientOid"]
@@ -0,0 +1,87 @@
+"""
+Test klines
+"""
+
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+import kcbot.bot
+from kcbot.klines import KlineStore
+
+from .conftest import create_mock_market
+
+
+def test_kline_store_append(tmp_path) -> None:
+    store = KlineStore(str(tmp_path), "SOMETOKEN-GBPT", "1hour")
+    assert len(store) == 0
+    assert store.last_time() is None
+    assert len(store.column("close")) == 0
+
+    candles = [
+        [str(t), "1", str(t / 3600), "3", "0.5", "10", "20"]
+        for t in (7200, 3600)
+    ]
+    assert store.append(candles) == 2
+    # Candles already stored are skipped.
+    assert store.append(candles + [["10800", 1, 2, 3, 0.5, 10, 20]]) == 1
+    assert list(store.column("time")) == [3600, 7200, 10800]
+    assert list(store.column("close")) == [1.0, 2.0, 2.0]
+
+    view = store.columns()["close"]
+    assert isinstance(view, np.memmap)
+    assert not view.flags.writeable
+
+    reopened = KlineStore(str(tmp_path), "SOMETOKEN-GBPT", "1hour")
+    assert reopened.last_time() == 10800
+    assert list(reopened.since("close", 5000)) == [2.0, 2.0]
+    assert len(reopened.since("close", 20000)) == 0
+
+
+def test_kline_store_update(tmp_path) -> None:
+    market_class = create_mock_market("A", "B", 1.0, 1.0, 1.0, 1.0)
+    market = market_class()
+    store = KlineStore(str(tmp_path), "A-B", "1hour")
+    now = 3600 * 5000 + 1800
+    # Backfill needs several pages.
+    assert store.update(market, 3600 * 2000, now=now) == 2000
+    assert market_class.kline_calls == 2
+    # The candle starting at 3600 * 5000 is not closed yet.
+    assert store.last_time() == 3600 * 4999
+    assert np.all(np.diff(store.column("time")) == 3600)
+
+    assert store.update(market, 3600 * 2000, now=now + 3600) == 1
+    assert store.last_time() == 3600 * 5000
+
+
+def test_bot_get_klines(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("A", "B", 1.0, 1.0, 1.0, 1.0),
+    )
+    cfg: Dict[str, Any] = {
+        "base": "A",
+        "kline_backfill": 86400,
+        "kline_dir": str(tmp_path),
+        "kline_intervals": ["1hour"],
+        "loglevel": "INFO",
+        "quote": "B",
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    # Half way through an hour: the day's 24 hourly candles before it are
+    # closed, and the current one is not.
+    bot.clock = lambda: 3600.0 * 500000 + 1800.0
+    bot.load_config()
+    bot.get_klines()
+    assert len(bot.klines["1hour"]) == 24
+    assert bot.klines["1hour"].last_time() == 3600 * 499999
+
+    # Before there is enough ticker history, strategies average the
+    # stored closes.
+    assert len(bot.history) == 0
+    assert bot.average_price() == pytest.approx(1.1)
+    bot.history_len = 5
+    assert len(bot.kline_closes(bot.history_len * bot.tick_len)) == 0
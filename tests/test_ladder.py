@@ -0,0 +1,20 @@
+"""
+Test ladder
+"""
+
+import math
+
+import pytest
+
+from kcbot.ladder import bumps, shares
+
+
+def test_bumps() -> None:
+    side = {"pcnt_bump_a": 0.5, "pcnt_bump_c": 1.0, "order_count": 3}
+    assert bumps(side) == [1.5, 3.0, 5.5]
+
+
+def test_shares() -> None:
+    assert shares(0) == []
+    assert sum(shares(4)) == pytest.approx(1.0)
+    assert shares(4)[3] / shares(4)[0] == pytest.approx(math.sqrt(4))
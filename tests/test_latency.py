@@ -0,0 +1,137 @@
+"""
+Test latency control
+"""
+
+import threading
+import time
+
+import pytest
+
+from kcbot.latency import (
+    Deadline,
+    DeadlineExceeded,
+    LatencyControl,
+    LatencyTracker,
+    RequestTimeout,
+)
+from kcbot.retry import classify
+
+
+class SlowClient:
+    """
+    Each call takes the next of delays (then none), in seconds.
+    """
+
+    def __init__(self, *delays: float):
+        self.delays = list(delays)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_ticker(self, symbol: str) -> str:
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+            delay = self.delays.pop(0) if self.delays else 0.0
+        time.sleep(delay)
+        return f"{symbol} {call}"
+
+    def create_bulk_orders(self, symbol: str) -> str:
+        return self.get_ticker(symbol)
+
+    def get_order_list(self, **kwargs) -> None:
+        raise Exception("500-Internal error")
+
+
+def test_tracker() -> None:
+    tracker = LatencyTracker(size=100, min_samples=10)
+    for idx in range(9):
+        tracker.record("get_ticker", idx / 100.0)
+    assert tracker.percentile("get_ticker", 50.0) is None
+    for idx in range(9, 200):
+        tracker.record("get_ticker", idx / 100.0)
+    # Only the newest 100 (1.00 to 1.99) are kept.
+    assert tracker.percentile("get_ticker", 0.0) == 1.0
+    assert tracker.percentile("get_ticker", 95.0) == 1.95
+
+
+def test_timeout_and_deadline() -> None:
+    control = LatencyControl(timeouts={"get_ticker": 0.05})
+    client = control.wrap("market", SlowClient(1.0))
+    with pytest.raises(RequestTimeout) as err:
+        client.get_ticker("A-B")
+    # Orders timing out are retried with the same clientOids.
+    assert classify(str(err.value)) == "retry"
+    assert client.get_ticker("A-B") == "A-B 2"
+
+    with pytest.raises(Exception, match="500"):
+        client.get_order_list(symbol="A-B")
+
+    control.deadline = Deadline(0.0)
+    with pytest.raises(DeadlineExceeded):
+        client.get_ticker("A-B")
+    assert client.client.calls == 2
+
+
+def test_hedged() -> None:
+    control = LatencyControl(timeouts={"get_ticker": 5.0})
+    for _ in range(20):
+        control.tracker.record("get_ticker", 0.01)
+        control.tracker.record("create_bulk_orders", 0.01)
+
+    client = control.wrap("market", SlowClient(1.0))
+    start = time.monotonic()
+    # The first request is slow, so the hedged second one answers.
+    assert client.get_ticker("A-B") == "A-B 2"
+    assert time.monotonic() - start < 0.5
+    assert control.hedges == 1
+
+    # Orders are never sent twice.
+    client = control.wrap("trade", SlowClient(0.1))
+    assert client.create_bulk_orders("A-B") == "A-B 1"
+    assert control.hedges == 1
+
+
+def test_in_flight_bound() -> None:
+    control = LatencyControl(
+        timeouts={"get_ticker": 0.05}, workers=4, max_in_flight=2
+    )
+    for _ in range(20):
+        control.tracker.record("get_ticker", 0.01)
+    hung = control.wrap("market", SlowClient(0.5, 0.5))
+    # Hedged, and both abandoned, still running.
+    with pytest.raises(RequestTimeout):
+        hung.get_ticker("A-B")
+    assert control.hedges == 1
+    assert control.in_flight["get_ticker"] == 2
+
+    # The endpoint is full, so its requests time out at once.
+    start = time.monotonic()
+    with pytest.raises(RequestTimeout, match="still running"):
+        hung.get_ticker("A-B")
+    assert time.monotonic() - start < 0.05
+    assert hung.calls == 2
+
+    # Other endpoints still have workers.
+    other = control.wrap("trade", SlowClient())
+    assert other.create_bulk_orders("A-B") == "A-B 1"
+
+    time.sleep(0.6)
+    assert control.in_flight["get_ticker"] == 0
+    assert hung.get_ticker("A-B").startswith("A-B")
+
+
+def test_no_hedge_when_saturated() -> None:
+    control = LatencyControl(
+        timeouts={"get_ticker": 0.3}, workers=2, max_in_flight=2
+    )
+    for _ in range(20):
+        control.tracker.record("get_ticker", 0.01)
+    busy = control.wrap("trade", SlowClient(0.5))
+    thread = threading.Thread(target=busy.create_bulk_orders, args=("A-B",))
+    thread.start()
+    time.sleep(0.01)
+    client = control.wrap("market", SlowClient(0.1))
+    # The pool is full: the slow request is waited for, not hedged.
+    assert client.get_ticker("A-B") == "A-B 1"
+    assert control.hedges == 0
+    thread.join()
@@ -0,0 +1,131 @@
+"""
+Test Lease
+"""
+
+from typing import Any, Dict
+
+import pytest
+
+import kcbot.bot
+from kcbot.lease import Lease, LeaseLost, LeaseStore
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def test_lease_store(tmp_path) -> None:
+    store = LeaseStore(str(tmp_path / "leases.db"))
+    assert store.acquire("BASE-QUOTE", "a", 10.0, now=100.0) == 1
+    # Renewed by its holder, under the same token.
+    assert store.acquire("BASE-QUOTE", "a", 10.0, now=105.0) == 1
+    assert store.acquire("BASE-QUOTE", "b", 10.0, now=114.0) is None
+    assert store.acquire("OTHER-QUOTE", "b", 10.0, now=114.0) == 1
+    assert store.check("BASE-QUOTE", "a", 1, now=114.0)
+
+    # Expired, so taken over under a new token, which fences the old one.
+    assert store.acquire("BASE-QUOTE", "b", 10.0, now=116.0) == 2
+    assert not store.check("BASE-QUOTE", "a", 1, now=116.0)
+    assert store.check("BASE-QUOTE", "b", 2, now=116.0)
+    assert store.acquire("BASE-QUOTE", "a", 10.0, now=117.0) is None
+
+    store.release("BASE-QUOTE", "a")
+    assert store.check("BASE-QUOTE", "b", 2, now=117.0)
+    store.release("BASE-QUOTE", "b")
+    assert store.acquire("BASE-QUOTE", "a", 10.0, now=118.0) == 3
+
+
+def test_lease(tmp_path) -> None:
+    store = LeaseStore(str(tmp_path / "leases.db"))
+    first = Lease(store, "BASE-QUOTE", "a", ttl=0.3)
+    second = Lease(store, "BASE-QUOTE", "b", ttl=0.3)
+    first.start()
+    second.start()
+    try:
+        assert first.held and not second.held
+        first.fence()
+        with pytest.raises(LeaseLost):
+            second.fence()
+
+        # The heartbeat keeps it held beyond its ttl.
+        assert not second.gained.wait(0.5)
+        assert first.held
+
+        # A standby takes over within the ttl of the holder stopping.
+        first.stop()
+        assert second.gained.wait(0.3)
+        assert second.token == 2
+        with pytest.raises(LeaseLost):
+            first.fence()
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_bot_lease(monkeypatch, tmp_path) -> None:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    mock_trade = create_mock_trade(
+        {
+            f"{side}-{status}": empty
+            for side in ("buy", "sell")
+            for status in ("active", "done")
+        }
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "lease_file": str(tmp_path / "leases.db"),
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side,
+                "sell": side,
+            }
+        ],
+        "tick_len": 60,
+    }
+    active = kcbot.bot.Bot(config=cfg, keys={})
+    standby = kcbot.bot.Bot(config=cfg, keys={})
+    try:
+        assert "submit" in active.run_once()
+        results = standby.run_once()
+        assert "submit" not in results and all(results.values())
+        assert len(mock_trade.bulk_calls) == 1
+        # The standby's caches are warm.
+        assert standby.ticker.ask == 1.1
+        assert standby.balances["QUOTE"] == 1000.0
+
+        assert active.lease is not None
+        active.lease.stop()
+        assert all(standby.run_once().values())
+        assert standby.lease_token == 2
+        assert len(mock_trade.bulk_calls) == 2
+
+        # The old holder stands by, and is fenced off from placing orders
+        # made before it lost the lease.
+        assert "submit" not in active.run_once()
+        active.lease.token = 1
+        active.pending = list(mock_trade.bulk_calls[-1])
+        with pytest.raises(LeaseLost):
+            active.submit_orders()
+        assert len(mock_trade.bulk_calls) == 2
+    finally:
+        for bot in (active, standby):
+            if bot.lease is not None:
+                bot.lease.stop()
@@ -0,0 +1,236 @@
+"""
+Test Ledger
+"""
+
+import time
+from typing import Any, Dict, List
+
+import kcbot.bot
+from kcbot.ledger import Ledger
+
+from .conftest import create_mock_trade
+
+
+def order_page(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "currentPage": 1,
+        "items": items,
+        "pageSize": 500,
+        "totalNum": len(items),
+        "totalPage": 1,
+    }
+
+
+def make_bot(monkeypatch, mock_orders, bulk_responses=None):
+    mock_trade = create_mock_trade(mock_orders, bulk_responses)
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    cfg: Dict[str, Any] = {
+        "loglevel": "DEBUG",
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    bot.load_config()
+    return bot, mock_trade
+
+
+def test_ledger(tmp_path) -> None:
+    filename = str(tmp_path / "ledger.json")
+    ledger = Ledger(filename)
+    ledger.pair("f1", "c1", 1000)
+    ledger.pair("f2", "c2", 2000)
+    ledger.pair("f3", "c3", 3000)
+    ledger.migrated.add("resell")
+    assert "f1" in ledger
+    assert len(ledger) == 3
+
+    ledger.rename({"c2": "c1"})
+    assert ledger.close_oid("f2") == "c1"
+    assert ledger.release(["c3"]) == ["f3"]
+    assert "f3" not in ledger
+    ledger.save()
+
+    ledger = Ledger(filename)
+    assert ledger.migrated == {"resell"}
+    assert ledger.close_oid("f1") == "c1"
+    assert ledger.opens == {"c1": {"f1", "f2"}}
+    assert ledger.prune(1500) == 1
+    assert "f1" not in ledger
+    assert "f2" in ledger
+    assert ledger.opens == {"c1": {"f2"}}
+    # Pairing a fill again moves it to its new close order.
+    ledger.pair("f2", "c5", 2000)
+    assert ledger.opens == {"c5": {"f2"}}
+    assert ledger.release(["c1"]) == []
+
+
+def test_ledger_unplaced(tmp_path) -> None:
+    filename = str(tmp_path / "ledger.json")
+    ledger = Ledger(filename)
+    ledger.pair("f1", "c1", 1000, placed=False)
+    ledger.pair("f2", "c2", 1000, placed=False)
+    ledger.pair("f3", "c3", 1000, placed=False)
+    assert "f1" in ledger and ledger.close_oid("f1") == "c1"
+    ledger.rename({"c2": "c1"})
+    assert ledger.confirm(["c1"]) == 2
+    ledger.save()
+    # Only the pairs whose close orders were placed are saved.
+    assert Ledger(filename).pairs == {"f1": ["c1", 1000], "f2": ["c1", 1000]}
+
+    ledger.pair("f4", "c4", 1000, placed=False)
+    assert sorted(ledger.release_unplaced(keep=["c4"])) == ["f3"]
+    assert "f4" in ledger
+    assert ledger.release_unplaced() == ["f4"]
+    assert len(ledger) == 2
+    assert ledger.opens == {"c1": {"f1", "f2"}}
+
+
+def test_bot_ledger_migrates_once(monkeypatch) -> None:
+    now = int(time.time() * 1000)
+    mock_orders = {
+        "buy-done": [
+            order_page(
+                [
+                    {
+                        "id": "f1",
+                        "createdAt": now,
+                        "dealFunds": "10",
+                        "dealSize": "10",
+                        "symbol": "?-?",
+                        "price": "1.0000",
+                        "side": "buy",
+                    },
+                ]
+            )
+        ],
+        "sell-active": [
+            order_page(
+                [
+                    {
+                        "id": "c1",
+                        "clientOid": "oid1",
+                        "createdAt": now,
+                        "size": "10",
+                        "price": "1.0500",
+                        "side": "sell",
+                    },
+                ]
+            )
+        ],
+        "sell-done": [order_page([])],
+    }
+    bot, mock_trade = make_bot(monkeypatch, mock_orders)
+    assert bot.opposite_orders(False, "resell") == []
+    assert bot.ledger.close_oid("f1") == "oid1"
+    assert "resell" in bot.ledger.migrated
+
+    # Later calls only fetch the filled orders.
+    mock_trade.order_list_calls.clear()
+    assert bot.opposite_orders(False, "resell") == []
+    assert [call["side"] for call in mock_trade.order_list_calls] == ["buy"]
+
+
+def test_bot_ledger_pairs_fill_once(monkeypatch) -> None:
+    now = int(time.time() * 1000)
+    mock_orders = {
+        "buy-done": [
+            order_page(
+                [
+                    {
+                        "id": "f1",
+                        "createdAt": now,
+                        "dealFunds": "10",
+                        "dealSize": "10",
+                        "symbol": "?-?",
+                        "price": "1.0000",
+                        "side": "buy",
+                    },
+                ]
+            )
+        ],
+        "sell-active": [order_page([])],
+        "sell-done": [order_page([])],
+    }
+    bot, _ = make_bot(monkeypatch, mock_orders)
+    orders = bot.opposite_orders(False, "resell")
+    assert len(orders) == 1
+    assert bot.ledger.close_oid("f1") == orders[0]["clientOid"]
+
+    # Not yet visible as an active sell, but already paired.
+    assert bot.opposite_orders(False, "resell") == []
+
+
+def test_bot_ledger_releases_failed(monkeypatch) -> None:
+    now = int(time.time() * 1000)
+    mock_orders = {
+        "buy-done": [
+            order_page(
+                [
+                    {
+                        "id": "f1",
+                        "createdAt": now,
+                        "dealFunds": "10",
+                        "dealSize": "10",
+                        "symbol": "?-?",
+                        "price": "1.0000",
+                        "side": "buy",
+                    },
+                ]
+            )
+        ],
+        "sell-active": [order_page([])],
+        "sell-done": [order_page([])],
+    }
+    bot, _ = make_bot(
+        monkeypatch, mock_orders, bulk_responses=[["Price increment invalid"]]
+    )
+    bot.queue_orders("resell", bot.opposite_orders(False, "resell"))
+    assert "f1" in bot.ledger
+    bot.submit_orders()
+    assert "f1" not in bot.ledger
+
+    # The fill is paired again, with a new close order.
+    assert len(bot.opposite_orders(False, "resell")) == 1
+
+
+def test_bot_ledger_pairs_placed(monkeypatch, tmp_path) -> None:
+    now = int(time.time() * 1000)
+    mock_orders = {
+        "buy-done": [
+            order_page(
+                [
+                    {
+                        "id": "f1",
+                        "createdAt": now,
+                        "dealFunds": "10",
+                        "dealSize": "10",
+                        "symbol": "?-?",
+                        "price": "1.0000",
+                        "side": "buy",
+                    },
+                ]
+            )
+        ],
+        "sell-active": [order_page([])],
+        "sell-done": [order_page([])],
+    }
+    bot, mock_trade = make_bot(monkeypatch, mock_orders)
+    filename = str(tmp_path / "ledger.json")
+    bot.ledger = Ledger(filename)
+    bot.queue_orders("RESELL", bot.opposite_orders(False, "resell"))
+    assert "f1" in bot.ledger
+    # Not placed yet, so a restart would pair the fill again.
+    assert "f1" not in Ledger(filename)
+
+    # The queued close order is dropped (e.g. the submit phase failed).
+    bot.pending = []
+    bot.release_unplaced()
+    assert "f1" not in bot.ledger
+    orders = bot.opposite_orders(False, "resell")
+    assert len(orders) == 1
+
+    bot.queue_orders("RESELL", orders)
+    bot.submit_orders()
+    assert len(mock_trade.bulk_calls) == 1
+    assert Ledger(filename).close_oid("f1") == orders[0]["clientOid"]
+    bot.release_unplaced()
+    assert bot.opposite_orders(False, "resell") == []
@@ -0,0 +1,56 @@
+"""
+Test MarketData
+"""
+
+from typing import Any, Dict
+
+import kcbot.bot
+from kcbot.marketdata import MarketData
+
+from .conftest import create_mock_market
+
+
+def test_marketdata() -> None:
+    mock_market = create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2)
+    market_data = MarketData(mock_market(), ttl=60.0)
+    ticker = market_data.get("BASE-QUOTE")
+    assert ticker is not None
+    assert (ticker.bid, ticker.ask, ticker.low, ticker.high) == (
+        1.0,
+        1.1,
+        0.9,
+        1.2,
+    )
+    assert ticker.time == 1700000000000
+
+    # Listed, but with null prices.
+    assert "UNTRADED-USDT" in market_data.tickers
+    assert market_data.get("UNTRADED-USDT") is None
+    assert market_data.get("MISSING-USDT") is None
+    assert mock_market.all_tickers_calls == 1
+
+    market_data.ttl = 0.0
+    market_data.get("BASE-QUOTE")
+    assert mock_market.all_tickers_calls == 2
+
+
+def test_bot_shares_marketdata(monkeypatch) -> None:
+    mock_market = create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2)
+    monkeypatch.setattr(kcbot.bot.kcc, "Market", mock_market)
+    market_data = MarketData(mock_market(), ttl=60.0)
+    bots = []
+    for base, quote in (
+        ("BASE", "QUOTE"),
+        ("MISSING", "QUOTE"),
+        ("UNTRADED", "USDT"),
+    ):
+        cfg: Dict[str, Any] = {"base": base, "quote": quote}
+        bot = kcbot.bot.Bot(config=cfg, keys={}, market_data=market_data)
+        bot.load_config()
+        bot.get_ticker()
+        bots.append(bot)
+    assert mock_market.all_tickers_calls == 1
+    assert bots[0].ticker.ask == 1.1
+    # Not in the shared tickers, or without prices, so fetched on its own.
+    assert bots[1].ticker.ask == 1.1
+    assert bots[2].ticker.bid == 1.0
@@ -0,0 +1,97 @@
+"""
+Test memory profiling
+"""
+
+import collections
+from typing import Any, Dict, List
+
+import pytest
+
+import kcbot.bot
+from kcbot.memprof import MemoryGrowthError, MemoryProfiler, soak
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def make_bot(monkeypatch) -> kcbot.bot.Bot:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    mock_trade = create_mock_trade(
+        {
+            f"{side}-{status}": empty
+            for side in ("buy", "sell")
+            for status in ("active", "done")
+        }
+    )
+    # The mock's own call logs would grow.
+    for calls in ("bulk_calls", "order_list_calls"):
+        monkeypatch.setattr(mock_trade, calls, collections.deque(maxlen=10))
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 3,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "loglevel": "WARNING",
+        "history_len": 100,
+        "strategies": [
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side,
+                "sell": side,
+            }
+        ],
+    }
+    return kcbot.bot.Bot(config=cfg, keys={})
+
+
+def test_growth_rate() -> None:
+    profiler = MemoryProfiler()
+    profiler.samples = [(0, 5000), (100, 1000), (200, 2000), (300, 3000)]
+    assert profiler.growth_rate(skip=1) == pytest.approx(10.0)
+
+
+def test_soak(monkeypatch) -> None:
+    bot = make_bot(monkeypatch)
+    # A tick passes between iterations, so that orders' funds and pending
+    # fills expire as they would live.
+    now = [1_700_000_000.0]
+    bot.clock = lambda: now[0]
+    ticked_run_once = bot.run_once
+
+    def ticking_run_once() -> Dict[str, bool]:
+        now[0] += bot.tick_len + 1.0
+        return ticked_run_once()
+
+    monkeypatch.setattr(bot, "run_once", ticking_run_once)
+    # Bounded: the ticker history, ledger and latency samples are capped,
+    # and reserved funds and pending fills expire.
+    assert soak(bot, iterations=1000, every=100, max_growth=64.0) < 64.0
+    assert len(bot.balances.reserved) <= 6
+    assert len(bot.fill_stats.pending) <= 12
+
+    # A leak of a list per iteration is caught.
+    leaked: List[List[int]] = []
+    run_once = bot.run_once
+
+    def leaky_run_once() -> Dict[str, bool]:
+        leaked.append(list(range(100)))
+        return run_once()
+
+    monkeypatch.setattr(bot, "run_once", leaky_run_once)
+    with pytest.raises(MemoryGrowthError):
+        soak(bot, iterations=500, every=50, max_growth=64.0)
@@ -0,0 +1,61 @@
+"""
+Test netting
+"""
+
+from typing import Any, Dict
+
+from kcbot.increment import Increment
+from kcbot.netting import net_orders
+
+
+def make_order(
+    oid: str,
+    side: str,
+    price: str,
+    size: str,
+    tif: str = "GTT",
+) -> Dict[str, Any]:
+    return {
+        "clientOid": oid,
+        "side": side,
+        "price": price,
+        "size": size,
+        "timeInForce": tif,
+    }
+
+
+def test_net_orders_merges_same_price() -> None:
+    orders = [
+        make_order("a", "buy", "1.00", "1.5"),
+        make_order("b", "buy", "0.99", "1"),
+        make_order("c", "buy", "1.0", "2.25"),
+        make_order("d", "buy", "1.00", "1", tif="GTC"),
+    ]
+    aliases: Dict[str, str] = {}
+    netted = net_orders(orders, Increment("0.01"), Increment("0.01"), aliases)
+    assert [(order["clientOid"], order["size"]) for order in netted] == [
+        ("a", "3.75"),
+        ("b", "1"),
+        ("d", "1"),
+    ]
+    assert aliases == {"c": "a"}
+
+
+def test_net_orders_nets_crossing() -> None:
+    orders = [
+        make_order("b1", "buy", "1.05", "3"),
+        make_order("b2", "buy", "1.02", "2"),
+        make_order("b3", "buy", "0.95", "9"),
+        make_order("s1", "sell", "1.00", "4"),
+        make_order("s2", "sell", "1.03", "5"),
+        make_order("s3", "sell", "1.10", "7"),
+    ]
+    netted = net_orders(orders, Increment("0.01"), Increment("1"))
+    # b1 (3) nets against s1 (4), then b2 (2) against the rest of s1 (1),
+    # leaving 1 of b2, which does not cross s2.
+    assert [(order["clientOid"], order["size"]) for order in netted] == [
+        ("b2", "1"),
+        ("b3", "9"),
+        ("s2", "5"),
+        ("s3", "7"),
+    ]
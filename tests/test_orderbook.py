@@ -0,0 +1,158 @@
+"""
+Test orderbook
+"""
+
+from typing import Any, Dict
+
+import kcbot.bot
+from kcbot.increment import Increment
+from kcbot.orderbook import OrderBook
+
+from .conftest import create_mock_market, create_mock_user
+
+
+def make_book() -> OrderBook:
+    book = OrderBook(Increment("0.01"), Increment("1"))
+    book.seed(
+        {
+            "sequence": "100",
+            "bids": [["9.99", "5"], ["9.98", "10"], ["9.95", "20"]],
+            "asks": [["10.01", "5"], ["10.03", "10"]],
+        }
+    )
+    return book
+
+
+def test_book_queries() -> None:
+    book = make_book()
+    assert book.best_bid() == 999
+    assert book.best_ask() == 1001
+    assert book.price_to_fill("sell", 5) == 999
+    assert book.price_to_fill("sell", 6) == 998
+    assert book.price_to_fill("sell", 35) == 995
+    assert book.price_to_fill("sell", 36) is None
+    assert book.price_to_fill("buy", 15) == 1003
+    assert book.depth("bids", 998) == 15
+    assert book.depth("bids", 1000) == 0
+    assert book.depth("asks", 1002) == 5
+
+
+def test_book_changes() -> None:
+    book = make_book()
+    assert book.apply(
+        {
+            "sequenceStart": 101,
+            "sequenceEnd": 103,
+            "changes": {
+                "bids": [["9.99", "0", "101"], ["9.97", "7", "103"]],
+                "asks": [["10.02", "1", "102"]],
+            },
+        }
+    )
+    assert book.sequence == 103
+    assert book.best_bid() == 998
+    assert book.best_ask() == 1001
+    assert book.depth("bids", 997) == 17
+    assert book.price_to_fill("buy", 6) == 1002
+
+    # A change already applied is ignored.
+    assert book.apply(
+        {
+            "sequenceStart": 101,
+            "sequenceEnd": 101,
+            "changes": {"bids": [["9.99", "50", "101"]]},
+        }
+    )
+    assert book.best_bid() == 998
+
+    # A gap means the book is out of sync.
+    assert not book.apply(
+        {
+            "sequenceStart": 105,
+            "sequenceEnd": 105,
+            "changes": {"asks": [["10.00", "1", "105"]]},
+        }
+    )
+    assert not book.synced
+    assert book.best_ask() == 1001
+
+
+def test_bot_buy_depth(monkeypatch) -> None:
+    base = "SOMETOKEN"
+    quote = "GBPT"
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market(base, quote, 100.0, 104.0, 106.0, 110.0),
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user(base, quote, 100.0, 200.0),
+    )
+    cfg: Dict[str, Any] = {
+        "base": base,
+        "book_depth": 20,
+        "loglevel": "INFO",
+        "quote": quote,
+        "strategies": [
+            {
+                "name": "deep",
+                "strategy": "depth",
+                "buy": {
+                    "depth": 25,
+                    "pcnt_bump_a": 1.0,
+                    "pcnt_bump_c": 0.0,
+                    "order_count": 1,
+                    "vol_percent": 10.0,
+                },
+            },
+        ],
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    bot.load_config()
+    bot.get_symbol_info()
+    bot.get_balances()
+    bot.get_ticker()
+    bot.get_book()
+
+    # 25 base units reach the third bid level, 104 * 0.98, less 1%.
+    buys = bot.buy_orders(cfg["strategies"][0])
+    assert [order["price"] for order in buys] == ["100.9008"]
+
+
+def test_bot_apply_book_change(monkeypatch) -> None:
+    market_class = create_mock_market("A", "B", 1.0, 1.0, 1.1, 1.2)
+    monkeypatch.setattr(kcbot.bot.kcc, "Market", market_class)
+    cfg: Dict[str, Any] = {
+        "base": "A",
+        "book_depth": 20,
+        "quote": "B",
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    bot.load_config()
+    bot.get_book()
+    assert bot.book.sequence == 1000
+    bot.apply_book_change(
+        {
+            "sequenceStart": 1001,
+            "sequenceEnd": 1001,
+            "changes": {"bids": [["1.0", "0", "1001"]]},
+        }
+    )
+    assert bot.book.sequence == 1001
+    assert bot.prices.to_float(bot.book.best_bid() or 0) == 0.99
+
+    # Changes were missed: the book is seeded from a snapshot again.
+    bot.apply_book_change(
+        {
+            "sequenceStart": 1005,
+            "sequenceEnd": 1005,
+            "changes": {"asks": [["1.1", "0", "1005"]]},
+        }
+    )
+    assert bot.book.synced
+    assert bot.book.sequence == 1000
+    assert bot.prices.to_float(bot.book.best_bid() or 0) == 1.0
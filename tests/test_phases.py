@@ -0,0 +1,174 @@
+"""
+Test phases
+"""
+
+import logging
+from typing import Any, Dict, List
+
+import kcbot.bot
+import kcbot.phases
+from kcbot.phases import Phase
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def test_phase_retries(monkeypatch) -> None:
+    monkeypatch.setattr(kcbot.phases.time, "sleep", lambda secs: None)
+    calls: List[int] = []
+
+    def flaky() -> None:
+        calls.append(1)
+        if len(calls) < 3:
+            raise Exception("Temporary failure")
+
+    logger = logging.getLogger("test")
+    assert not Phase("flaky", flaky, retries=1).run(logger)
+    calls.clear()
+    phase = Phase("flaky", flaky, retries=2)
+    assert phase.run(logger)
+    assert phase.attempts == 3
+    assert phase.error is None
+
+
+def test_phase_deadline(monkeypatch) -> None:
+    monkeypatch.setattr(kcbot.phases.time, "sleep", lambda secs: None)
+
+    def broken() -> None:
+        raise Exception("Permanent failure")
+
+    phase = Phase("broken", broken, deadline=1.0, retries=5, backoff=2.0)
+    assert not phase.run(logging.getLogger("test"))
+    assert phase.attempts == 1
+    assert phase.error is not None and "Permanent failure" in phase.error
+
+
+def test_bot_run_once_isolates_phases(monkeypatch) -> None:
+    base = "SOMETOKEN"
+    quote = "GBPT"
+    monkeypatch.setattr(kcbot.phases.time, "sleep", lambda secs: None)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market(base, quote, 100.0, 104.0, 106.0, 110.0),
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user(base, quote, 1000.0, 2000.0),
+    )
+    # No order history: the rebuy and resell phases fail.
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", create_mock_trade({}))
+    side_cfg = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": base,
+        "loglevel": "INFO",
+        "quote": quote,
+        "strategies": [
+            {
+                "name": "broken",
+                "strategy": "no-such-strategy",
+                "buy": side_cfg,
+                "sell": side_cfg,
+            },
+            {
+                "name": "careful",
+                "strategy": "bid-and-ask",
+                "buy": side_cfg,
+                "sell": side_cfg,
+            },
+        ],
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    results = bot.run_once()
+    assert results == {
+        "config": True,
+        "symbol": True,
+        "balances": True,
+        "ticker": True,
+        "klines": True,
+        "book": True,
+        "fills": False,
+        "rebuy": False,
+        "resell": False,
+        "strategy broken": False,
+        "strategy careful": True,
+        "submit": True,
+    }
+    # The 2 buys and 2 sells are submitted together.
+    assert len(bot.trade.bulk_calls) == 1
+    assert [order["remark"] for order in bot.trade.bulk_calls[0]] == [
+        "careful"
+    ] * 4
+
+
+def test_bot_run_once_skips_dependent_phases(monkeypatch) -> None:
+    monkeypatch.setattr(kcbot.phases.time, "sleep", lambda secs: None)
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", create_mock_trade({}))
+    cfg: Dict[str, Any] = {
+        "base": "SOMETOKEN",
+        "loglevel": "INFO",
+        "quote": "GBPT",
+        "phase_settings": {"balances": {"retries": 0}},
+        "strategies": [{"name": "careful", "strategy": "bid-and-ask"}],
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    bot.user = None  # get_balances fails
+    bot.market = None  # get_ticker fails
+    bot.symbols.market = None  # get_symbol_info fails
+    results = bot.run_once()
+    assert not results["balances"]
+    assert not results["strategy careful"]
+
+
+def test_bot_phase_deadline(monkeypatch, caplog) -> None:
+    base = "SOMETOKEN"
+    quote = "GBPT"
+    monkeypatch.setattr(kcbot.phases.time, "sleep", lambda secs: None)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market(base, quote, 100.0, 104.0, 106.0, 110.0),
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user(base, quote, 1000.0, 2000.0),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", create_mock_trade({}))
+    side_cfg = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    cfg: Dict[str, Any] = {
+        "base": base,
+        "quote": quote,
+        # Requests made once a phase's deadline has passed fail.
+        "phase_settings": {"ticker": {"deadline": 0.0}},
+        # Unnamed: labelled by its kind.
+        "strategies": [
+            {"strategy": "bid-and-ask", "buy": side_cfg, "sell": side_cfg}
+        ],
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    results = bot.run_once()
+    assert results["balances"] and not results["ticker"]
+    assert not results["strategy bid-and-ask"]
+    assert "Deadline exceeded before get_ticker" in caplog.text
+
+    cfg["phase_settings"] = {}
+    bot.load_config()
+    results = bot.run_once()
+    assert results["ticker"] and results["strategy bid-and-ask"]
+    assert [order["remark"] for order in bot.trade.bulk_calls[-1]] == [
+        "bid-and-ask"
+    ] * 4
@@ -0,0 +1,114 @@
+"""
+Test retry
+"""
+
+import uuid
+from typing import Any, Dict, List
+
+import kcbot.bot
+from kcbot.retry import RetryQueue, classify
+
+from .conftest import create_mock_trade
+
+
+def make_orders(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "clientOid": str(uuid.uuid4()),
+            "side": "buy",
+            "symbol": "SOMETOKEN-GBPT",
+            "type": "limit",
+            "price": "1.0",
+            "size": "10",
+        }
+        for _ in range(count)
+    ]
+
+
+def make_bot(monkeypatch, bulk_responses) -> kcbot.bot.Bot:
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Trade",
+        create_mock_trade({}, bulk_responses),
+    )
+    monkeypatch.setattr(kcbot.bot.time, "sleep", lambda secs: None)
+    cfg: Dict[str, Any] = {
+        "base": "SOMETOKEN",
+        "loglevel": "DEBUG",
+        "quote": "GBPT",
+        "tick_len": 60,
+    }
+    bot = kcbot.bot.Bot(config=cfg, keys={})
+    bot.load_config()
+    return bot
+
+
+def test_classify() -> None:
+    assert classify("429-Too Many Requests") == "retry"
+    assert classify("Exception: Read timed out.") == "retry"
+    assert classify("503-Service Unavailable") == "retry"
+    assert classify('400-{"code":"429000","msg":"Slow down"}') == "retry"
+    assert classify('b\'{"code": "500000"}\'') == "retry"
+    # Digits quoted in a validation error are not a status.
+    assert classify("Order size 1500 exceeds the limit 0.500") == "fatal"
+    assert classify("400-Order funds below 5000") == "fatal"
+    assert classify("Balance insufficient!") == "fatal"
+    assert classify("Price increment invalid") == "fatal"
+    assert classify("clientOid duplicate") == "duplicate"
+
+
+def test_retry_queue() -> None:
+    queue = RetryQueue(max_attempts=3, backoff=1.0)
+    order = make_orders(1)[0]
+    assert queue.add(100.0, 0, "BUY", [order])
+    due = queue.next_due()
+    assert due is not None and 100.0 <= due <= 101.0
+    assert queue.pop_due(99.0) == []
+    assert queue.pop_due(101.0) == [(1, "BUY", order)]
+    assert queue.add(100.0, 1, "BUY", [order])
+    assert not queue.add(100.0, 2, "BUY", [order])
+
+
+def test_create_orders_retries_failed(monkeypatch) -> None:
+    bot = make_bot(
+        monkeypatch,
+        [
+            [None, "Too many requests", None, "Balance insufficient", None],
+            [None, None],
+        ],
+    )
+    orders = make_orders(7)
+    assert bot.create_orders("BUY", orders) == 6
+    calls = bot.trade.bulk_calls
+    assert len(calls) == 3
+    # The retry reuses the clientOid of the failed order.
+    assert [order["clientOid"] for order in calls[2]] == [
+        orders[1]["clientOid"]
+    ]
+    assert len(bot.retries) == 0
+
+
+def test_create_orders_exception_does_not_abort(monkeypatch) -> None:
+    bot = make_bot(
+        monkeypatch,
+        [
+            Exception("503-Service Unavailable"),
+            [None, None],
+            ["clientOid duplicate"] + [None] * 4,
+        ],
+    )
+    orders = make_orders(7)
+    # The second batch is submitted before the first is retried, and the
+    # order placed by the failed request is counted once.
+    assert bot.create_orders("BUY", orders) == 7
+    calls = bot.trade.bulk_calls
+    assert len(calls) == 3
+    assert calls[1] == orders[5:]
+    assert calls[2] == orders[:5]
+
+
+def test_create_orders_gives_up(monkeypatch) -> None:
+    bot = make_bot(monkeypatch, [Exception("429-Too Many Requests")] * 3)
+    assert bot.create_orders("BUY", make_orders(2)) == 0
+    assert len(bot.trade.bulk_calls) == 3
+    assert len(bot.retries) == 0
@@ -0,0 +1,123 @@
+"""
+Test ShadowBook
+"""
+
+from typing import Any, Dict
+
+import pytest
+
+import kcbot.bot
+from kcbot.increment import Increment
+from kcbot.journal import Recorder
+from kcbot.shadow import ShadowBook
+from kcbot.ticker import Ticker
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def test_shadow_book() -> None:
+    book = ShadowBook(Increment("0.0001"))
+    ticker = Ticker(ask=1.01, bid=1.0, price=1.0)
+    assert book.match(ticker, 0) == []
+    fills = book.add(
+        [
+            {"side": "buy", "price": "0.99", "size": "10", "remark": "s"},
+            # Marketable, so filled at once.
+            {"side": "sell", "price": "1.0", "size": "5", "remark": "s"},
+            {
+                "side": "buy",
+                "price": "0.5",
+                "size": "1",
+                "timeInForce": "GTT",
+                "cancelAfter": 60,
+            },
+        ],
+        ticker,
+        0,
+    )
+    assert [fill["price"] for fill in fills] == ["1.0"]
+    # Its close order (rebuy) rests 5% lower.
+    assert [order["price"] for order in book.orders] == ["0.99", "0.95", "0.5"]
+
+    # The price falls through 0.99, which rests a resell 5% higher.
+    fills = book.match(Ticker(ask=0.99, bid=0.98, price=0.985), 30000)
+    assert [fill["price"] for fill in fills] == ["0.99"]
+    assert [order["price"] for order in book.orders] == [
+        "0.95",
+        "0.5",
+        "1.0395",
+    ]
+
+    # The GTT order expires.
+    assert book.match(Ticker(ask=0.99, bid=0.98, price=0.985), 60000) == []
+    assert [order["price"] for order in book.orders] == ["0.95", "1.0395"]
+
+
+def test_bot_shadow(monkeypatch, tmp_path) -> None:
+    empty = [{"currentPage": 1, "items": [], "totalNum": 0, "totalPage": 1}]
+    mock_trade = create_mock_trade(
+        {
+            f"{side}-{status}": empty
+            for side in ("buy", "sell")
+            for status in ("active", "done")
+        }
+    )
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("BASE", "QUOTE", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", mock_trade)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "User",
+        create_mock_user("BASE", "QUOTE", 1000.0, 1000.0),
+    )
+    side = {
+        "pcnt_bump_a": 1.0,
+        "pcnt_bump_c": 1.0,
+        "order_count": 2,
+        "vol_percent": 10.0,
+    }
+    strategy = {
+        "name": "careful",
+        "strategy": "bid-and-ask",
+        "buy": side,
+        "sell": side,
+    }
+    cfg: Dict[str, Any] = {
+        "base": "BASE",
+        "quote": "QUOTE",
+        "strategies": [strategy],
+        "tick_len": 60,
+    }
+    live = Recorder(str(tmp_path / "live.jsonl"))
+    kcbot.bot.Bot(config=cfg, keys={}, outer_wrappers=[live.wrap]).run_once()
+
+    cfg["shadow_strategies"] = [dict(strategy, name="wide")]
+    recorder = Recorder(str(tmp_path / "shadow.jsonl"))
+    bot = kcbot.bot.Bot(config=cfg, keys={}, outer_wrappers=[recorder.wrap])
+    results = bot.run_once()
+    assert results["shadow fills"] and results["shadow wide"]
+    # Shadow strategies make no requests, and place no orders.
+    assert recorder.count == live.count
+    assert {
+        order["remark"] for orders in mock_trade.bulk_calls for order in orders
+    } == {"careful"}
+    assert len(bot.shadow) == 4
+    assert len(bot.fill_stats.pending) == 8
+
+    # The price had been lower, so crossed both shadow buys.
+    bot.shadow.price = 0.9
+    bot.run_once()
+    shadow = bot.accounting.position("BASE-QUOTE", "shadow:wide")
+    assert shadow.inventory == pytest.approx(100.0, abs=0.01)
+    assert shadow.realized == 0.0
+    assert bot.accounting.position("BASE-QUOTE").inventory == 0.0
+    filled = {
+        (row["strategy"], row["side"], row["rung"]): row["filled"]
+        for row in bot.fill_stats.summary()
+    }
+    assert filled[("shadow:wide", "buy", 0)] == 1
+    assert filled[("shadow:wide", "buy", 1)] == 1
+    assert filled[("careful", "buy", 0)] == 0
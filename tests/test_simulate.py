@@ -0,0 +1,103 @@
+"""
+Test the simulator
+"""
+
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+from kcbot.simulate import (
+    PERCENTILES,
+    rolling_max,
+    rolling_mean,
+    simulate,
+    simulate_paths,
+)
+
+
+def make_strategy(name: str, buys: int, sells: int) -> Dict[str, Any]:
+    def side(count: int) -> Dict[str, Any]:
+        return {
+            "pcnt_bump_a": 0.0,
+            "pcnt_bump_c": 1.0,
+            "order_count": count,
+            "vol_percent": 10.0,
+        }
+
+    return {
+        "name": name,
+        "strategy": name,
+        "buy": side(buys),
+        "sell": side(sells),
+    }
+
+
+def test_rolling() -> None:
+    prices = np.random.default_rng(1).random((3, 50))
+    for window in (1, 5, 8, 13):
+        highs = rolling_max(prices, window)
+        means = rolling_mean(prices, window)
+        for tick in range(50):
+            start, end = max(0, tick - window + 1), tick + 1
+            past = prices[:, start:end]
+            assert np.allclose(highs[:, tick], past.max(axis=1))
+            assert np.allclose(means[:, tick], past.mean(axis=1))
+
+
+def test_simulate_paths_rebuy_resell() -> None:
+    # Buys 1% under 1.0 fill on the drop to 0.98, and the resell 5% above
+    # (at 1.0395) fills on the rise to 1.05.
+    prices = np.array([[1.0, 0.98, 1.0, 1.05, 1.05]])
+    result = simulate_paths(
+        [make_strategy("bid-and-ask", 1, 0)],
+        prices,
+        base=0.0,
+        quote=1000.0,
+        tick_len=60.0,
+    )
+    # 10% of 1000 quote at 1.0 is 100 base, bought at 0.99.
+    assert result["peak_base"][0] == pytest.approx(100.0)
+    assert result["low_quote"][0] == pytest.approx(901.0)
+    # Sold again for 5% more, plus rounding up to the price grid.
+    assert result["final_value"][0] == pytest.approx(1004.95, abs=0.25)
+
+
+def test_simulate() -> None:
+    strategies = [
+        make_strategy("day-high-low", 3, 3),
+        make_strategy("bid-or-ask", 2, 2),
+    ]
+    report = simulate(
+        strategies,
+        price=1.0,
+        volatility=0.01,
+        base=1000.0,
+        quote=1000.0,
+        ticks=100,
+        paths=40,
+        workers=2,
+        seed=1,
+    )
+    assert set(report) == {
+        "peak_base",
+        "low_quote",
+        "peak_value",
+        "final_value",
+    }
+    assert tuple(report["peak_base"]) == PERCENTILES
+    assert report["peak_base"][5.0] >= 1000.0
+    assert report["low_quote"][99.0] <= 1000.0
+
+    again = simulate(
+        strategies,
+        price=1.0,
+        volatility=0.01,
+        base=1000.0,
+        quote=1000.0,
+        ticks=100,
+        paths=40,
+        workers=2,
+        seed=1,
+    )
+    assert again == report
@@ -0,0 +1,151 @@
+"""
+Test supervisor
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict
+
+import kcbot.bot
+import kcbot.phases
+import kcbot.ratelimit
+from kcbot.ratelimit import RateLimited, RateLimiter
+from kcbot.supervisor import Supervisor, assign_shards, run_shard
+
+from .conftest import create_mock_market, create_mock_trade, create_mock_user
+
+
+def test_assign_shards() -> None:
+    loads = {"A-X": 5.0, "B-X": 4.0, "C-X": 3.0, "D-X": 3.0, "E-X": 1.0}
+    shards = assign_shards(loads, 2)
+    assert sorted(shards) == [["A-X", "D-X"], ["B-X", "C-X", "E-X"]]
+    assert assign_shards(loads, 1) == [sorted(loads)]
+
+
+def test_rate_limiter(monkeypatch) -> None:
+    now = [100.0]
+    sleeps = []
+
+    def sleep(secs: float) -> None:
+        sleeps.append(secs)
+        now[0] += secs
+
+    monkeypatch.setattr(kcbot.ratelimit.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(kcbot.ratelimit.time, "sleep", sleep)
+    limiter = RateLimiter(rate=2.0, burst=2.0)
+
+    class Client:
+        calls = 0
+
+        def get_ticker(self, symbol: str) -> str:
+            Client.calls += 1
+            return symbol
+
+    client = RateLimited(Client(), limiter)
+    for _ in range(4):
+        assert client.get_ticker("A-B") == "A-B"
+    assert Client.calls == 4
+    # The burst of 2 is free, then 2 more at 2 per second.
+    assert sum(sleeps) == 1.0
+
+
+def crashing_shard(
+    configs: Dict[str, Any],
+    keys: Any,
+    limiter: RateLimiter,
+    reports: Any,
+    stop: Any,
+    tick_len: float,
+) -> None:
+    marker = os.path.join(keys, "-".join(configs))
+    if not os.path.exists(marker):
+        with open(marker, "w", encoding="utf-8"):
+            pass
+        # Before reporting: a process dying while it writes to the queue
+        # can leave the queue's lock held.
+        os._exit(1)  # pylint: disable=protected-access
+    for name in configs:
+        limiter.acquire()
+        reports.put((name, 10.0 if name == "A-X" else 0.1))
+    stop.wait(30.0)
+
+
+def test_supervisor_restarts_and_rebalances(tmp_path) -> None:
+    configs = [{"base": base, "quote": "X"} for base in ("A", "B", "C", "D")]
+    supervisor = Supervisor(
+        configs,
+        str(tmp_path),
+        workers=2,
+        rebalance_len=0.0,
+        imbalance=1.1,
+        target=crashing_shard,
+    )
+    assert sorted(worker.shard for worker in supervisor.workers) == [
+        ["A-X", "C-X"],
+        ["B-X", "D-X"],
+    ]
+    for worker in supervisor.workers:
+        supervisor.start(worker)
+    try:
+        deadline = time.monotonic() + 10.0
+        restarted = 0
+        while restarted < 2 and time.monotonic() < deadline:
+            supervisor.collect(0.2)
+            restarted += supervisor.restart_crashed()
+        assert restarted == 2
+        supervisor.collect(0.5)
+        assert supervisor.loads["A-X"] > supervisor.loads["B-X"]
+        assert supervisor.rebalance()
+        assert sorted(worker.shard for worker in supervisor.workers) == [
+            ["A-X"],
+            ["B-X", "C-X", "D-X"],
+        ]
+    finally:
+        supervisor.stop_all(timeout=1.0)
+
+
+def test_run_shard(monkeypatch) -> None:
+    monkeypatch.setattr(kcbot.phases.time, "sleep", lambda secs: None)
+    monkeypatch.setattr(
+        kcbot.bot.kcc,
+        "Market",
+        create_mock_market("A", "X", 0.9, 1.0, 1.1, 1.2),
+    )
+    monkeypatch.setattr(kcbot.bot.kcc, "Trade", create_mock_trade({}))
+    monkeypatch.setattr(
+        kcbot.bot.kcc, "User", create_mock_user("A", "X", 1000.0, 1000.0)
+    )
+    run_once = kcbot.bot.Bot.run_once
+
+    def broken_run_once(bot: kcbot.bot.Bot) -> Dict[str, bool]:
+        if bot.mkt == "B-X":
+            raise Exception("Broken")
+        return run_once(bot)
+
+    monkeypatch.setattr(kcbot.bot.Bot, "run_once", broken_run_once)
+    configs: Dict[str, Any] = {
+        "A-X": {"base": "A", "quote": "X", "tick_len": 0.2},
+        "B-X": {"base": "B", "quote": "X", "tick_len": 0.2},
+        "C-X": {"base": "C", "quote": "X", "tick_len": 60},
+    }
+    reports: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=run_shard,
+        args=(configs, {}, RateLimiter(1000.0, 1000.0), reports, stop, 0.05),
+    )
+    thread.start()
+    counts = {name: 0 for name in configs}
+    deadline = time.monotonic() + 10.0
+    try:
+        while min(counts["A-X"], counts["B-X"]) < 3:
+            name, _ = reports.get(timeout=deadline - time.monotonic())
+            counts[name] += 1
+    finally:
+        stop.set()
+        thread.join()
+    # Each market runs at its own tick_len, and a failing iteration does
+    # not stop the others.
+    assert counts["C-X"] == 1
@@ -0,0 +1,85 @@
+"""
+Test symbols
+"""
+
+import pytest
+
+from kcbot.symbols import SymbolCache, SymbolInfo, UnknownSymbol
+
+from .conftest import create_mock_market, create_mock_symbol
+
+
+def test_symbol_info_fit() -> None:
+    info = SymbolInfo.from_kucoin(
+        create_mock_symbol(
+            "SOMETOKEN",
+            "GBPT",
+            baseMinSize="1",
+            baseMaxSize="50",
+            baseIncrement="0.1",
+            priceIncrement="0.01",
+            minFunds="5",
+        )
+    )
+    # 10.0 at 1.00
+    assert info.fit(100, 100) == (100, "")
+    # 100.0 is clamped to 50.0
+    assert info.fit(100, 1000) == (500, "")
+    # 0.5 is below the minimum size
+    assert info.fit(100, 5) == (0, "size below minimum")
+    # 2.0 at 1.00 is below the minimum funds
+    assert info.fit(100, 20) == (0, "funds below minimum")
+    assert info.fit(0, 100) == (0, "price not positive")
+
+
+def test_symbol_cache_ttl() -> None:
+    now = [1000.0]
+    market_class = create_mock_market(
+        "SOMETOKEN",
+        "GBPT",
+        100.0,
+        104.0,
+        106.0,
+        110.0,
+        symbols=[create_mock_symbol("SOMETOKEN", "GBPT", baseIncrement="1")],
+    )
+    cache = SymbolCache(market_class(), ttl=60.0, clock=lambda: now[0])
+
+    info = cache.get("SOMETOKEN-GBPT")
+    assert info.sizes.to_str(3) == "3"
+    assert market_class.symbol_list_calls == 1
+
+    now[0] += 59.0
+    cache.get("SOMETOKEN-GBPT")
+    assert market_class.symbol_list_calls == 1
+
+    now[0] += 1.0
+    cache.get("SOMETOKEN-GBPT")
+    assert market_class.symbol_list_calls == 2
+
+
+def test_symbol_cache_missing() -> None:
+    now = [1000.0]
+    market_class = create_mock_market(
+        "SOMETOKEN",
+        "GBPT",
+        100.0,
+        104.0,
+        106.0,
+        110.0,
+        symbols=[create_mock_symbol("SOMETOKEN", "GBPT")],
+    )
+    cache = SymbolCache(market_class(), ttl=60.0, clock=lambda: now[0])
+    cache.get("SOMETOKEN-GBPT")
+    assert market_class.symbol_list_calls == 1
+
+    # Refetched once, then remembered as missing until the next refresh.
+    for _ in range(3):
+        with pytest.raises(UnknownSymbol, match="DELISTED-GBPT"):
+            cache.get("DELISTED-GBPT")
+    assert market_class.symbol_list_calls == 2
+
+    now[0] += 60.0
+    with pytest.raises(KeyError):
+        cache.get("DELISTED-GBPT")
+    assert market_class.symbol_list_calls == 3